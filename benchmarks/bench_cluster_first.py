@@ -0,0 +1,65 @@
+import sys
+import time
+import tracemalloc
+from benchmarks.synthetic import *
+from src.routing.route_solver import *
+from src.routing.cluster_first import *
+from src.subnetwork.subnetwork import *
+
+# Route-First (one solve_route on the whole K) against Cluster-First (solve_route per cluster on a
+# bounded F neighborhood). Reports wall time, routes and total deadhead. With --memory the solves
+# run again under tracemalloc for the peak memory of the solving process (cluster workers are
+# separate processes and are not traced, --workers 1 solves every cluster in process).
+# Run from the repository root: python -m benchmarks.bench_cluster_first [--workers N] [--memory] [edges ...]
+
+ROADS = {"residential", "tertiary"}
+ROUTE_TIME = 3
+
+def _deadhead_km(E):
+    return sum(d.get("length", 0.0) * d.get("count", 1) for _, _, d in E.edges(data=True) if d.get("mode") != "SWEEP") / 1000
+
+def _measure(fn, memory=False):
+    t0 = time.perf_counter()
+    out = fn()
+    elapsed = time.perf_counter() - t0
+    if not memory:
+        return out, elapsed, float("nan")
+
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    return out, elapsed, peak
+
+def bench_cluster_first(edges, workers=2, shifts_per_cluster=1, memory=False, seed=0):
+    F = synthetic_city("grid", edges, seed=seed)
+    K = extract_K(F, ROADS)
+    for u, v, k in K.edges(keys=True):
+        K[u][v][k]["mode"] = "SWEEP"
+
+    (E, H, routes, tour), t_route, mem_route = _measure(lambda: solve_route(F, K, ROUTE_TIME), memory)
+
+    solutions, t_cluster, mem_cluster = _measure(
+        lambda: solve_route_cluster_first(F, K, ROUTE_TIME, workers=workers, shifts_per_cluster=shifts_per_cluster), memory)
+
+    swept = sorted((u, v, k) for s in solutions for u, v, k, m in s["E"].edges(keys=True, data="mode") if m == "SWEEP")
+    assert len(swept) == K.number_of_edges()
+    for s in solutions:
+        assert sorted(s["tour"]) == sorted(edge_traversals(s["E"]))
+
+    print(f"[BENCH] grid - Edges F ({F.number_of_edges()}) - K ({K.number_of_edges()})")
+    print(f"    route first    {t_route:7.2f}s  {mem_route:7.1f} MB  routes {len(routes):4d}  deadhead {_deadhead_km(E):7.1f} km")
+    print(f"    cluster first  {t_cluster:7.2f}s  {mem_cluster:7.1f} MB  routes {sum(len(s['routes']) for s in solutions):4d}"
+          f"  deadhead {sum(_deadhead_km(s['E']) for s in solutions):7.1f} km"
+          f"  clusters {len(solutions)}  max F nodes {max(s['neighborhood'] for s in solutions)}/{F.number_of_nodes()}")
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    memory = "--memory" in args
+    workers = 2
+    if "--workers" in args:
+        workers = int(args[args.index("--workers") + 1])
+        del args[args.index("--workers"):args.index("--workers") + 2]
+    sizes = [int(a) for a in args if a != "--memory"] or [10000, 40000]
+    for size in sizes:
+        bench_cluster_first(size, workers=workers, memory=memory)
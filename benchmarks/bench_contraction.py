@@ -0,0 +1,64 @@
+import os
+import random
+import sys
+import tempfile
+import time
+from benchmarks.synthetic import *
+from src.routing.route_solver import *
+from src.subnetwork.subnetwork import *
+
+# Contraction hierarchy against the CSR Dijkstra on synthetic grids: preprocessing and .npz round
+# trip, then the point to point queries it answers (shortest_path_length and shortest_path between
+# random node pairs) with the same distances checked.
+# Run from the repository root: python -m benchmarks.bench_contraction [edges ...]
+
+PAIRS = 300
+
+def _timed(fn):
+    t0 = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - t0
+
+# The same queries once without and once with the hierarchy registered for F
+def _both(F, ch, fn):
+    plain, t_plain = _timed(fn)
+    register_contraction(F, ch)
+    try:
+        fast, t_fast = _timed(fn)
+    finally:
+        invalidate_contraction(F)
+    return plain, fast, t_plain, t_fast
+
+def bench_contraction(edges, oneway_ratio=0.3, seed=0):
+    F = synthetic_city("grid", edges, oneway_ratio=oneway_ratio, seed=seed)
+    ensure_edge_weight(F)
+    csr = get_csr(F)
+
+    ch, t_build = _timed(lambda: build_contraction(csr))
+    path = os.path.join(tempfile.mkdtemp(), "ch.npz")
+    _, t_save = _timed(lambda: save_contraction(ch, path, "bench"))
+    ch, t_load = _timed(lambda: read_contraction(path, "bench"))
+    print(
+        f"[BENCH] grid - Nodes ({len(csr)}) - Arcs ({csr.num_arcs}) - Shortcuts ({ch.num_shortcuts}) - "
+        f"build {t_build:.1f}s - save {t_save * 1000:.0f} ms - load {t_load * 1000:.0f} ms ({os.path.getsize(path) / 2**20:.1f} MB)"
+    )
+
+    rng = random.Random(seed)
+    nodes = list(F.nodes)
+    pairs = [tuple(rng.sample(nodes, 2)) for _ in range(PAIRS)]
+    p2p = lambda: [shortest_path_length(F, s, t) for s, t in pairs]
+    plain, fast, t_plain, t_fast = _both(F, ch, p2p)
+    assert all(abs(a - b) < 1e-6 for a, b in zip(plain, fast))
+    print(f"    distance  {t_plain / PAIRS * 1000:.2f} ms -> {t_fast / PAIRS * 1000:.2f} ms per query")
+
+    # Paths can differ between equal cost alternatives, their costs cannot
+    cost = lambda path: sum(min(d["cost"] for d in F[a][b].values()) for a, b in zip(path, path[1:]))
+    paths = lambda: [shortest_path(F, s, t) for s, t in pairs]
+    plain, fast, t_plain, t_fast = _both(F, ch, paths)
+    assert all(abs(cost(a) - cost(b)) < 1e-6 for a, b in zip(plain, fast))
+    print(f"    path      {t_plain / PAIRS * 1000:.2f} ms -> {t_fast / PAIRS * 1000:.2f} ms per query")
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [10000, 40000]
+    for size in sizes:
+        bench_contraction(size)
@@ -0,0 +1,66 @@
+import sys
+import tempfile
+import time
+import osmnx as ox
+from benchmarks.synthetic import *
+from src.data_loading.data_loader import *
+
+# Cold vs warm startup of load_street_network on a local GraphML fixture (no network access).
+# Cold: GraphML parse plus writing the binary cache. Warm: binary cache only.
+# Run from the repository root: python -m benchmarks.bench_graph_cache [size ...]
+
+PLACE = "Synthetic,Grid"
+
+def _same_graph(A, B):
+    assert list(A.nodes) == list(B.nodes)
+    assert list(A.edges(keys=True)) == list(B.edges(keys=True))
+    for n in A.nodes:
+        assert A.nodes[n] == B.nodes[n], n
+        assert all(type(val) is type(B.nodes[n][a]) for a, val in A.nodes[n].items()), n
+    for u, v, k, d in A.edges(keys=True, data=True):
+        other = B[u][v][k]
+        assert d.keys() == other.keys(), (u, v, k)
+        for a, val in d.items():
+            if a == "geometry":
+                assert val.equals_exact(other[a], 0.0)
+            else:
+                assert val == other[a] and type(val) is type(other[a]), (u, v, k, a)
+
+def bench_graph_cache(size):
+    with tempfile.TemporaryDirectory() as cache_dir:
+        ox.save_graphml(grid_city(size, size, oneway_ratio=0.3, seed=size), graph_cache_path(PLACE, cache_dir))
+
+        t0 = time.perf_counter()
+        G_graphml = ox.load_graphml(graph_cache_path(PLACE, cache_dir))
+        t_graphml = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        G_cold = load_street_network(PLACE, cache_dir=cache_dir)
+        t_cold = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        G_warm = load_street_network(PLACE, cache_dir=cache_dir)
+        t_warm = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        load_graph_binary(binary_cache_path(PLACE, cache_dir))
+        t_binary = time.perf_counter() - t0
+
+        # A warm start only hashes the GraphML when its size or modification time changed
+        t0 = time.perf_counter()
+        file_hash(graph_cache_path(PLACE, cache_dir))
+        t_hash = time.perf_counter() - t0
+
+        _same_graph(G_graphml, G_cold)
+        _same_graph(G_graphml, G_warm)
+
+    print(
+        f"[BENCH] grid {size}x{size} - Edges ({G_warm.number_of_edges()}) - "
+        f"GraphML parse {t_graphml:.3f}s - binary parse {t_binary:.3f}s - "
+        f"cold startup {t_cold:.3f}s - warm startup {t_warm:.3f}s (GraphML hash skipped: {t_hash:.3f}s) - speedup {t_cold / max(t_warm, 1e-9):.1f}x"
+    )
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [50, 100, 200]
+    for size in sizes:
+        bench_graph_cache(size)
@@ -0,0 +1,86 @@
+import sys
+import time
+from benchmarks.synthetic import *
+from src.routing.route_solver import *
+from src.subnetwork.subnetwork import *
+
+# Degree imbalance of E: full compute_node_imbalance_old scan against an ImbalanceTracker filled with
+# a bincount, and one scan per added deadhead path (what force_balance used to pay) against O(1)
+# tracker updates. The old scan counts parallel edges, so it runs on E with its deadhead counts
+# expanded, as E looked before counts. Run from the repository root: python -m benchmarks.bench_imbalance [edges ...]
+
+ROADS = {"residential", "tertiary", "secondary"}
+PATHS = 200
+
+# The full degree scan before ImbalanceTracker, kept here as the reference
+def compute_node_imbalance_old(G):
+    imbalance = {}
+
+    for node in G.nodes:
+        in_deg = G.in_degree(node)
+        out_deg = G.out_degree(node)
+        diff = in_deg - out_deg
+
+        if diff == 0:
+            node_type = "balanced"
+        elif diff > 0:
+            node_type = "supply"
+        else:
+            node_type = "demand"
+
+        imbalance[node] = {
+            "in": in_deg,
+            "out": out_deg,
+            "imbalance": diff,
+            "type": node_type
+        }
+
+    return imbalance
+
+def _timed(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return result, best
+
+def bench_imbalance(edges, oneway_ratio=0.5, seed=0):
+    F = synthetic_city("grid", edges, oneway_ratio=oneway_ratio, seed=seed)
+    K = extract_K(F, ROADS)
+    for u, v, k in K.edges(keys=True):
+        K[u][v][k]["mode"] = "SWEEP"
+    E, H, tour = solve_giant_tour(F, K)
+
+    T, _ = expand_counts(E)
+    old, t_old = _timed(lambda: compute_node_imbalance_old(T))
+    tracker, t_build = _timed(lambda: ImbalanceTracker(E))
+    assert tracker.node_imbalance(E) == old
+
+    # PATHS single edge deadhead steps, reading the supply/demand nodes after every step
+    steps = list(E.edges())[:PATHS]
+
+    def rescans():
+        for _ in steps:
+            _ = [n for n, d in compute_node_imbalance_old(T).items() if d["imbalance"] != 0]
+
+    def updates():
+        t = tracker.copy()
+        for u, v in steps:
+            t.add_edge(u, v)
+            _ = (t.supply, t.demand, t.total_supply)
+        return t
+
+    _, t_rescan = _timed(rescans, repeat=1)
+    _, t_update = _timed(updates)
+
+    print(
+        f"[BENCH] grid oneway {oneway_ratio} - Edges F ({F.number_of_edges()}) - E ({E.number_of_edges()}, {T.number_of_edges()} traversals)\n"
+        f"    full scan {t_old * 1000:.1f} ms - tracker build {t_build * 1000:.1f} ms - "
+        f"{PATHS} steps: rescans {t_rescan:.2f}s vs updates {t_update * 1000:.2f} ms"
+    )
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [10000, 40000]
+    for size in sizes:
+        bench_imbalance(size)
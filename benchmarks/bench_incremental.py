@@ -0,0 +1,78 @@
+import random
+import sys
+import time
+from benchmarks.synthetic import *
+from src.routing.route_solver import *
+from src.subnetwork.subnetwork import *
+
+# Incremental re-solve against a cold solve after closing and adding a few streets.
+# Streets are closed by removing them from F (and so from the sweep set), added streets are
+# residential streets that were not swept before.
+# Run from the repository root: python -m benchmarks.bench_incremental [edges ...] (three seeds per size)
+
+ROADS = {"secondary", "tertiary"}
+
+def _sweep_graph(F, roads, extra=()):
+    K = extract_K(F, roads)
+    for u, v, k in extra:
+        K.add_edge(u, v, key=k, **F[u][v][k])
+        K.nodes[u].update(F.nodes[u])
+        K.nodes[v].update(F.nodes[v])
+    for u, v, k in K.edges(keys=True):
+        K[u][v][k]["mode"] = "SWEEP"
+    return K
+
+def _check(E, tour, routes):
+    assert sorted(tour) == sorted(edge_traversals(E))
+    assert all(a[1] == b[0] for a, b in zip(tour, tour[1:] + tour[:1]))
+    assert sum(len(r) for r in routes) == len(tour)
+
+def bench_incremental(edges, changes=5, seed=0):
+    rng = random.Random(seed)
+    F = synthetic_city("grid", edges, seed=seed)
+    K = _sweep_graph(F, ROADS)
+    previous = solve_giant_tour(F, K)
+
+    # Close a few swept streets in both directions and sweep a few residential streets more
+    F2 = F.copy()
+    for u, v, k in rng.sample(sorted(K.edges(keys=True)), changes):
+        for a, b in ((u, v), (v, u)):
+            if F2.has_edge(a, b):
+                F2.remove_edges_from([(a, b, key) for key in list(F2[a][b])])
+    invalidate_csr(F2)
+    extra = rng.sample([e for e in F2.edges(keys=True, data="highway") if e[3] == "residential"], changes)
+    extra = [(u, v, k) for u, v, k, _ in extra]
+    K2 = _sweep_graph(F2, ROADS, extra)
+
+    added, removed = sweep_diff(K, K2)
+
+    # Both solves get the same warm CSR view of F2, as for a long lived street network
+    ensure_edge_weight(F2)
+    get_csr(F2)
+
+    t0 = time.perf_counter()
+    E_cold, H_cold, routes_cold, tour_cold = solve_route(F2, K2, 3)
+    t_cold = time.perf_counter() - t0
+
+    # Updates previous in place
+    t0 = time.perf_counter()
+    E_inc, H_inc, routes_inc, tour_inc = solve_route_incremental(F2, previous, 3, added=added, removed=removed)
+    t_inc = time.perf_counter() - t0
+
+    _check(E_cold, tour_cold, routes_cold)
+    _check(E_inc, tour_inc, routes_inc)
+    sweep = lambda X: sorted((u, v) for u, v, m in X.edges(data="mode") if m == "SWEEP")
+    assert sweep(E_inc) == sweep(E_cold)
+
+    length = lambda X: sum(d.get("length", 0.0) * d.get("count", 1) for _, _, d in X.edges(data=True)) / 1000
+    print(
+        f"[BENCH] grid - Edges F ({F.number_of_edges()}) - K ({K2.number_of_edges()}) - added {len(added)} removed {len(removed)} - "
+        f"cold {t_cold:.3f}s ({length(E_cold):.1f} km, {len(routes_cold)} routes) - "
+        f"incremental {t_inc:.3f}s ({length(E_inc):.1f} km, {len(routes_inc)} routes) - speedup {t_cold / max(t_inc, 1e-9):.1f}x"
+    )
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [10000, 40000]
+    for size in sizes:
+        for seed in range(3):
+            bench_incremental(size, seed=seed)
@@ -0,0 +1,45 @@
+import pickle
+import sys
+import time
+from benchmarks.synthetic import *
+from src.routing.route_solver import *
+from src.subnetwork.subnetwork import *
+
+# Deadhead edges driven several times are one edge with a count. Compares E against the same E
+# with every traversal as a parallel edge (expand_counts, the layout E had before) on one-way heavy
+# grids: edge count, pickled size (what the solution cache stores) and pairing time.
+# Run from the repository root: python -m benchmarks.bench_multiplicity [edges ...]
+
+ROADS = {"residential", "tertiary", "secondary"}
+ONEWAY_RATIO = 0.8
+
+def bench_multiplicity(edges, seed=0):
+    F = synthetic_city("grid", edges, oneway_ratio=ONEWAY_RATIO, seed=seed)
+    K = extract_K(F, ROADS)
+    for u, v, k in K.edges(keys=True):
+        K[u][v][k]["mode"] = "SWEEP"
+
+    t0 = time.perf_counter()
+    E, H, tour = solve_giant_tour(F, K)
+    t_solve = time.perf_counter() - t0
+    assert sorted(tour) == sorted(edge_traversals(E))
+
+    T, _ = expand_counts(E)
+    size_E = len(pickle.dumps(E)) / 2**20
+    size_T = len(pickle.dumps(T)) / 2**20
+
+    t0 = time.perf_counter()
+    compute_local_pairings(T)
+    t_pair = time.perf_counter() - t0
+
+    deadhead = sum(1 for *_, m in E.edges(data="mode") if m != "SWEEP")
+    print(
+        f"[BENCH] grid oneway {ONEWAY_RATIO} - Edges F ({F.number_of_edges()}) - K ({K.number_of_edges()}) - solve {t_solve:.2f}s\n"
+        f"    E edges {E.number_of_edges()} (deadhead {deadhead}) for {T.number_of_edges()} traversals - "
+        f"pickled {size_E:.2f} MB vs {size_T:.2f} MB with parallel copies - pairing {t_pair:.3f}s"
+    )
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [10000, 40000]
+    for size in sizes:
+        bench_multiplicity(size)
@@ -0,0 +1,60 @@
+import gc
+import sys
+import time
+import tracemalloc
+from benchmarks.synthetic import *
+from src.routing.route_solver import *
+from src.subnetwork.subnetwork import *
+
+# Memory of the graphs derived from F. K, H and E hold overlay edges (see overlay.py) that only
+# store mode, flags and count and read everything else from the F edge. Per block of a schedule:
+#   peak     = tracemalloc peak of extract_K + solve_route
+#   retained = memory still held by K, E, H (and the routes) after the block
+#   export   = memory of the same K, E, H as plain dict copies (materialize)
+# Run from the repository root: python -m benchmarks.bench_overlay [edges ...]
+
+BLOCKS = [
+    {"primary", "secondary"},
+    {"secondary", "tertiary"},
+    {"residential"},
+    {"residential", "tertiary", "secondary", "primary"},
+]
+
+def _traced(fn):
+    gc.collect()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    t0 = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - t0
+    current, peak = tracemalloc.get_traced_memory()
+    return result, (current - base) / 2**20, (peak - base) / 2**20, elapsed
+
+def _solve_block(F, roads, route_time):
+    K = extract_K(F, roads)
+    for u, v, k in K.edges(keys=True):
+        K[u][v][k]["mode"] = "SWEEP"
+    E, H, routes, tour = solve_route(F, K, route_time)
+    return K, E, H, routes
+
+def bench_overlay(edges, route_time=3, seed=0):
+    F = synthetic_city("grid", edges, oneway_ratio=0.3, seed=seed)
+    ensure_edge_weight(F)
+    get_csr(F)
+    print(f"[BENCH] grid - Edges F ({F.number_of_edges()})")
+
+    tracemalloc.start()
+    for roads in BLOCKS:
+        (K, E, H, routes), retained, peak, elapsed = _traced(lambda: _solve_block(F, roads, route_time))
+        _, export, _, _ = _traced(lambda: [materialize(X) for X in (K, E, H)])
+        print(
+            f"    {sorted(roads)} - K ({K.number_of_edges()}) E ({E.number_of_edges()}) - {elapsed:.2f}s - "
+            f"peak {peak:.1f} MB - retained {retained:.1f} MB - export {export:.1f} MB"
+        )
+        del K, E, H, routes
+    tracemalloc.stop()
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [10000, 40000]
+    for size in sizes:
+        bench_overlay(size)
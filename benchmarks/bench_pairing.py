@@ -0,0 +1,70 @@
+import random
+import sys
+import time
+from benchmarks.synthetic import *
+from src.routing.tour.pair import *
+
+# Vectorized compute_local_pairings against the per-node pure Python version.
+# Uses a two-way grid (every node balanced) with a random SWEEP / DEADHEAD mix.
+# Run from the repository root: python -m benchmarks.bench_pairing [side ...]
+# The default side 224 gives a ~50k node grid.
+
+# The per-node pairing before the vectorized one, kept here as the reference
+def compute_local_pairings_old(E):
+    pairing = {}
+
+    for n in E.nodes():
+        in_edges = list(E.in_edges(n, keys=True))
+        out_edges = list(E.out_edges(n, keys=True))
+
+        if len(in_edges) != len(out_edges):
+            raise ValueError(
+                f"Node {n} not balanced: in={len(in_edges)} out={len(out_edges)}. "
+                "Transportation step must be balanced. H is not balanced."
+            )
+
+        m = len(in_edges)
+        if m == 0:
+            continue
+
+        cost = [[0.0] * m for _ in range(m)]
+        for i, ine in enumerate(in_edges):
+            for j, oute in enumerate(out_edges):
+                cost[i][j] = pairing_cost(E, ine, oute)
+
+        assign = hungarian_min_cost(cost)
+
+        for i, j in enumerate(assign):
+            pairing[in_edges[i]] = out_edges[j]
+
+    return pairing
+
+def bench_pairing(side, seed=0):
+    E = grid_city(side, side, oneway_ratio=0.0, seed=seed)
+    rng = random.Random(seed)
+    for u, v, k in E.edges(keys=True):
+        E[u][v][k]["mode"] = "SWEEP" if rng.random() < 0.7 else "DEADHEAD"
+
+    t0 = time.perf_counter()
+    old = compute_local_pairings_old(E)
+    t_old = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    new = compute_local_pairings(E)
+    t_new = time.perf_counter() - t0
+
+    # Ties may be broken differently, the total cost must match
+    cost_old = sum(pairing_cost(E, i, o) for i, o in old.items())
+    cost_new = sum(pairing_cost(E, i, o) for i, o in new.items())
+    assert old.keys() == new.keys()
+    assert abs(cost_old - cost_new) < 1e-6, (cost_old, cost_new)
+
+    print(
+        f"[BENCH] grid {side}x{side} - Nodes ({E.number_of_nodes()}) - Edges ({E.number_of_edges()}) - "
+        f"old {t_old:.3f}s - new {t_new:.3f}s - speedup {t_old / max(t_new, 1e-9):.1f}x"
+    )
+
+if __name__ == "__main__":
+    sides = [int(a) for a in sys.argv[1:]] or [224]
+    for side in sides:
+        bench_pairing(side)
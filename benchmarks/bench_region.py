@@ -0,0 +1,55 @@
+import sys
+import time
+from benchmarks.synthetic import *
+from src.routing.route_solver import *
+from src.subnetwork.subnetwork import *
+
+# Deadhead searches on the search region around a block against the whole city graph.
+# The block is the residential and tertiary streets of one district (the middle DISTRICT share of
+# the city in both directions), the city grows. With the region the solve time should stay about
+# flat, on the full F it grows with the city. The CSR view of F is built before timing, as it is
+# for the long lived F of a run.
+# Run from the repository root: python -m benchmarks.bench_region [edges ...]
+
+ROADS = {"residential", "tertiary"}
+DISTRICT_EDGES = 4000
+
+def _district(F, edges):
+    K = extract_K(F, ROADS)
+    xs = [x for _, x in F.nodes(data="x")]
+    ys = [y for _, y in F.nodes(data="y")]
+    cx, cy = (min(xs) + max(xs)) / 2, (min(ys) + max(ys)) / 2
+
+    # Square around the city center holding about `edges` swept edges
+    side = (edges / max(K.number_of_edges(), 1)) ** 0.5
+    hx, hy = (max(xs) - min(xs)) * side / 2, (max(ys) - min(ys)) * side / 2
+    inside = lambda n: abs(F.nodes[n]["x"] - cx) <= hx and abs(F.nodes[n]["y"] - cy) <= hy
+    G = K.edge_subgraph([(u, v, k) for u, v, k in K.edges(keys=True) if inside(u) and inside(v)]).copy()
+    for u, v, k in G.edges(keys=True):
+        G[u][v][k]["mode"] = "SWEEP"
+    return G
+
+def _deadhead_km(E):
+    return sum(d.get("length", 0.0) * d.get("count", 1) for _, _, d in E.edges(data=True) if d.get("mode") != "SWEEP") / 1000
+
+def bench_region(edges, seed=0):
+    F = synthetic_city("grid", edges, seed=seed)
+    G = _district(F, DISTRICT_EDGES)
+    get_csr(F)
+
+    results = {}
+    for name, margin in (("full F", None), ("region", REGION_MARGIN)):
+        profiler = StageProfiler(trace_memory=False)
+        t0 = time.perf_counter()
+        E, H, tour = solve_giant_tour(F, G, region_margin=margin, profiler=profiler)
+        results[name] = (time.perf_counter() - t0, _deadhead_km(E), profiler.stages.get("region", {}).get("sizes", {}).get("nodes"))
+        assert sorted(tour) == sorted(edge_traversals(E))
+
+    print(f"[BENCH] grid - Edges F ({F.number_of_edges()}) - G ({G.number_of_edges()})")
+    for name, (t, km, nodes) in results.items():
+        print(f"    {name:<7} {t:7.2f}s  deadhead {km:7.2f} km  searched nodes {nodes}/{F.number_of_nodes()}")
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [10000, 40000, 160000]
+    for size in sizes:
+        bench_region(size)
@@ -0,0 +1,132 @@
+import os
+import sys
+import tempfile
+import time
+import folium
+import osmnx as ox
+from benchmarks.synthetic import *
+from src.routing.route_solver import *
+from src.subnetwork.subnetwork import *
+from src.visualizing.visualizer import *
+
+# Output size and render time of the tour maps: one folium layer per edge (old) against one merged
+# feature per route (new), exact and simplified to one pixel at zoom 14.
+# Run from the repository root: python -m benchmarks.bench_render [edges ...]
+
+# The maps with one folium layer per edge, kept here as the reference
+def visualize_tour_and_routes_old(E, tour, routes, output_path):
+
+    nodes, edges = ox.graph_to_gdfs(E)
+
+    center = nodes.geometry.unary_union.centroid
+    m = folium.Map(location=[center.y, center.x], zoom_start=13, tiles="CartoDB positron")
+
+    # Base roads
+    base = folium.FeatureGroup(name="All Roads", show=True)
+    folium.GeoJson(
+        edges.to_json(),
+        style_function=lambda x:{
+            "color":"gray","weight":1,"opacity":0.3
+        }
+    ).add_to(base)
+    base.add_to(m)
+
+    # Giant tour
+    tour_group = folium.FeatureGroup(name="Giant Tour", show=False)
+    for u,v,k in tour:
+        draw_edge(E,u,v,k,"red",tour_group)
+    tour_group.add_to(m)
+
+    # Master group for all routes
+    routes_master = folium.FeatureGroup(name="All Subroutes", show=True)
+
+    # Individual routes
+    for i, route in enumerate(routes):
+        color = ROUTE_COLORS[i % len(ROUTE_COLORS)]
+
+        fg = folium.FeatureGroup(name=f"Route {i+1}", show=True)
+
+        for u,v,k in route:
+            draw_edge(E,u,v,k,color,fg)
+
+        fg.add_to(routes_master)
+
+    routes_master.add_to(m)
+
+    folium.LayerControl(collapsed=False).add_to(m)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    m.save(output_path)
+
+def visualize_giant_tour_old(E, tour, output_path):
+    nodes, edges = ox.graph_to_gdfs(E)
+
+    center = nodes.geometry.unary_union.centroid
+    m = folium.Map(location=[center.y, center.x], zoom_start=13, tiles="CartoDB positron")
+
+    # Draw base roads
+    folium.GeoJson(
+        edges.to_json(),
+        name="All Roads",
+        style_function=lambda x: {
+            "color": "gray",
+            "weight": 1,
+            "opacity": 0.4
+        },
+    ).add_to(m)
+
+    tour_group = folium.FeatureGroup(name="Giant Tour", show=True)
+
+    for idx, (u, v, k) in enumerate(tour):
+        data = E[u][v][k]
+
+        if "geometry" in data and data["geometry"] is not None:
+            folium.GeoJson(
+                data["geometry"],
+                style_function=lambda x: {
+                    "color": "red",
+                    "weight": 3,
+                    "opacity": 0.9
+                }
+            ).add_to(tour_group)
+        else:
+            # fallback straight line
+            p1 = (E.nodes[u]["y"], E.nodes[u]["x"])
+            p2 = (E.nodes[v]["y"], E.nodes[v]["x"])
+            folium.PolyLine([p1, p2], color="red", weight=3, opacity=0.9).add_to(tour_group)
+
+    tour_group.add_to(m)
+
+    folium.LayerControl(collapsed=False).add_to(m)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    m.save(output_path)
+
+def _render(fn, *args):
+    t0 = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - t0, os.path.getsize(args[-1]) / 2**20
+
+def bench_render(edges):
+    F = synthetic_city("grid", edges, seed=1)
+    K = extract_K(F, {"residential", "tertiary"})
+    for u, v, k in K.edges(keys=True):
+        K[u][v][k]["mode"] = "SWEEP"
+    E, H, routes, tour = solve_route(F, K, 3)
+
+    with tempfile.TemporaryDirectory() as out:
+        p = lambda name: os.path.join(out, name + ".html")
+        rows = [
+            ("routes old", _render(visualize_tour_and_routes_old, E, tour, routes, p("r_old"))),
+            ("routes new", _render(visualize_tour_and_routes, E, tour, routes, p("r_new"))),
+            ("routes z14", _render(lambda *a: visualize_tour_and_routes(*a, simplify_zoom=14), E, tour, routes, p("r_z14"))),
+            ("tour old", _render(visualize_giant_tour_old, E, tour, p("t_old"))),
+            ("tour new", _render(visualize_giant_tour, E, tour, p("t_new"))),
+        ]
+
+    print(f"[BENCH] grid - Edges F ({F.number_of_edges()}) - E ({E.number_of_edges()}) - Routes ({len(routes)})")
+    for name, (t, mb) in rows:
+        print(f"    {name:<11} {t:7.2f}s {mb:8.2f} MB")
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [10000]
+    for size in sizes:
+        bench_render(size)
@@ -0,0 +1,103 @@
+import sys
+import time
+from src.routing.tour.subcycle import *
+
+# Stress test for merge_subcycles. Every cell of a rows x cols grid is one counter-clockwise
+# 4-edge cycle, so neighbouring cycles share nodes but no edges.
+# Run from the repository root: python -m benchmarks.bench_subcycles [side ...]
+# The old quadratic merge only runs up to OLD_MAX_CYCLES cycles.
+
+OLD_MAX_CYCLES = 10000
+
+# The quadratic merge before merge_subcycles, kept here as the reference
+def _cycle_nodes(edge_cycle):
+    nodes = [edge_cycle[0][0]]
+    for u, v, k in edge_cycle:
+        nodes.append(v)
+    return nodes
+
+
+def _rotate_cycle_to_start_at_node(edge_cycle, node):
+    nodes = _cycle_nodes(edge_cycle)
+    m = len(edge_cycle)
+
+    for t in range(m):
+        if edge_cycle[t][0] == node:
+            return edge_cycle[t:] + edge_cycle[:t]
+
+    for t in range(m):
+        if nodes[t] == node:
+            return edge_cycle[t % m:] + edge_cycle[:t % m]
+    raise ValueError("Node not found in cycle")
+
+def merge_subcycles_old(cycles):
+    if not cycles:
+        return []
+
+    tour = cycles[0]
+    remaining = cycles[1:]
+
+    while remaining:
+        tour_nodes = set(_cycle_nodes(tour))
+
+        merged = False
+        for idx, cy in enumerate(remaining):
+            cy_nodes = set(_cycle_nodes(cy))
+            common = tour_nodes.intersection(cy_nodes)
+            if not common:
+                continue
+
+            x = next(iter(common))  # pick any common node
+            tour_rot = _rotate_cycle_to_start_at_node(tour, x)
+            cy_rot = _rotate_cycle_to_start_at_node(cy, x)
+
+            tour = cy_rot + tour_rot
+            remaining.pop(idx)
+            merged = True
+            break
+
+        if not merged:
+            raise RuntimeError(
+                "Could not merge remaining subcycles: no common nodes found. "
+                "This suggests cycles lie in disjoint node sets."
+            )
+
+    return tour
+
+def cell_cycles(rows, cols):
+    def node(i, j):
+        return i * (cols + 1) + j
+
+    cycles = []
+    for i in range(rows):
+        for j in range(cols):
+            a, b, c, d = node(i, j), node(i, j + 1), node(i + 1, j + 1), node(i + 1, j)
+            cycles.append([(a, b, 0), (b, c, 0), (c, d, 0), (d, a, 0)])
+    return cycles
+
+def check_tour(tour, cycles):
+    assert sorted(tour) == sorted(e for cycle in cycles for e in cycle)
+    for a, b in zip(tour, tour[1:] + tour[:1]):
+        assert a[1] == b[0], (a, b)
+
+def bench_subcycles(side):
+    cycles = cell_cycles(side, side)
+
+    t0 = time.perf_counter()
+    tour = merge_subcycles([list(c) for c in cycles])
+    t_new = time.perf_counter() - t0
+    check_tour(tour, cycles)
+
+    old = "skipped"
+    if len(cycles) <= OLD_MAX_CYCLES:
+        t0 = time.perf_counter()
+        tour_old = merge_subcycles_old([list(c) for c in cycles])
+        old = f"{time.perf_counter() - t0:.3f}s"
+        check_tour(tour_old, cycles)
+
+    print(f"[BENCH] cycles ({len(cycles)}) - edges ({len(tour)}) - old {old} - new {t_new:.3f}s")
+
+if __name__ == "__main__":
+    sides = [int(a) for a in sys.argv[1:]] or [30, 50, 100, 300]
+    for side in sides:
+        bench_subcycles(side)
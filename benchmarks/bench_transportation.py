@@ -0,0 +1,171 @@
+import sys
+import time
+import networkx as nx
+from benchmarks.synthetic import *
+from src.routing.imbalance import *
+from src.routing.transportation import *
+from src.subnetwork.subnetwork import *
+
+# Compares the early-terminating predecessor engine against the old full single-source
+# Dijkstra per supply node on synthetic grids, and the sparse transportation problem (nearest
+# demands per supply, matching backend) against the complete one solved by network_simplex.
+# Run from the repository root: python -m benchmarks.bench_transportation [size ...]
+
+# The solvers before the sparse transportation problem, kept here as the reference
+
+# Calculates and returns shortest distances and path nodes from all nodes to all nodes in F
+# Returns: dists and paths matrices. Ex: dists[s][d], paths[s][d]
+def calculate_supply_to_demand_paths_old(F, supplies, demands, weight_attr="cost"):
+    demand_nodes = list(demands.keys())
+
+    dists = {} # Shortest path cost from s to d. dists[s][d]
+    paths = {} # Nodes that form tha path s to d. paths[s][d]
+
+    # Iterate over supply nodes
+    for s in supplies.keys():
+        # This calculates the shortest distance and paths from node s to each node in F
+        dists_s, paths_s = nx.single_source_dijkstra(F, source=s, weight=weight_attr)
+
+        dists[s] = {}
+        paths[s] = {}
+
+        # Iterate over demand nodes and record distance and path nodes if the path exists from s to d
+        for d in demand_nodes:
+            if d in dists_s:
+                dists[s][d] = dists_s[d]
+                paths[s][d] = paths_s[d]
+
+    return dists, paths
+
+# allow_unmatched: adds a dummy supply and a dummy demand node so the problem stays feasible when
+# some amounts cannot be shipped (unreachable pairs or unequal totals). Flow through the dummies
+# costs more than any real path, so real pairs are always preferred, and iter_flow_pairs skips it.
+def solve_transportation_min_cost_flow_old(supplies, demands, dist, allow_unmatched=False):
+    # Get all supply-demand node pairs that are in shortest dist list
+    reachable_pairs = []
+
+    for s in supplies:
+        for d in demands:
+            if d in dist.get(s, {}):
+                reachable_pairs.append((s, d))
+
+    # All unique supply nodes in reachable pairs
+    reachable_supplies = {s for s, _ in reachable_pairs}
+
+    # All unique demand nodes in reachable pairs
+    reachable_demands = {d for _, d in reachable_pairs}
+
+    # Transportation graph. networx.network_simplex(T) function requires a graph that includes
+    # nodes and edges with certain attributes. Nodes have to include "demand" attribute.
+    # Negative demand means it is a supply node and positive demand means it is a demand node.
+    # Edges requite weight and capacity. Weight is the cost of the path from s to d. Capacity
+    # is there to limit how many times we can use this path for transportation problem.
+    # I made capaciy 10**9 so that it is basically unlimited.
+    T = nx.DiGraph()
+
+    for s, amount in supplies.items():
+        if s in reachable_supplies:
+            T.add_node(("S", s), demand=-amount)
+
+    for d, amount in demands.items():
+        if d in reachable_demands:
+            T.add_node(("D", d), demand=amount)
+
+    for s, d in reachable_pairs:
+        T.add_edge(
+            ("S", s),
+            ("D", d),
+            weight=int(dist[s][d]),
+            capacity=10**9,
+        )
+
+    if allow_unmatched:
+        total_supply = sum(supplies.values())
+        total_demand = sum(demands.values())
+        unmatched_cost = (max((int(dist[s][d]) for s, d in reachable_pairs), default=0) + 1) * (total_supply + 1)
+
+        for s, amount in supplies.items():
+            T.add_node(("S", s), demand=-amount)
+            T.add_edge(("S", s), ("D", None), weight=unmatched_cost, capacity=10**9)
+
+        for d, amount in demands.items():
+            T.add_node(("D", d), demand=amount)
+            T.add_edge(("S", None), ("D", d), weight=unmatched_cost, capacity=10**9)
+
+        # Dummy supply covers every demand and dummy demand takes every supply. Whatever the dummies
+        # do not need for the real nodes is sent straight between them for free.
+        T.add_node(("S", None), demand=-total_demand)
+        T.add_node(("D", None), demand=total_supply)
+        T.add_edge(("S", None), ("D", None), weight=0, capacity=10**9)
+
+    # Calculates total cost and gives a flot dictionary. 
+    # Ex: 
+    # T.add_edge("A","B", weight=5)
+    # T.add_edge("B","C", weight=2)
+    # flow_dict = {"A": {"B": 3},"B": {"C": 3}}
+    # cost = 5 * 3 + 2 * 3 = 21
+    cost, flow_dict = nx.network_simplex(T)
+    return cost, flow_dict
+
+
+def bench_supply_to_demand(size, road_types=("residential",)):
+    F = grid_city(size, size, oneway_ratio=0.3, seed=size)
+    K = extract_K(F, set(road_types))
+    ensure_edge_weight(F)
+
+    imbalance = ImbalanceTracker(K)
+    supplies, demands = imbalance.supplies(), imbalance.demands()
+
+    t0 = time.perf_counter()
+    dists_old, paths_old = calculate_supply_to_demand_paths_old(F, supplies, demands)
+    t_old = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    dists_new, preds_new = calculate_supply_to_demand_paths(F, supplies, demands)
+    t_new = time.perf_counter() - t0
+
+    # Both engines must agree on every supply -> demand distance
+    for s in supplies:
+        assert dists_old[s].keys() == dists_new[s].keys()
+        for d, dist in dists_old[s].items():
+            assert abs(dist - dists_new[s][d]) < 1e-6
+
+    print(
+        f"[BENCH] grid {size}x{size} - Edges ({F.number_of_edges()}) - "
+        f"Supplies ({len(supplies)}) - Demands ({len(demands)}) - "
+        f"old {t_old:.3f}s - new {t_new:.3f}s - speedup {t_old / max(t_new, 1e-9):.1f}x"
+    )
+
+def bench_min_cost_flow(size, road_types=("residential",)):
+    F = grid_city(size, size, oneway_ratio=0.3, seed=size)
+    K = extract_K(F, set(road_types))
+    ensure_edge_weight(F)
+
+    imbalance = ImbalanceTracker(K)
+    supplies, demands = imbalance.supplies(), imbalance.demands()
+
+    t0 = time.perf_counter()
+    dists, preds = calculate_supply_to_demand_paths(F, supplies, demands)
+    cost_old, flow_old = solve_transportation_min_cost_flow_old(supplies, demands, dists)
+    t_old = time.perf_counter() - t0
+    arcs_old = sum(len(d) for d in dists.values())
+    exact_old = sum(dists[s][d] * amount for s, d, amount in iter_flow_pairs(flow_old))
+
+    t0 = time.perf_counter()
+    cost_new, flow_new, preds_new, info = solve_transportation(F, supplies, demands)
+    t_new = time.perf_counter() - t0
+
+    print(
+        f"[BENCH] grid {size}x{size} - Supplies ({len(supplies)}) - Demands ({len(demands)}) - "
+        f"complete {arcs_old} arcs {t_old:.3f}s cost {exact_old:.1f} - "
+        f"sparse {info['arcs']} arcs ({info['neighbors']} nearest, {info['researched']} supplies searched again) {t_new:.3f}s "
+        f"(search {info['search_time']:.3f}s, flow {info['solve_time']:.3f}s) cost {cost_new:.1f} - "
+        f"speedup {t_old / max(t_new, 1e-9):.1f}x"
+    )
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [20, 40, 60]
+    for size in sizes:
+        bench_supply_to_demand(size)
+    for size in sizes:
+        bench_min_cost_flow(size)
@@ -0,0 +1,150 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from benchmarks.synthetic import *
+from src.routing.route_solver import *
+from src.subnetwork.subnetwork import *
+
+# Scaling benchmark of the whole solver on synthetic cities.
+# For every generator and size it times extract_K and the solve_route stages through StageProfiler:
+#   transportation = make_balanced_H, connectivity = connect_components_to_form_E, force_balance,
+#   pairing + subcycles + merge = generate_subcycle_tour, split = split_giant_tour
+# Results are written to benchmarks/results/<commit>.json so two commits can be compared.
+#
+# Run from the repository root:
+#   python -m benchmarks.suite                          all generators, 1k to 500k edges
+#   python -m benchmarks.suite --sizes 1000 10000       only these sizes
+#   python -m benchmarks.suite compare <old> <new>      per-stage ratios, exit code 1 on a regression
+
+DEFAULT_SIZES = [1000, 10000, 100000, 500000]
+DEFAULT_ROADS = ["residential", "tertiary"]
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+# A stage regressed if it got this much slower and by at least MIN_REGRESSION_SECONDS
+REGRESSION_RATIO = 1.25
+MIN_REGRESSION_SECONDS = 0.05
+
+def git_revision():
+    try:
+        out = subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def bench_city(kind, size, roads, oneway_ratio=0.2, seed=0, route_time=3):
+    t0 = time.perf_counter()
+    F = synthetic_city(kind, size, oneway_ratio=oneway_ratio, seed=seed)
+    build_time = time.perf_counter() - t0
+
+    profiler = StageProfiler(trace_memory=False)
+    with profiler.stage("extract_K"):
+        K = extract_K(F, set(roads))
+    profiler.sizes("extract_K", nodes=K.number_of_nodes(), edges=K.number_of_edges())
+
+    for u, v, k in K.edges(keys=True):
+        K[u][v][k]["mode"] = "SWEEP"
+
+    solve_route(F, K, route_time, profiler=profiler)
+
+    return {
+        "generator": kind,
+        "size": size,
+        "nodes": F.number_of_nodes(),
+        "edges": F.number_of_edges(),
+        "build_time_s": build_time,
+        "total_s": sum(rec["time_s"] for rec in profiler.stages.values()),
+        "stages": profiler.rows(),
+    }
+
+def run_suite(generators, sizes, roads, budget, oneway_ratio=0.2, seed=0):
+    results = []
+    for kind in generators:
+        for size in sorted(sizes):
+            r = bench_city(kind, size, roads, oneway_ratio=oneway_ratio, seed=seed)
+            results.append(r)
+            print(f"[BENCH] {kind} {size} - Nodes ({r['nodes']}) - Edges ({r['edges']}) - Solve ({r['total_s']:.2f}s)")
+            for row in r["stages"]:
+                print(f"    {row['stage']:<15} {row['time_s']:8.3f}s")
+
+            # Larger sizes of this generator would take too long
+            if budget is not None and r["total_s"] > budget:
+                print(f"[BENCH] {kind}: {r['total_s']:.0f}s is over the budget of {budget:.0f}s, skipping larger sizes")
+                break
+    return results
+
+def save_results(results, args, path=None):
+    revision = git_revision()
+    payload = {
+        "revision": revision,
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": sys.version.split()[0],
+        "machine": platform.platform(),
+        "cpu": platform.processor() or platform.machine(),
+        "params": {"roads": args.roads, "oneway_ratio": args.oneway_ratio, "seed": args.seed},
+        "results": results,
+    }
+
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{revision}.json")
+    with open(path, "w") as f:
+        json.dump(payload, f, indent=2)
+    print(f"[BENCH] Results written to {path}")
+    return path
+
+def _load(name):
+    path = name if os.path.exists(name) else os.path.join(RESULTS_DIR, f"{name}.json")
+    with open(path) as f:
+        return json.load(f)
+
+def _stage_times(payload):
+    times = {}
+    for r in payload["results"]:
+        for row in r["stages"]:
+            times[(r["generator"], r["size"], row["stage"])] = row["time_s"]
+        times[(r["generator"], r["size"], "total")] = r["total_s"]
+    return times
+
+# Prints new/old time per generator, size and stage. Returns the regressed entries.
+def compare(old_name, new_name):
+    old = _load(old_name)
+    new = _load(new_name)
+    t_old = _stage_times(old)
+    t_new = _stage_times(new)
+
+    print(f"[BENCH] {old['revision']} -> {new['revision']}")
+    regressions = []
+    for key in sorted(t_old.keys() & t_new.keys()):
+        a, b = t_old[key], t_new[key]
+        ratio = b / max(a, 1e-9)
+        flag = ""
+        if ratio > REGRESSION_RATIO and b - a > MIN_REGRESSION_SECONDS:
+            flag = "  REGRESSION"
+            regressions.append(key)
+        kind, size, stage = key
+        print(f"    {kind:<7} {size:>7} {stage:<15} {a:8.3f}s -> {b:8.3f}s  {ratio:5.2f}x{flag}")
+
+    return regressions
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "compare":
+        if len(sys.argv) != 4:
+            sys.exit("usage: python -m benchmarks.suite compare <old revision or file> <new revision or file>")
+        sys.exit(1 if compare(sys.argv[2], sys.argv[3]) else 0)
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--generators", nargs="+", choices=GENERATORS, default=list(GENERATORS))
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES, help="Target edge counts of F")
+    parser.add_argument("--roads", nargs="+", default=DEFAULT_ROADS, help="Road types swept (extract_K)")
+    parser.add_argument("--oneway-ratio", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--budget", type=float, default=600.0, help="Skip larger sizes of a generator once a solve takes longer (seconds)")
+    parser.add_argument("--output", default=None, help="Results file (default: benchmarks/results/<commit>.json)")
+    args = parser.parse_args()
+
+    results = run_suite(args.generators, args.sizes, args.roads, args.budget, oneway_ratio=args.oneway_ratio, seed=args.seed)
+    save_results(results, args, path=args.output)
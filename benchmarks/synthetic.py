@@ -0,0 +1,185 @@
+import math
+import random
+import networkx as nx
+import numpy as np
+from shapely.geometry import LineString
+
+# Synthetic street networks for benchmarks. Graphs carry the same attributes OSMnx puts on a
+# drive network (x, y, length, highway, oneway, geometry) so every stage runs on them unchanged.
+
+LON0 = 29.02
+LAT0 = 40.98
+METERS_PER_DEG_LAT = 111320.0
+
+def _meters(x1, y1, x2, y2):
+    kx = METERS_PER_DEG_LAT * math.cos(math.radians((y1 + y2) / 2.0))
+    return math.hypot((x2 - x1) * kx, (y2 - y1) * METERS_PER_DEG_LAT)
+
+def _add_street(G, u, v, highway, oneway, osmid):
+    x1, y1 = G.nodes[u]["x"], G.nodes[u]["y"]
+    x2, y2 = G.nodes[v]["x"], G.nodes[v]["y"]
+    data = {
+        "osmid": osmid,
+        "name": f"Street {osmid}",
+        "highway": highway,
+        "oneway": oneway,
+        "reversed": False,
+        "length": round(_meters(x1, y1, x2, y2), 3),
+        "geometry": LineString([(x1, y1), (x2, y2)]),
+    }
+    G.add_edge(u, v, **data)
+
+    if not oneway:
+        back = dict(data)
+        back["reversed"] = True
+        back["geometry"] = LineString([(x2, y2), (x1, y1)])
+        G.add_edge(v, u, **back)
+
+# Share of streets per highway type used by radial_city and random_planar_city
+DEFAULT_HIGHWAY_MIX = {"secondary": 0.1, "tertiary": 0.2, "residential": 0.7}
+
+def pick_highway(rng, highway_mix):
+    r = rng.random() * sum(highway_mix.values())
+    for hw, share in highway_mix.items():
+        r -= share
+        if r < 0:
+            return hw
+    return hw
+
+def grid_highway(i, j):
+    # Every 10th line is an arterial, every 5th a collector, the rest residential
+    if i % 10 == 0 or j % 10 == 0:
+        return "secondary"
+    if i % 5 == 0 or j % 5 == 0:
+        return "tertiary"
+    return "residential"
+
+# Builds a rows x cols grid with `spacing` meters between intersections.
+# A `oneway_ratio` share of the streets is one-way, the direction picked at random.
+def grid_city(rows, cols, spacing=100.0, oneway_ratio=0.2, seed=0):
+    rng = random.Random(seed)
+    G = nx.MultiDiGraph(crs="epsg:4326")
+
+    dy = spacing / METERS_PER_DEG_LAT
+    dx = spacing / (METERS_PER_DEG_LAT * math.cos(math.radians(LAT0)))
+
+    for i in range(rows):
+        for j in range(cols):
+            G.add_node(i * cols + j, x=LON0 + j * dx, y=LAT0 + i * dy, street_count=4)
+
+    osmid = 1
+    for i in range(rows):
+        for j in range(cols):
+            n = i * cols + j
+            for nb, hw in ((n + 1, grid_highway(i, -1)), (n + cols, grid_highway(-1, j))):
+                if (nb == n + 1 and j == cols - 1) or (nb == n + cols and i == rows - 1):
+                    continue
+                oneway = rng.random() < oneway_ratio
+                u, v = (n, nb) if rng.random() < 0.5 else (nb, n)
+                _add_street(G, u, v, hw, oneway, osmid)
+                osmid += 1
+
+    return largest_strong_component(G)
+
+def largest_strong_component(G):
+    nodes = max(nx.strongly_connected_components(G), key=len)
+    return G.subgraph(nodes).copy()
+
+# Ring-and-spoke city around (LON0, LAT0): `rings` concentric rings `ring_spacing` meters apart,
+# each split into `spokes` intersections, joined to the next ring by radial streets.
+# Spokes are arterials every `arterial_every` spokes, all other streets follow highway_mix.
+def radial_city(rings, spokes, ring_spacing=120.0, oneway_ratio=0.2, highway_mix=None, arterial_every=8, seed=0):
+    rng = random.Random(seed)
+    highway_mix = highway_mix or DEFAULT_HIGHWAY_MIX
+    G = nx.MultiDiGraph(crs="epsg:4326")
+
+    ky = 1.0 / METERS_PER_DEG_LAT
+    kx = 1.0 / (METERS_PER_DEG_LAT * math.cos(math.radians(LAT0)))
+
+    G.add_node(0, x=LON0, y=LAT0, street_count=spokes)
+
+    def node(r, s):
+        return 1 + (r - 1) * spokes + s
+
+    for r in range(1, rings + 1):
+        for s in range(spokes):
+            a = 2 * math.pi * s / spokes
+            G.add_node(node(r, s), x=LON0 + r * ring_spacing * math.cos(a) * kx, y=LAT0 + r * ring_spacing * math.sin(a) * ky, street_count=4)
+
+    osmid = 1
+
+    def street(u, v, hw):
+        nonlocal osmid
+        oneway = rng.random() < oneway_ratio
+        if rng.random() < 0.5:
+            u, v = v, u
+        _add_street(G, u, v, hw, oneway, osmid)
+        osmid += 1
+
+    for s in range(spokes):
+        spoke_hw = "secondary" if s % arterial_every == 0 else None
+        street(0, node(1, s), spoke_hw or pick_highway(rng, highway_mix))
+        for r in range(1, rings + 1):
+            street(node(r, s), node(r, (s + 1) % spokes), pick_highway(rng, highway_mix))
+            if r < rings:
+                street(node(r, s), node(r + 1, s), spoke_hw or pick_highway(rng, highway_mix))
+
+    return largest_strong_component(G)
+
+# Random planar city: n intersections scattered uniformly with about `spacing` meters between
+# neighbours, joined by the Delaunay triangulation. Triangle edges longer than max_ratio * spacing
+# and a `drop_ratio` share of the rest are removed, which leaves blocks of irregular shape.
+def random_planar_city(n, spacing=100.0, oneway_ratio=0.2, highway_mix=None, drop_ratio=0.3, max_ratio=2.5, seed=0):
+    from scipy.spatial import Delaunay
+
+    rng = random.Random(seed)
+    highway_mix = highway_mix or DEFAULT_HIGHWAY_MIX
+    G = nx.MultiDiGraph(crs="epsg:4326")
+
+    side = spacing * math.sqrt(n)
+    pts = np.random.default_rng(seed).uniform(0.0, side, size=(n, 2))
+
+    ky = 1.0 / METERS_PER_DEG_LAT
+    kx = 1.0 / (METERS_PER_DEG_LAT * math.cos(math.radians(LAT0)))
+    for i, (px, py) in enumerate(pts.tolist()):
+        G.add_node(i, x=LON0 + px * kx, y=LAT0 + py * ky, street_count=3)
+
+    tri = Delaunay(pts).simplices
+    pairs = np.concatenate([tri[:, [0, 1]], tri[:, [1, 2]], tri[:, [2, 0]]])
+    pairs = np.unique(np.sort(pairs, axis=1), axis=0)
+    lengths = np.hypot(*(pts[pairs[:, 0]] - pts[pairs[:, 1]]).T)
+    pairs = pairs[lengths <= max_ratio * spacing]
+
+    osmid = 1
+    for u, v in pairs.tolist():
+        if rng.random() < drop_ratio:
+            continue
+        oneway = rng.random() < oneway_ratio
+        if rng.random() < 0.5:
+            u, v = v, u
+        _add_street(G, u, v, pick_highway(rng, highway_mix), oneway, osmid)
+        osmid += 1
+
+    return largest_strong_component(G)
+
+GENERATORS = ("grid", "radial", "planar")
+
+# Synthetic city of the given kind with roughly `edges` directed edges.
+# A two-way street is two edges, so a street is 2 - oneway_ratio edges on average.
+def synthetic_city(kind, edges, oneway_ratio=0.2, highway_mix=None, seed=0):
+    per_street = 2.0 - oneway_ratio
+    streets = edges / per_street
+
+    if kind == "grid":
+        # A side x side grid has 2 * side^2 streets
+        side = max(2, round(math.sqrt(streets / 2.0)))
+        return grid_city(side, side, oneway_ratio=oneway_ratio, seed=seed)
+    if kind == "radial":
+        # 2 * rings * spokes streets, spokes = 4 * rings keeps blocks roughly square
+        rings = max(2, round(math.sqrt(streets / 8.0)))
+        return radial_city(rings, 4 * rings, oneway_ratio=oneway_ratio, highway_mix=highway_mix, seed=seed)
+    if kind == "planar":
+        # Delaunay has about 3n edges, some are too long or dropped
+        n = max(10, round(streets / (3.0 * 0.68)))
+        return random_planar_city(n, oneway_ratio=oneway_ratio, highway_mix=highway_mix, seed=seed)
+    raise ValueError(f"Unknown generator: {kind}")
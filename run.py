@@ -2,99 +2,263 @@ import warnings
 import urllib3
 import time
 import os
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from src.data_loading.data_loader import *
-from src.visualizing.visualizer import *
+from src.visualizing.outputs import *
 from src.routing.route_solver import *
+from src.routing.cluster_first import *
+from src.routing.profiling import *
 from src.routing.utils import *
 from src.subnetwork.subnetwork import *
 from src.data_loading.json_loader import *
 
 
+# split_options: keyword arguments for the tour split (split_mode, depot, lookahead), merge_mode and region_margin.
+# A block can name its own "depot".
+# profile_options: {"dir": ..., "memory": bool, "cprofile": bool} writes <dir>/<block>_profile.json and .csv
+# with per-stage time and graph sizes, peak memory with memory, plus one .prof per stage with cprofile.
+# cluster_options: {"workers": ..., "shifts_per_cluster": ...} solves the block Cluster-First (see
+# solve_route_cluster_first) instead of Route-First. The solution cache is not used then.
+# Only solves the block. Returns the block summary and the solution the outputs are drawn from.
+def run_block(F, blockIndex, block, cache=None, split_options=None, profile_options=None, cluster_options=None):
+    block_start_t = time.perf_counter()
+
+    profiler = NULL_PROFILER
+    if profile_options:
+        cprofile_dir = profile_options["dir"] if profile_options.get("cprofile") else None
+        profiler = StageProfiler(trace_memory=profile_options.get("memory", False), cprofile_dir=cprofile_dir, prefix=f"{blockIndex}_")
+
+    days = block["days"]
+    start, end = block["time_window"]
+    allowed_roads = set(block["road_types"])
+
+    split_options = dict(split_options or {})
+    if "depot" in block:
+        split_options["depot"] = block["depot"]
+
+    diag_start_t = time.perf_counter()
+    with profiler.stage("extract_K"):
+        K = extract_K(F, allowed_roads)
+    profiler.sizes("extract_K", nodes=K.number_of_nodes(), edges=K.number_of_edges())
+    G = K
+
+    for u,v,k in G.edges(keys=True):
+        G[u][v][k]["mode"] = "SWEEP"
+
+    route_time = hours_between(start, end)
+    clusters = None
+    if cluster_options is not None:
+        cluster_solutions = solve_route_cluster_first(F, G, route_time, profiler=profiler, **cluster_options, **split_options)
+        E, H, routes, tour = combine_cluster_solutions(cluster_solutions)
+        clusters = len(cluster_solutions)
+    elif cache is not None:
+        E, H, routes, tour = solve_route_cached(F, G, allowed_roads, route_time, cache, profiler=profiler, **split_options)
+    else:
+        E, H, routes, tour = solve_route(F, G, route_time, profiler=profiler, **split_options)
+    diag_end_t = time.perf_counter()
+
+    """
+    print("F edges:", F.number_of_edges())
+    print("K edges:", K.number_of_edges())
+    print("G edges:", G.number_of_edges())
+    print("E edges:", E.number_of_edges())
+    print("Tour edges:", len(tour))
+    print("Sweep edges:", sum(1 for u,v,k in E.edges(keys=True) if E[u][v][k].get("mode")=="SWEEP"))
+    print("Deadhead edges:", sum(1 for u,v,k in E.edges(keys=True) if E[u][v][k].get("mode")=="DEADHEAD"))
+
+    missing = set(E.edges(keys=True)) - set(tour)
+    print("Missing:", len(missing))
+    print(list(missing)[:10])
+    """
+
+    if profile_options:
+        profiler.stop()
+        meta = {"block": blockIndex, "days": days, "time_window": [start, end], "road_types": sorted(allowed_roads),
+                "solve_time": diag_end_t - diag_start_t}
+        profile_path = os.path.join(profile_options["dir"], f"{blockIndex}_profile")
+        profiler.write_json(profile_path + ".json", **meta)
+        profiler.write_csv(profile_path + ".csv")
+
+    summary = {
+        "block": blockIndex,
+        "days": days,
+        "time_window": (start, end),
+        "road_types": allowed_roads,
+        "solve_time": diag_end_t - diag_start_t,
+        "total_time": time.perf_counter() - block_start_t,
+        "routes": len(routes),
+        "clusters": clusters,
+        "profile": profiler.summary(),
+    }
+    solution = {"K": K, "H": H, "E": E, "tour": tour, "routes": routes}
+
+    return summary, solution
+
+# Street network of the worker process. Loaded once per worker from the graph cache so F is
+# never pickled per task.
+_worker_F = None
+_worker_cache = None
+
+def _init_worker(place, cache_dir, contraction=False):
+    global _worker_F, _worker_cache
+    warnings.filterwarnings(action="ignore")
+    warnings.simplefilter(action="ignore", category=FutureWarning)
+    _worker_F = load_street_network(place, contraction=contraction)
+    _worker_cache = SolutionCache(cache_dir) if cache_dir else None
+
+# Solves and draws a block in a worker of the --workers pool
+def _run_block_in_worker(task):
+    blockIndex, block, folder, split_options, profile_options, cluster_options, outputs = task
+    summary, solution = run_block(_worker_F, blockIndex, block, cache=_worker_cache, split_options=split_options, profile_options=profile_options, cluster_options=cluster_options)
+    summary.update(render_block(_worker_F, blockIndex, folder, solution, outputs))
+    return summary
+
+def _render_block_in_worker(blockIndex, folder, solution, outputs):
+    return render_block(_worker_F, blockIndex, folder, solution, outputs)
+
+def _render_network_in_worker(folder):
+    return render_network(_worker_F, folder)
+
+def _print_network_map(info):
+    print(f"[INFO] Full street network map - Size ({info['size_mb']:.1f} MB) - Render ({info['render_time']:.2f}s)")
+
+# Yields the block summaries in schedule order.
+# outputs = output_options(...). With background=True and one worker, the outputs of a block are drawn
+# in a separate process while the next block is solved. That process holds its own copy of F, so it
+# is opt-in. With several workers every worker draws the blocks it solved. The full network map is drawn once.
+# contraction=True loads the contraction hierarchy of the network (built once and cached) for point to point queries.
+def run_schedule(place, schedule, folder, workers=1, cache_dir=None, split_options=None, profile_options=None, outputs=None, background=False, cluster_options=None, contraction=False):
+    outputs = outputs or output_options()
+    tasks = [(blockIndex, block, folder, split_options, profile_options, cluster_options, outputs) for blockIndex, block in enumerate(schedule)]
+    draw_network = NETWORK_ARTIFACT in outputs["artifacts"]
+    draw_blocks = bool(block_artifacts(outputs))
+
+    if workers <= 1 and not (background and (draw_network or draw_blocks)):
+        F = load_street_network(place, contraction=contraction)
+        cache = SolutionCache(cache_dir) if cache_dir else None
+        if draw_network:
+            _print_network_map(render_network(F, folder))
+        for blockIndex, block, folder, split_options, profile_options, cluster_options, outputs in tasks:
+            summary, solution = run_block(F, blockIndex, block, cache=cache, split_options=split_options, profile_options=profile_options, cluster_options=cluster_options)
+            if draw_blocks:
+                summary.update(render_block(F, blockIndex, folder, solution, outputs))
+            yield summary
+        return
+
+    if workers <= 1:
+        F = load_street_network(place, contraction=contraction)
+        cache = SolutionCache(cache_dir) if cache_dir else None
+
+        # One render process with its own copy of F, so F is never pickled per block. Started after
+        # F is loaded, so it reads the graph cache instead of downloading the network as well.
+        with ProcessPoolExecutor(max_workers=1, initializer=_init_worker, initargs=(place, None)) as renderer:
+            network = renderer.submit(_render_network_in_worker, folder) if draw_network else None
+
+            pending = deque()
+            for blockIndex, block, folder, split_options, profile_options, cluster_options, outputs in tasks:
+                summary, solution = run_block(F, blockIndex, block, cache=cache, split_options=split_options, profile_options=profile_options, cluster_options=cluster_options)
+                future = renderer.submit(_render_block_in_worker, blockIndex, folder, solution, outputs) if draw_blocks else None
+                pending.append((summary, future))
+
+                # Block i is reported once block i+1 is solved, its maps were drawn meanwhile
+                while len(pending) > 1:
+                    yield _finish_block(*pending.popleft())
+
+            while pending:
+                yield _finish_block(*pending.popleft())
+
+            if network is not None:
+                _print_network_map(network.result())
+        return
+
+    # GraphML, binary cache (and contraction hierarchy) written once here, so workers only read them
+    if contraction or not street_network_cached(place):
+        load_street_network(place, contraction=contraction)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(place, cache_dir, contraction)) as pool:
+        network = pool.submit(_render_network_in_worker, folder) if draw_network else None
+
+        # map keeps block order no matter which worker finishes first
+        for result in pool.map(_run_block_in_worker, tasks):
+            yield result
+
+        if network is not None:
+            _print_network_map(network.result())
+
+def _finish_block(summary, future):
+    if future is not None:
+        summary.update(future.result())
+    return summary
+
+
 if __name__ == "__main__":
     warnings.filterwarnings(action="ignore")
     warnings.simplefilter(action="ignore", category=FutureWarning)
 
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=1, help="Number of schedule blocks solved in parallel")
+    parser.add_argument("--solution-cache", metavar="DIR", nargs="?", const=DEFAULT_SOLUTION_CACHE_DIR, default=None, help=f"Reuse solved giant tours across blocks and runs, cached in DIR (default {DEFAULT_SOLUTION_CACHE_DIR})")
+    parser.add_argument("--split", choices=["greedy", "optimal"], default="greedy", help="How the giant tour is cut into routes")
+    parser.add_argument("--merge", choices=list(MERGE_MODES), default="turn_aware", help="How subcycles are joined into the giant tour")
+    parser.add_argument("--contraction", action="store_true", help="Answer point to point shortest path queries on a contraction hierarchy of the network, built once and cached next to the graph cache")
+    parser.add_argument("--region-margin", type=float, default=None, help=f"Deadhead searches only use streets within this many meters of the swept streets (default: whole network, {REGION_MARGIN:.0f} with --cluster-first, 0 = whole network)")
+    parser.add_argument("--lookahead", type=int, default=None, help="Max tour edges per route considered by the optimal split")
+    parser.add_argument("--outputs", nargs="*", choices=list(ARTIFACTS), default=list(ARTIFACTS), help="Maps and pages to write (none = solve only)")
+    parser.add_argument("--render", choices=["background", "inline"], default="inline", help="background = draw the outputs of a block in a separate process (with its own copy of the network) while the next block is solved")
+    parser.add_argument("--simplify-zoom", type=int, default=None, help="Simplify tour and route lines to one pixel at this map zoom level")
+    parser.add_argument("--show-balanced", action="store_true", help="Also draw balanced nodes on the imbalance maps")
+    parser.add_argument("--cluster-markers", action="store_true", help="Cluster the nodes of the imbalance maps")
+    parser.add_argument("--cluster-first", action="store_true", help="Split the swept streets into clusters of about one shift and solve every cluster separately")
+    parser.add_argument("--cluster-workers", type=int, default=1, help="With --cluster-first, number of clusters solved in parallel")
+    parser.add_argument("--shifts-per-cluster", type=int, default=1, help="With --cluster-first, routes of one shift per cluster")
+    parser.add_argument("--profile", metavar="DIR", default=None, help="Write per-stage timings and graph sizes of every block to DIR")
+    parser.add_argument("--profile-memory", action="store_true", help="With --profile, also record peak memory per stage (tracemalloc, slows the solver down)")
+    parser.add_argument("--cprofile", action="store_true", help="With --profile, also dump a cProfile file per stage")
+    args = parser.parse_args()
+
+    cache_dir = args.solution_cache
+
     config = load_config()
 
     place = config["place"]
     schedule = config["schedule"]
 
+    # Optional depot node. Routes then start and end there and the optimal split accounts for it.
+    split_options = {"split_mode": args.split, "depot": config.get("depot"), "lookahead": args.lookahead, "merge_mode": args.merge}
+    # Without the flag Route-First searches the whole network and Cluster-First keeps its REGION_MARGIN
+    if args.region_margin is not None:
+        split_options["region_margin"] = args.region_margin if args.region_margin > 0 else None
+
+    cluster_options = None
+    if args.cluster_first:
+        cluster_options = {"workers": args.cluster_workers, "shifts_per_cluster": args.shifts_per_cluster}
+
+    profile_options = None
+    if args.profile:
+        os.makedirs(args.profile, exist_ok=True)
+        profile_options = {"dir": args.profile, "memory": args.profile_memory, "cprofile": args.cprofile}
+
+    map_options = {"simplify_zoom": args.simplify_zoom, "show_balanced": args.show_balanced, "cluster": args.cluster_markers}
+    outputs = output_options(args.outputs, map_options)
+
     folder = "out/maps/" + place
     if os.path.exists(folder):
         for file in os.listdir(folder):
             os.remove(os.path.join(folder, file))
 
-    F = load_street_network(place)
-
     """
     print("Weak components:", nx.number_weakly_connected_components(F))
     print("Strong components:", nx.number_strongly_connected_components(F))
     """
-    blockIndex = 0
-    for block in schedule:
-        days = block["days"]
-        start, end = block["time_window"]
-        allowed_roads = set(block["road_types"])
-
-        output_path_f = folder + "/" + str(blockIndex) + "_01-Full Street Network-F.html"
-        output_path_k = folder + "/" + str(blockIndex) + "_02-Subnetwork-K.html"
-        output_path_tour = folder + "/" + str(blockIndex) + "_03-Tour.html"
-        output_path_route_first = folder + "/" + str(blockIndex) + "_04-Route First Routes.html"
-        output_path_imbalance_k = folder + "/" + str(blockIndex) + "_05-imbalance_K.html"
-        output_path_imbalance_h = folder + "/" + str(blockIndex) + "_06-imbalance_H.html"
-        output_path_imbalance_e = folder + "/" + str(blockIndex) + "_07-imbalance_E.html"
-
-        diag_start_t = time.perf_counter()
-        K = extract_K(F, allowed_roads)
-        G = K
-
-        for u,v,k in G.edges(keys=True):
-            G[u][v][k]["mode"] = "SWEEP"
-
-        route_time = hours_between(start, end)
-        E, H, routes, tour = solve_route(F, G, route_time)
-        diag_end_t = time.perf_counter()
-        
-        plot_interactive_roads_hierarchical(F, output_path=output_path_f)
-        plot_F_and_K(F, K, output_path=output_path_k)
-        visualize_tour_and_routes(E, tour, routes, output_path_route_first)
-        visualize_giant_tour(E, tour, output_path_tour)
-        print(f"[INFO] {days} {start}-{end} → {allowed_roads} - Runtime ({diag_end_t - diag_start_t:.6f}s)")
-
-        """
-        print("F edges:", F.number_of_edges())
-        print("K edges:", K.number_of_edges())
-        print("G edges:", G.number_of_edges())
-        print("E edges:", E.number_of_edges())
-        print("Tour edges:", len(tour))
-        print("Sweep edges:", sum(1 for u,v,k in E.edges(keys=True) if E[u][v][k].get("mode")=="SWEEP"))
-        print("Deadhead edges:", sum(1 for u,v,k in E.edges(keys=True) if E[u][v][k].get("mode")=="DEADHEAD"))
-        
-        missing = set(E.edges(keys=True)) - set(tour)
-        print("Missing:", len(missing))
-        print(list(missing)[:10])
-        """
-
-        imbalance_K = compute_node_imbalance(K)
-        plot_H_node_imbalance(K, imbalance_K, output_path=output_path_imbalance_k)
-
-        imbalance_H = compute_node_imbalance(H)
-        plot_H_node_imbalance(H, imbalance_H, output_path=output_path_imbalance_h)
-
-        imbalance_E = compute_node_imbalance(E)
-        plot_H_node_imbalance(E, imbalance_E, output_path=output_path_imbalance_e)
-        
-        summary, route_rows = compute_stats(E, routes)
-
-        write_stats_html(
-            summary,
-            route_rows,
-            title=f"{blockIndex}_Statistics",
-            output_path=f"{folder}/{blockIndex}_Statistics.html"
-        )
-        """
-        for i,r in enumerate(routes):
-            print("Route",i+1, route_stats(E,r))
-        print(compute_fleet_requirements(E, routes))
-        """
-        blockIndex += 1
\ No newline at end of file
+    run_start_t = time.perf_counter()
+    for r in run_schedule(place, schedule, folder, workers=args.workers, cache_dir=cache_dir, split_options=split_options, profile_options=profile_options, outputs=outputs, background=args.render == "background", cluster_options=cluster_options, contraction=args.contraction):
+        start, end = r["time_window"]
+        clusters = f" - Clusters ({r['clusters']})" if r.get("clusters") else ""
+        maps = f" - Maps ({r['maps_mb']:.1f} MB) - Render ({r['render_time']:.2f}s)" if "render_time" in r else ""
+        print(f"[INFO] {r['days']} {start}-{end} → {r['road_types']} - Runtime ({r['solve_time']:.6f}s){clusters}{maps} - Block total ({r['total_time']:.2f}s)")
+        if profile_options:
+            print(f"[INFO] Stages: {r['profile']}")
+
+    print(f"[INFO] Schedule finished - Blocks ({len(schedule)}) - Workers ({args.workers}) - Wall time ({time.perf_counter() - run_start_t:.2f}s)")
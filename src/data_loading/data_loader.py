@@ -1,27 +1,103 @@
 import os
-import osmnx as ox
+import time
+from src.routing.csr import *
+from src.routing.contraction import *
+from src.data_loading.graph_cache import *
 
-ox.settings.use_cache = True
-ox.settings.cache_folder = "dat/raw/osmnx_cache"
+# osmnx (and geopandas with it) is only imported to read a GraphML or download a network. A start
+# from the binary cache never loads it.
+def _osmnx():
+    import osmnx as ox
+    ox.settings.use_cache = True
+    ox.settings.cache_folder = "dat/raw/osmnx_cache"
+    return ox
+
+GRAPH_CACHE_DIR = "dat/raw/graph_cache"
+
+def graph_cache_path(place_name: str, cache_dir=GRAPH_CACHE_DIR):
+    return cache_dir + "/" + place_name
+
+# Binary cache written from the GraphML cache. See src/data_loading/graph_cache.py
+def binary_cache_path(place_name: str, cache_dir=GRAPH_CACHE_DIR):
+    return graph_cache_path(place_name, cache_dir) + ".bin"
+
+# A graph with attributes the binary cache cannot store is still returned, only without the cache
+def _save_binary(G, binary_path, source_hash, graph_path):
+    try:
+        save_graph_binary(G, binary_path, source_hash, source_path=graph_path)
+    except TypeError as e:
+        print(f"[INFO] Binary cache not written ({e})")
+
+# Contraction hierarchy of the network. See src/routing/contraction.py
+def contraction_cache_path(place_name: str, cache_dir=GRAPH_CACHE_DIR, weight_attr="cost"):
+    return graph_cache_path(place_name, cache_dir) + f".ch_{weight_attr}.npz"
+
+# Registers the contraction hierarchy of G for weight_attr. Read from the cache when it was built
+# from the same GraphML, else built and saved.
+def load_contraction(G, place_name: str, cache_dir=GRAPH_CACHE_DIR, weight_attr="cost"):
+    path = contraction_cache_path(place_name, cache_dir, weight_attr)
+    ch = read_contraction(path, G.graph["source_hash"], weight_attr=weight_attr)
+    if ch is not None:
+        return register_contraction(G, ch)
+
+    print(f"[INFO] Building contraction hierarchy ({place_name})")
+    t0 = time.perf_counter()
+    ch = contract_graph(G, weight_attr=weight_attr)
+    save_contraction(ch, path, G.graph["source_hash"])
+    print(f"[INFO] Contraction hierarchy - Nodes ({len(ch)}) - Shortcuts ({ch.num_shortcuts}) - Build ({time.perf_counter() - t0:.1f}s)")
+    return ch
+
+# True if the network loads from the binary cache without reading the GraphML or writing any cache
+def street_network_cached(place_name: str, cache_dir=GRAPH_CACHE_DIR):
+    graph_path = graph_cache_path(place_name, cache_dir)
+    binary_path = binary_cache_path(place_name, cache_dir)
+    return os.path.exists(graph_path) and binary_cache_valid(binary_path, source_file_hash(graph_path, binary_path))
+
+# contraction=True also loads the contraction hierarchy (see load_contraction)
+def load_street_network(place_name: str, cache_dir=GRAPH_CACHE_DIR, contraction=False):
+    graph_path = graph_cache_path(place_name, cache_dir)
+    binary_path = binary_cache_path(place_name, cache_dir)
 
-def load_street_network(place_name: str):
-    graph_path = "dat/raw/graph_cache/" + place_name
     if os.path.exists(graph_path):
-        print(f"[INFO] Loading cached street network ({place_name}) from disk")
-        return ox.load_graphml(graph_path)
+        source_hash = source_file_hash(graph_path, binary_path)
+
+        if binary_cache_valid(binary_path, source_hash):
+            print(f"[INFO] Loading cached street network ({place_name}) from binary cache")
+            G = load_graph_binary(binary_path)
+        else:
+            print(f"[INFO] Loading cached street network ({place_name}) from disk")
+            G = _osmnx().load_graphml(graph_path)
+            _save_binary(G, binary_path, source_hash, graph_path)
+
+        # Identifies this exact network, e.g. in solution cache keys
+        G.graph["source_hash"] = source_hash
+
+        build_csr(G)
+        if contraction:
+            load_contraction(G, place_name, cache_dir)
+        return G
         
     print(f"[INFO] Downloading street network ({place_name})")
+    ox = _osmnx()
     G = ox.graph_from_place(place_name, network_type="drive", simplify=True)
     
     G = ox.truncate.largest_component(G, strongly=True)
 
     ox.save_graphml(G, graph_path)
+    source_hash = file_hash(graph_path)
+    _save_binary(G, binary_path, source_hash, graph_path)
+    G.graph["source_hash"] = source_hash
     print(f"[INFO] Loaded graph - Name ({place_name}) - Nodes ({len(G.nodes)}) - Edges ({len(G.edges)})")
+
+    # Array view of G shared by all routing stages
+    build_csr(G)
+    if contraction:
+        load_contraction(G, place_name, cache_dir)
     return G
 
 
 def inspect_highway_tags(G):
-    edges = ox.graph_to_gdfs(G, nodes=False)
+    edges = _osmnx().graph_to_gdfs(G, nodes=False)
 
     if "highway" not in edges.columns:
         raise RuntimeError("OSM data does NOT contain 'highway' tags")
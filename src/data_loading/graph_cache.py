@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import numpy as np
+import networkx as nx
+import shapely
+
+# Binary street network cache stored next to the GraphML cache.
+# Layout of the cache directory:
+#   meta.json             format version, hash of the GraphML it was written from, counts
+#   node_id/x/y.npy       node arrays
+#   edge_u/v/key.npy      edge endpoint arrays
+#   edge_length.npy       edge lengths
+#   wkb.bin, wkb_off.npy  edge geometries as concatenated WKB with start offsets (empty = no geometry)
+#   attrs.json            graph attributes and the remaining node/edge attributes
+# Arrays are read with np.load and the WKB is decoded in one shapely call, only the other
+# attributes are parsed as JSON. Attributes JSON cannot store as they are (tuples, sets, dicts with
+# non-string keys, other objects) are rejected when the cache is written, so a graph read back
+# is identical to the GraphML one.
+
+BINARY_CACHE_VERSION = 2
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+# Size and modification time of the file, checked before hashing it
+def file_stamp(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+# Hash of the GraphML at path. Taken from the binary cache when the file has the same size and
+# modification time as when the cache was written, so a warm start does not read the whole file.
+def source_file_hash(path, cache_dir):
+    meta = _read_meta(cache_dir)
+    if meta is not None and meta.get("source_stamp") == file_stamp(path):
+        return meta["source_hash"]
+    return file_hash(path)
+
+def _read_meta(cache_dir):
+    meta_path = os.path.join(cache_dir, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        return json.load(f)
+
+# True if the binary cache exists, has the current format and was written from this GraphML
+def binary_cache_valid(cache_dir, source_hash):
+    meta = _read_meta(cache_dir)
+    if meta is None:
+        return False
+    return meta.get("version") == BINARY_CACHE_VERSION and meta.get("source_hash") == source_hash
+
+_JSON_SCALARS = (str, int, float, bool, type(None))
+
+# Raises TypeError for attribute values that would not come back unchanged from JSON
+def _check_json(value, where):
+    if isinstance(value, _JSON_SCALARS) and type(value).__module__ == "builtins":
+        return
+    if type(value) is list:
+        for item in value:
+            _check_json(item, where)
+        return
+    if type(value) is dict and all(type(k) is str for k in value):
+        for item in value.values():
+            _check_json(item, where)
+        return
+    raise TypeError(f"{where}: {type(value).__name__} value cannot be stored in the binary cache")
+
+# source_path: GraphML the cache is written from, its size and modification time are stored with
+# the hash (see source_file_hash). Raises TypeError for unsupported attributes (see _check_json).
+def save_graph_binary(G, cache_dir, source_hash, source_path=None):
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # An older cache stays invalid while this one is written
+    meta_path = os.path.join(cache_dir, "meta.json")
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+
+    nodes = list(G.nodes(data=True))
+    edges = list(G.edges(keys=True, data=True))
+
+    np.save(os.path.join(cache_dir, "node_id.npy"), np.array([n for n, _ in nodes], dtype=np.int64))
+    np.save(os.path.join(cache_dir, "node_x.npy"), np.array([d["x"] for _, d in nodes], dtype=np.float64))
+    np.save(os.path.join(cache_dir, "node_y.npy"), np.array([d["y"] for _, d in nodes], dtype=np.float64))
+
+    np.save(os.path.join(cache_dir, "edge_u.npy"), np.array([u for u, _, _, _ in edges], dtype=np.int64))
+    np.save(os.path.join(cache_dir, "edge_v.npy"), np.array([v for _, v, _, _ in edges], dtype=np.int64))
+    np.save(os.path.join(cache_dir, "edge_key.npy"), np.array([k for _, _, k, _ in edges], dtype=np.int64))
+    np.save(os.path.join(cache_dir, "edge_length.npy"), np.array([d.get("length", np.nan) for _, _, _, d in edges], dtype=np.float64))
+
+    # Geometries as one WKB buffer. Edge i is wkb[off[i]:off[i+1]], empty if it has no geometry.
+    offsets = np.zeros(len(edges) + 1, dtype=np.int64)
+    pos = 0
+    with open(os.path.join(cache_dir, "wkb.bin"), "wb") as f:
+        for i, (_, _, _, d) in enumerate(edges):
+            geom = d.get("geometry")
+            if geom is not None:
+                wkb = shapely.to_wkb(geom)
+                f.write(wkb)
+                pos += len(wkb)
+            offsets[i + 1] = pos
+    np.save(os.path.join(cache_dir, "wkb_off.npy"), offsets)
+
+    core_node = ("x", "y")
+    core_edge = ("length", "geometry")
+    attrs = {
+        "graph": G.graph,
+        "nodes": [{a: val for a, val in d.items() if a not in core_node} for _, d in nodes],
+        "edges": [{a: val for a, val in d.items() if a not in core_edge} for _, _, _, d in edges],
+    }
+    _check_json(attrs["graph"], "graph")
+    for (n, _), d in zip(nodes, attrs["nodes"]):
+        _check_json(d, f"node {n}")
+    for (u, v, k, _), d in zip(edges, attrs["edges"]):
+        _check_json(d, f"edge {u}->{v} ({k})")
+    with open(os.path.join(cache_dir, "attrs.json"), "w") as f:
+        json.dump(attrs, f)
+
+    # meta.json is written last so a half written cache is never seen as valid
+    meta = {
+        "version": BINARY_CACHE_VERSION,
+        "source_hash": source_hash,
+        "source_stamp": file_stamp(source_path) if source_path is not None else None,
+        "nodes": len(nodes),
+        "edges": len(edges),
+    }
+    with open(meta_path, "w") as f:
+        json.dump(meta, f)
+
+def load_graph_binary(cache_dir):
+    def arr(name):
+        return np.load(os.path.join(cache_dir, name + ".npy"))
+
+    with open(os.path.join(cache_dir, "attrs.json")) as f:
+        attrs = json.load(f)
+
+    G = nx.MultiDiGraph(**attrs["graph"])
+
+    node_id = arr("node_id").tolist()
+    node_x = arr("node_x").tolist()
+    node_y = arr("node_y").tolist()
+    for n, x, y, d in zip(node_id, node_x, node_y, attrs["nodes"]):
+        d["x"] = x
+        d["y"] = y
+        G.add_node(n, **d)
+
+    offsets = arr("wkb_off").tolist()
+    with open(os.path.join(cache_dir, "wkb.bin"), "rb") as f:
+        buf = f.read()
+
+    # Decode all geometries in one vectorized call
+    has_geom = [i for i in range(len(offsets) - 1) if offsets[i + 1] > offsets[i]]
+    wkbs = np.array([buf[offsets[i]:offsets[i + 1]] for i in has_geom], dtype=object)
+    geom_of = dict(zip(has_geom, shapely.from_wkb(wkbs))) if has_geom else {}
+
+    edge_u = arr("edge_u").tolist()
+    edge_v = arr("edge_v").tolist()
+    edge_key = arr("edge_key").tolist()
+    edge_length = arr("edge_length").tolist()
+    for i, (u, v, k, length, d) in enumerate(zip(edge_u, edge_v, edge_key, edge_length, attrs["edges"])):
+        # NaN marks an edge without length
+        if length == length:
+            d["length"] = length
+        geom = geom_of.get(i)
+        if geom is not None:
+            d["geometry"] = geom
+        G.add_edge(u, v, key=k, **d)
+
+    return G
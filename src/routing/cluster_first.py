@@ -0,0 +1,153 @@
+import math
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import networkx as nx
+from src.routing.route_solver import *
+
+# Cluster-First solving: K is split into geographically compact clusters of about one vehicle shift
+# of sweeping each, and solve_route runs once per cluster. Every cluster is solved on its own K
+# subgraph and the search region of F around it (see search_region), so a worker never holds the
+# whole city. With a depot the region also covers the way to the depot and back (depot_corridor). Clusters are independent and are solved in parallel worker processes.
+#
+# Clusters come from a k-means on edge midpoints, weighted by sweep time so clusters get about the
+# same amount of work. k = total sweep time / (route time * fill), fill leaves room for deadhead.
+
+CLUSTER_FILL = 0.7
+KMEANS_ITERS = 50
+
+# Number of clusters so every cluster is about shifts_per_cluster routes of route_time hours
+def choose_cluster_count(K, route_time, shifts_per_cluster=1, fill=CLUSTER_FILL):
+    sweep_time = sum(edge_time(K, e) for e in K.edges(keys=True))
+    per_cluster = route_time * 3600 * fill * shifts_per_cluster
+    return max(1, min(K.number_of_edges(), math.ceil(sweep_time / per_cluster)))
+
+# Edge midpoints as an (m, 2) array of x, y and the edge list in the same order
+def edge_midpoints(K):
+    edges = list(K.edges(keys=True))
+    xy = np.array([
+        ((K.nodes[u]["x"] + K.nodes[v]["x"]) / 2, (K.nodes[u]["y"] + K.nodes[v]["y"]) / 2)
+        for u, v, _ in edges
+    ], dtype=np.float64).reshape(-1, 2)
+    return edges, xy
+
+# Weighted k-means (k-means++ seeding). Returns the cluster label of every point.
+def kmeans(points, k, weights=None, iters=KMEANS_ITERS, seed=0):
+    rng = np.random.default_rng(seed)
+    n = len(points)
+    k = min(k, n)
+    if k <= 1:
+        return np.zeros(n, dtype=np.int64)
+
+    weights = np.ones(n) if weights is None else np.asarray(weights, dtype=np.float64)
+
+    # Longitudes are shorter than latitudes away from the equator
+    scale = np.array([math.cos(math.radians(float(np.mean(points[:, 1])))), 1.0])
+    P = points * scale
+
+    centers = [P[rng.integers(n)]]
+    d2 = ((P - centers[0]) ** 2).sum(axis=1)
+    for _ in range(1, k):
+        p = d2 * weights
+        total = p.sum()
+        i = rng.choice(n, p=p / total) if total > 0 else rng.integers(n)
+        centers.append(P[i])
+        d2 = np.minimum(d2, ((P - P[i]) ** 2).sum(axis=1))
+    centers = np.array(centers)
+
+    labels = None
+    for _ in range(iters):
+        dist = (centers ** 2).sum(axis=1)[None, :] - 2 * P @ centers.T
+        new_labels = dist.argmin(axis=1)
+        if labels is not None and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+
+        w = np.bincount(labels, weights=weights, minlength=k)
+        for dim in range(2):
+            s = np.bincount(labels, weights=weights * P[:, dim], minlength=k)
+            centers[:, dim] = np.where(w > 0, s / np.maximum(w, 1e-12), centers[:, dim])
+
+    # Drop empty clusters so labels are 0..k'-1
+    _, labels = np.unique(labels, return_inverse=True)
+    return labels
+
+# Sweep subgraphs of K, one per cluster
+def cluster_K(K, k, seed=0):
+    edges, xy = edge_midpoints(K)
+    weights = [edge_time(K, e) for e in edges]
+    labels = kmeans(xy, k, weights=weights, seed=seed)
+
+    clusters = [[] for _ in range(int(labels.max()) + 1 if len(labels) else 0)]
+    for e, c in zip(edges, labels):
+        clusters[c].append(e)
+
+    return [overlay_copy(K.edge_subgraph(cluster)) for cluster in clusters]
+
+# Nodes of the cheapest path from the depot to the cluster and back. The depot legs of the split run
+# on the search region of the cluster, so the region has to reach the depot.
+def depot_corridor(F, depot, nodes, weight_attr="cost"):
+    there = nearest_path(F, [depot], nodes, weight_attr=weight_attr)
+    back = shortest_path(F, there[-1], depot, weight_attr=weight_attr)
+    return there + back
+
+def _solve_cluster(task):
+    index, F_part, G, route_time, options = task
+    E, H, routes, tour = solve_route(F_part, G, route_time, **options)
+    return {"cluster": index, "E": E, "H": H, "routes": routes, "tour": tour}
+
+# Cluster-First version of solve_route.
+# Returns one solution dict {"cluster", "E", "H", "routes", "tour", "neighborhood"} per cluster,
+# neighborhood = F nodes the cluster was solved on (F.number_of_nodes() after the fallback).
+# options = keyword arguments of solve_route (split_mode, depot, lookahead, merge_mode).
+def solve_route_cluster_first(F, K, route_time, workers=1, shifts_per_cluster=1, region_margin=REGION_MARGIN, seed=0, profiler=None, **options):
+    profiler = profiler or NULL_PROFILER
+
+    with profiler.stage("clustering"):
+        k = choose_cluster_count(K, route_time, shifts_per_cluster=shifts_per_cluster)
+        clusters = cluster_K(K, k, seed=seed)
+    profiler.sizes("clustering", clusters=len(clusters))
+
+    with profiler.stage("neighborhoods"):
+        tasks = []
+        depot = options.get("depot")
+        for i, G in enumerate(clusters):
+            nodes = list(G.nodes)
+            if depot is not None and region_margin is not None:
+                nodes = list(dict.fromkeys(nodes + depot_corridor(F, depot, nodes)))
+            F_part = region_copy(F, search_region(F, nodes, margin_m=region_margin))
+            tasks.append((i, F_part, G, route_time, dict(options, region_margin=region_margin)))
+    profiler.sizes("neighborhoods", full_F=sum(1 for t in tasks if t[1] is F), max_nodes=max((t[1].number_of_nodes() for t in tasks), default=0))
+
+    with profiler.stage("clusters"):
+        if workers <= 1 or len(tasks) <= 1:
+            solutions = [_solve_cluster(task) for task in tasks]
+        else:
+            # The full F is only pickled for clusters that need it
+            with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+                solutions = list(pool.map(_solve_cluster, tasks))
+    profiler.sizes("clusters", routes=sum(len(s["routes"]) for s in solutions))
+
+    for solution, task in zip(solutions, tasks):
+        solution["neighborhood"] = task[1].number_of_nodes()
+
+    return solutions
+
+# All clusters as one solution for the maps and statistics of a block: E and H of the clusters
+# composed, routes and tours of the clusters one after the other.
+def combine_cluster_solutions(solutions):
+    E = nx.MultiDiGraph()
+    H = nx.MultiDiGraph()
+    tour = []
+    routes = []
+    for s in solutions:
+        # Deadhead keys can repeat across clusters, every cluster edge gets its own key here
+        for X, part in ((E, s["E"]), (H, s["H"])):
+            X.add_nodes_from(part.nodes(data=True))
+        keymap = {}
+        for u, v, k, data in s["E"].edges(keys=True, data=True):
+            keymap[(u, v, k)] = (u, v, add_edge_ref(E, u, v, data))
+        for u, v, k, data in s["H"].edges(keys=True, data=True):
+            add_edge_ref(H, u, v, data)
+        tour.extend(keymap[e] for e in s["tour"])
+        routes.extend([keymap[e] for e in route] for route in s["routes"])
+    return E, H, routes, tour
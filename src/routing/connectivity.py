@@ -1,3 +1,4 @@
+import numpy as np
 import networkx as nx
 from src.routing.transportation import *
 from src.routing.utils import *
@@ -5,47 +6,90 @@ from src.routing.utils import *
 def get_weak_components(H):
     return list(nx.weakly_connected_components(H))
 
-def choose_representatives(components):
-    return [next(iter(comp)) for comp in components]
-
-def build_component_graph(F, reps, weight_attr="cost"):
+# Component graph in the spirit of Mehlhorn's Steiner tree approximation.
+# One forward search from all component nodes and one backward search towards them split F into
+# Voronoi regions. Every F edge a->b whose regions belong to different components is a candidate
+# connector: comp(a) ~> a -> b ~> comp(b) with cost dist_to(a) + w(a,b) + dist_from(b).
+# CG keeps the cheapest candidate per component pair. Node i of CG is components[i].
+def build_component_graph(F, components, weight_attr="cost"):
     CG = nx.Graph()
+    CG.add_nodes_from(range(len(components)))
+
+    sources = [n for comp in components for n in comp]
+    csr, dist_f, pred_f, origin_f = voronoi_search(F, sources, weight_attr=weight_attr)
+    _, dist_b, pred_b, origin_b = voronoi_search(F, sources, weight_attr=weight_attr, reverse=True)
+
+    # Component id per CSR node index
+    comp_of = np.full(len(csr), -1, dtype=np.int64)
+    for c, comp in enumerate(components):
+        comp_of[[csr.index[n] for n in comp]] = c
+
+    label_f = np.where(origin_f >= 0, comp_of[np.maximum(origin_f, 0)], -1)
+    label_b = np.where(origin_b >= 0, comp_of[np.maximum(origin_b, 0)], -1)
+
+    # Every arc a->b of F
+    a = np.repeat(np.arange(len(csr), dtype=np.int64), np.diff(csr.indptr))
+    b = csr.indices.astype(np.int64)
+    la = label_f[a]
+    lb = label_b[b]
 
-    for r in reps:
-        CG.add_node(r)
+    mask = (la >= 0) & (lb >= 0) & (la != lb)
+    a, b, la, lb = a[mask], b[mask], la[mask], lb[mask]
+    cost = dist_f[a] + csr.weight[mask] + dist_b[b]
 
-    for i in range(len(reps)):
-        for j in range(i + 1, len(reps)):
-            u, v = reps[i], reps[j]
-            try:
-                dist = nx.shortest_path_length(F, u, v, weight=weight_attr)
-                CG.add_edge(u, v, weight=dist)
-            except nx.NetworkXNoPath:
-                pass
+    # Cheapest bridge per unordered component pair
+    lo = np.minimum(la, lb)
+    hi = np.maximum(la, lb)
+    order = np.lexsort((cost, hi, lo))
+    pair = lo[order] * len(components) + hi[order]
+    first = order[np.concatenate(([True], pair[1:] != pair[:-1]))] if len(order) else order
 
+    for p in first:
+        CG.add_edge(int(la[p]), int(lb[p]), weight=float(cost[p]), bridge=(int(a[p]), int(b[p])))
+
+    CG.graph["search"] = (csr, pred_f, pred_b)
     return CG
 
+# Node path comp(a) ~> a -> b ~> comp(b) of a bridge found by build_component_graph
+def bridge_path(CG, bridge):
+    csr, pred_f, pred_b = CG.graph["search"]
+    a, b = bridge
+
+    path = []
+    i = a
+    while i >= 0:
+        path.append(i)
+        i = pred_f[i]
+    path.reverse()
+
+    # pred_b points one step further towards the target component
+    i = b
+    while i >= 0:
+        path.append(i)
+        i = pred_b[i]
+
+    return [csr.node_ids[i] for i in path]
+
 def connect_components_to_form_E(H, F, components, weight_attr="cost"):
 
     if len(components) <= 1:
-        return H.copy()
+        E = overlay_copy(H)
+        copy_imbalance_tracker(H, E)
+        return E
 
-    reps = choose_representatives(components)
-    CG = build_component_graph(F, reps, weight_attr=weight_attr)
+    CG = build_component_graph(F, components, weight_attr=weight_attr)
 
     MST = nx.minimum_spanning_tree(CG, weight="weight")
 
-    E = H.copy()
+    E = overlay_copy(H)
+    copy_imbalance_tracker(H, E)
 
-    for u, v in MST.edges():
-        path = nx.shortest_path(F, u, v, weight=weight_attr)
+    for _, _, bridge in MST.edges(data="bridge"):
+        path = bridge_path(CG, bridge)
         for a, b in zip(path[:-1], path[1:]):
             k = pick_min_cost_edge_key(F, a, b, weight_attr=weight_attr)
-            data = F[a][b][k].copy()
-            data["mode"] = "DEADHEAD"
-            data["is_component_connector"] = True
-            E.add_edge(a, b, **data)
+            add_deadhead_edge(E, F[a][b][k], a, b, k, mode="DEADHEAD", is_component_connector=True)
 
     ensure_node_coordinates(E, F)
 
-    return E
\ No newline at end of file
+    return E
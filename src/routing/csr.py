@@ -0,0 +1,191 @@
+import weakref
+import numpy as np
+import networkx as nx
+
+# Compressed sparse row view of a street network.
+# Parallel edges u->v are collapsed into one entry that remembers the key of the cheapest edge,
+# so shortest path searches and min-cost edge lookups never touch the networkx edge dicts.
+
+MODE_CODES = {None: 0, "SWEEP": 1, "DEADHEAD": 2, "DEADHEAD_FORCE": 3}
+
+# CSR views built so far, per graph object and weight attribute. Entries go away with the graph.
+# A view is only valid while F keeps its nodes and edges, so F is frozen (nx.freeze) once it has
+# one: adding or removing nodes and edges raises instead of leaving a stale view behind. Call
+# invalidate_csr before changing F on purpose. It also has to be called after the weight
+# attribute of an edge is changed in place, because edge data is not frozen.
+_CSR_CACHE = weakref.WeakKeyDictionary()
+
+# Instance attributes nx.freeze sets
+_FROZEN_METHODS = (
+    "add_node", "add_nodes_from", "remove_node", "remove_nodes_from", "add_edge", "add_edges_from",
+    "add_weighted_edges_from", "remove_edge", "remove_edges_from", "clear", "clear_edges", "frozen",
+)
+
+class CSRGraph:
+    def __init__(self, F, weight_attr="cost"):
+        self.weight_attr = weight_attr
+
+        # node id <-> index maps
+        self.node_ids = list(F.nodes)
+        self.index = {n: i for i, n in enumerate(self.node_ids)}
+
+        n = len(self.node_ids)
+        self.x = np.array([F.nodes[u].get("x", np.nan) for u in self.node_ids], dtype=np.float64)
+        self.y = np.array([F.nodes[u].get("y", np.nan) for u in self.node_ids], dtype=np.float64)
+
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        indices = []
+        weight = []
+        length = []
+        key = []
+        mode = []
+
+        for i, u in enumerate(self.node_ids):
+            row = []
+            for v, keydict in F.succ[u].items():
+                # Cheapest parallel edge. Same rule as pick_min_cost_edge_key.
+                best_k = None
+                best_w = float("inf")
+                for k, data in keydict.items():
+                    w = float(data.get(weight_attr, data.get("length", 1.0)))
+                    if w < best_w:
+                        best_w = w
+                        best_k = k
+                data = keydict[best_k]
+                row.append((self.index[v], best_w, float(data.get("length", 0.0)), best_k, MODE_CODES.get(data.get("mode"), 0)))
+
+            row.sort()
+            for j, w, l, k, m in row:
+                indices.append(j)
+                weight.append(w)
+                length.append(l)
+                key.append(k)
+                mode.append(m)
+            indptr[i + 1] = len(indices)
+
+        self.indptr = indptr
+        self.indices = np.array(indices, dtype=np.int32)
+        self.weight = np.array(weight, dtype=np.float64)
+        self.length = np.array(length, dtype=np.float64)
+        self.key = np.array(key, dtype=np.int64)
+        self.mode = np.array(mode, dtype=np.int8)
+
+        self._lists = None
+        self._transposed = None
+
+    # CSR view with every arc reversed, for searches towards a node. Built once and kept.
+    def transposed(self):
+        if self._transposed is None:
+            T = object.__new__(CSRGraph)
+            T.weight_attr = self.weight_attr
+            T.node_ids = self.node_ids
+            T.index = self.index
+            T.x = self.x
+            T.y = self.y
+
+            n = len(self.node_ids)
+            rows = np.repeat(np.arange(n, dtype=np.int32), np.diff(self.indptr))
+            order = np.lexsort((rows, self.indices))
+
+            T.indptr = np.zeros(n + 1, dtype=np.int64)
+            T.indptr[1:] = np.cumsum(np.bincount(self.indices, minlength=n))
+            T.indices = rows[order]
+            T.weight = self.weight[order]
+            T.length = self.length[order]
+            T.key = self.key[order]
+            T.mode = self.mode[order]
+
+            T._lists = None
+            T._transposed = self
+            self._transposed = T
+        return self._transposed
+
+    # CSR view of the nodes where keep is True and the arcs between them. Node order is kept, so
+    # every row stays sorted.
+    def subgraph(self, keep):
+        keep = np.asarray(keep, dtype=bool)
+        S = object.__new__(CSRGraph)
+        S.weight_attr = self.weight_attr
+
+        kept = np.flatnonzero(keep)
+        S.node_ids = [self.node_ids[i] for i in kept]
+        S.index = {n: i for i, n in enumerate(S.node_ids)}
+        S.x = self.x[kept]
+        S.y = self.y[kept]
+
+        new_index = np.cumsum(keep) - 1
+        rows = np.repeat(np.arange(len(self.node_ids)), np.diff(self.indptr))
+        arcs = keep[rows] & keep[self.indices]
+
+        S.indptr = np.zeros(len(kept) + 1, dtype=np.int64)
+        S.indptr[1:] = np.cumsum(np.bincount(new_index[rows[arcs]], minlength=len(kept)))
+        S.indices = new_index[self.indices[arcs]].astype(np.int32)
+        S.weight = self.weight[arcs]
+        S.length = self.length[arcs]
+        S.key = self.key[arcs]
+        S.mode = self.mode[arcs]
+
+        S._lists = None
+        S._transposed = None
+        return S
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    @property
+    def num_arcs(self):
+        return len(self.indices)
+
+    # Plain Python lists of the arrays, created on the first search. Indexing numpy arrays one
+    # element at a time is slower than lists inside the heap loop.
+    def adjacency_lists(self):
+        if self._lists is None:
+            self._lists = (self.indptr.tolist(), self.indices.tolist(), self.weight.tolist())
+        return self._lists
+
+    # Key of the cheapest edge u->v, or None if there is no such edge
+    def min_key(self, u, v):
+        i = self.index.get(u)
+        j = self.index.get(v)
+        if i is None or j is None:
+            return None
+
+        a, b = self.indptr[i], self.indptr[i + 1]
+        p = a + int(np.searchsorted(self.indices[a:b], j))
+        if p < b and self.indices[p] == j:
+            return int(self.key[p])
+        return None
+
+def _freeze(F):
+    if not nx.is_frozen(F):
+        nx.freeze(F)
+
+def build_csr(F, weight_attr="cost"):
+    csr = CSRGraph(F, weight_attr=weight_attr)
+    _freeze(F)
+    _CSR_CACHE.setdefault(F, {})[weight_attr] = csr
+    return csr
+
+# Uses csr as the view of F, e.g. a view cut from a larger graph with CSRGraph.subgraph
+def register_csr(F, csr):
+    _freeze(F)
+    _CSR_CACHE.setdefault(F, {})[csr.weight_attr] = csr
+    return csr
+
+# Returns the CSR view of F for weight_attr, building it the first time it is asked for
+def get_csr(F, weight_attr="cost"):
+    csr = _CSR_CACHE.get(F, {}).get(weight_attr)
+    if csr is None:
+        csr = build_csr(F, weight_attr=weight_attr)
+    return csr
+
+def has_csr(F, weight_attr="cost"):
+    return weight_attr in _CSR_CACHE.get(F, {})
+
+# Drops the cached views of F and makes it modifiable again. The next get_csr builds a new view.
+def invalidate_csr(F):
+    _CSR_CACHE.pop(F, None)
+    # Subgraph views stay frozen, they cannot be modified anyway
+    if not hasattr(F, "_graph"):
+        for name in _FROZEN_METHODS:
+            F.__dict__.pop(name, None)
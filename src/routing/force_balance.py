@@ -2,70 +2,55 @@ import networkx as nx
 from src.routing.transportation import *
 from src.routing.connectivity import *
 
-def _total_pos_imbalance(E):
-    return sum(max(0, E.in_degree(n) - E.out_degree(n)) for n in E.nodes())
+def _add_directed_step(E, F, a, b, weight="cost", amount=1):
+    k = pick_min_cost_edge_key(F, a, b, weight_attr=weight)
+    if k is not None:
+        return (a, b, add_deadhead_edge(E, F[a][b][k], a, b, k, amount, reversed_from_oneway=False))
 
-def _add_directed_step(E, F, a, b, weight="cost"):
-    if F.has_edge(a, b):
-        k = pick_min_cost_edge_key(F, a, b, weight_attr=weight)
-        data = F[a][b][k].copy()
-        data["reversed_from_oneway"] = False
-        E.add_edge(a, b, **data)
-        return
+    k = pick_min_cost_edge_key(F, b, a, weight_attr=weight)
+    if k is not None:
+        def reverse(data):
+            if data.get("geometry", None) is not None:
+                data["geometry"] = reversed_geometry(F, b, a, k)
 
-    if F.has_edge(b, a):
-        k = pick_min_cost_edge_key(F, b, a, weight_attr=weight)
-        data = F[b][a][k].copy()
-        data["reversed_from_oneway"] = True
-        geom = data.get("geometry", None)
-        if geom is not None and hasattr(geom, "coords"):
-            try:
-                coords = list(geom.coords)[::-1]
-                data["geometry"] = type(geom)(coords)
-            except Exception:
-                pass
-                
-        data["mode"] = "DEADHEAD_FORCE"
-        data["is_force_balance"] = True
-        E.add_edge(a, b, **data)
-        return
+        return (a, b, add_deadhead_edge(E, F[b][a][k], a, b, k, amount, prepare=reverse,
+                                        reversed_from_oneway=True, mode="DEADHEAD_FORCE", is_force_balance=True))
 
     raise nx.NetworkXNoPath(f"No edge in F between {a} and {b} in either direction.")
 
-def force_balance(E, F, weight="cost", max_iters=100000):
-    Fu = F.to_undirected(as_view=True)
-
-    it = 0
-    prev = _total_pos_imbalance(E)
-
-    while prev > 0 and it < max_iters:
-        it += 1
+def _add_path(E, F, node_path, amount, weight="cost", paths=None):
+    edges = [_add_directed_step(E, F, a, b, weight=weight, amount=amount) for a, b in zip(node_path[:-1], node_path[1:])]
+    if paths is not None:
+        paths.append((edges, amount))
 
-        supplies = [n for n in E.nodes() if E.in_degree(n) > E.out_degree(n)]
-        demands  = [n for n in E.nodes() if E.out_degree(n) > E.in_degree(n)]
+# Balances the remaining nodes of E in one go. Supply nodes (in > out) and demand nodes (out > in)
+# are matched as one transportation problem over directed shortest paths in F, the same way
+# make_balanced_H does it. Only amounts that cannot be shipped along directed paths fall back to
+# undirected paths, which may drive one-way streets backwards (DEADHEAD_FORCE).
+# paths: optional list, gets (edges, amount) of every added path like add_flow_paths returns them
+def force_balance(E, F, weight="cost", max_iters=100000, paths=None):
+    # The imbalance tracker of E follows the added paths, inner path nodes stay balanced
+    imbalance = imbalance_tracker(E)
 
-        if not supplies or not demands:
-            break
+    if imbalance.supply and imbalance.demand:
+        cost, flow_dict, preds, info = solve_transportation(F, imbalance.supplies(), imbalance.demands(), weight_attr=weight, allow_unmatched=True)
 
-        s = supplies[0]
-        d = demands[0]
+        for s, d, amount in iter_flow_pairs(flow_dict):
+            _add_path(E, F, reconstruct_path(preds[s], d), amount, weight=weight, paths=paths)
 
-        try:
-            node_path = nx.shortest_path(F, s, d, weight=weight)
-            directed_used = True
-        except nx.NetworkXNoPath:
-            node_path = nx.shortest_path(Fu, s, d, weight=weight)
-            directed_used = False
-
-        for a, b in zip(node_path[:-1], node_path[1:]):
-            _add_directed_step(E, F, a, b, weight=weight)
+    # Pairs with no directed path at all
+    Fu = F.to_undirected(as_view=True)
 
-        now = _total_pos_imbalance(E)
+    it = 0
+    while imbalance.supply and imbalance.demand and it < max_iters:
+        it += 1
 
-        if now >= prev:
-            break
+        s = next(iter(imbalance.supply))
+        d = next(iter(imbalance.demand))
+        amount = min(imbalance.imbalance(s), -imbalance.imbalance(d))
 
-        prev = now
+        node_path = nx.shortest_path(Fu, s, d, weight=weight)
+        _add_path(E, F, node_path, amount, weight=weight, paths=paths)
 
     ensure_node_coordinates(E, F)
-    return E
\ No newline at end of file
+    return E
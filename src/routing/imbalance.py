@@ -1,26 +1,190 @@
+import weakref
+import numpy as np
 import networkx as nx
 
+# Degree imbalance (in - out, deadhead edges weighted by their count) of every node of a graph.
+# An ImbalanceTracker keeps in and out degrees as integer arrays, filled once with a bincount over
+# the edge endpoints and then updated in O(1) per added or removed edge, so the stages that add
+# deadhead (transportation, connectivity, force_balance, the incremental re-solve) never rescan the
+# degrees. Supply (in > out) and demand (out > in) nodes are kept as insertion ordered dicts, the
+# total positive imbalance as a running sum.
+#
+# Trackers are kept per graph like the CSR views (see csr.py): imbalance_tracker(G) builds it the
+# first time, track_edge/untrack_edge update it when G has one and copy_imbalance_tracker hands it
+# to a copy of G. Code that changes edges of a tracked graph some other way calls invalidate_imbalance.
+# Only graphs the solver builds itself (H, E) get a tracker. Input graphs like K can be changed by
+# the caller between solves, they are scanned again every time.
+
+_IMBALANCE_TRACKERS = weakref.WeakKeyDictionary()
+
+class ImbalanceTracker:
+    def __init__(self, G=None):
+        self.nodes = []
+        self.index = {}
+        self.in_deg = np.zeros(0, dtype=np.int64)
+        self.out_deg = np.zeros(0, dtype=np.int64)
+        self.supply = {}
+        self.demand = {}
+        self.total_supply = 0
+        self.total_demand = 0
+        if G is not None:
+            self._fill(G)
+
+    def _fill(self, G):
+        self.nodes = list(G.nodes)
+        self.index = {n: i for i, n in enumerate(self.nodes)}
+        n = len(self.nodes)
+
+        edges = list(G.edges(data="count", default=1))
+        src = np.fromiter((self.index[u] for u, _, _ in edges), dtype=np.int64, count=len(edges))
+        dst = np.fromiter((self.index[v] for _, v, _ in edges), dtype=np.int64, count=len(edges))
+        counts = np.fromiter((c for _, _, c in edges), dtype=np.int64, count=len(edges))
+        self.out_deg = np.bincount(src, weights=counts, minlength=n).astype(np.int64)
+        self.in_deg = np.bincount(dst, weights=counts, minlength=n).astype(np.int64)
+
+        diff = self.in_deg - self.out_deg
+        self.supply = dict.fromkeys(self.nodes[i] for i in np.flatnonzero(diff > 0))
+        self.demand = dict.fromkeys(self.nodes[i] for i in np.flatnonzero(diff < 0))
+        self.total_supply = int(diff[diff > 0].sum())
+        self.total_demand = int(-diff[diff < 0].sum())
+
+    def _node(self, n):
+        i = self.index.get(n)
+        if i is None:
+            i = len(self.nodes)
+            self.nodes.append(n)
+            self.index[n] = i
+            if i >= len(self.in_deg):
+                grow = max(16, len(self.in_deg))
+                self.in_deg = np.concatenate([self.in_deg, np.zeros(grow, dtype=np.int64)])
+                self.out_deg = np.concatenate([self.out_deg, np.zeros(grow, dtype=np.int64)])
+        return i
+
+    def _shift(self, i, d_in, d_out):
+        old = int(self.in_deg[i] - self.out_deg[i])
+        self.in_deg[i] += d_in
+        self.out_deg[i] += d_out
+        new = old + d_in - d_out
+        if new == old:
+            return
+
+        self.total_supply += max(new, 0) - max(old, 0)
+        self.total_demand += max(-new, 0) - max(-old, 0)
+
+        n = self.nodes[i]
+        if old > 0 and new <= 0:
+            del self.supply[n]
+        elif old < 0 and new >= 0:
+            del self.demand[n]
+        if new > 0 and old <= 0:
+            self.supply[n] = None
+        elif new < 0 and old >= 0:
+            self.demand[n] = None
+
+    # Edge u->v driven count times
+    def add_edge(self, u, v, count=1):
+        self._shift(self._node(u), 0, count)
+        self._shift(self._node(v), count, 0)
+
+    def remove_edge(self, u, v, count=1):
+        self.add_edge(u, v, -count)
+
+    # Forgets nodes removed from the graph together with all their edges
+    def drop_nodes(self, nodes):
+        for n in nodes:
+            i = self.index.get(n)
+            if i is not None:
+                self._shift(i, -int(self.in_deg[i]), -int(self.out_deg[i]))
+
+    def imbalance(self, n):
+        i = self.index.get(n)
+        return 0 if i is None else int(self.in_deg[i] - self.out_deg[i])
+
+    def is_balanced(self):
+        return not self.supply and not self.demand
+
+    # {node: amount} of the supply and demand nodes, the input of the transportation problem
+    def supplies(self):
+        return {n: self.imbalance(n) for n in self.supply}
+
+    def demands(self):
+        return {n: -self.imbalance(n) for n in self.demand}
+
+    # {node: {"in", "out", "imbalance", "type"}} for the nodes of G, counting every traversal of a
+    # deadhead edge with a count (the degrees of expand_counts(G))
+    def node_imbalance(self, G):
+        nodes = list(G.nodes)
+        # Index -1 (nodes the tracker has not seen) reads the appended zero
+        idx = np.array([self.index.get(n, -1) for n in nodes], dtype=np.int64)
+        in_deg = np.append(self.in_deg, 0)[idx].tolist()
+        out_deg = np.append(self.out_deg, 0)[idx].tolist()
+
+        imbalance = {}
+        for n, i, o in zip(nodes, in_deg, out_deg):
+            diff = i - o
+            imbalance[n] = {
+                "in": i,
+                "out": o,
+                "imbalance": diff,
+                "type": "balanced" if diff == 0 else "supply" if diff > 0 else "demand",
+            }
+        return imbalance
+
+    def copy(self):
+        other = ImbalanceTracker()
+        other.nodes = list(self.nodes)
+        other.index = dict(self.index)
+        other.in_deg = self.in_deg.copy()
+        other.out_deg = self.out_deg.copy()
+        other.supply = dict(self.supply)
+        other.demand = dict(self.demand)
+        other.total_supply = self.total_supply
+        other.total_demand = self.total_demand
+        return other
+
+# Returns the tracker of G, building it the first time it is asked for
+def imbalance_tracker(G):
+    tracker = _IMBALANCE_TRACKERS.get(G)
+    if tracker is None:
+        tracker = ImbalanceTracker(G)
+        _IMBALANCE_TRACKERS[G] = tracker
+    return tracker
+
+def has_imbalance_tracker(G):
+    return G in _IMBALANCE_TRACKERS
+
+def set_imbalance_tracker(G, tracker):
+    _IMBALANCE_TRACKERS[G] = tracker
+    return tracker
+
+# Keep the tracker of G (if any) in step with an added or removed edge
+def track_edge(G, u, v, count=1):
+    tracker = _IMBALANCE_TRACKERS.get(G)
+    if tracker is not None:
+        tracker.add_edge(u, v, count)
+
+def untrack_edge(G, u, v, count=1):
+    tracker = _IMBALANCE_TRACKERS.get(G)
+    if tracker is not None:
+        tracker.remove_edge(u, v, count)
+
+def untrack_nodes(G, nodes):
+    tracker = _IMBALANCE_TRACKERS.get(G)
+    if tracker is not None:
+        tracker.drop_nodes(nodes)
+
+# Y is a copy of X with the same edges
+def copy_imbalance_tracker(X, Y):
+    tracker = _IMBALANCE_TRACKERS.get(X)
+    if tracker is not None:
+        _IMBALANCE_TRACKERS[Y] = tracker.copy()
+
+def invalidate_imbalance(G):
+    _IMBALANCE_TRACKERS.pop(G, None)
+
 # Finds imbalances in graph and returns a dictionary of nodes whose imbalance info are stored.
 def compute_node_imbalance(G):
-    imbalance = {}
-
-    for node in G.nodes:
-        in_deg = G.in_degree(node)
-        out_deg = G.out_degree(node)
-        diff = in_deg - out_deg
-
-        if diff == 0:
-            node_type = "balanced"
-        elif diff > 0:
-            node_type = "supply"
-        else:
-            node_type = "demand"
-
-        imbalance[node] = {
-            "in": in_deg,
-            "out": out_deg,
-            "imbalance": diff,
-            "type": node_type
-        }
-
-    return imbalance
\ No newline at end of file
+    tracker = _IMBALANCE_TRACKERS.get(G)
+    if tracker is None:
+        tracker = ImbalanceTracker(G)
+    return tracker.node_imbalance(G)
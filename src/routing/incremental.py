@@ -0,0 +1,343 @@
+import networkx as nx
+from src.routing.transportation import *
+from src.routing.connectivity import *
+from src.routing.force_balance import *
+from src.routing.tour.tour import *
+from src.routing.split_routes import *
+from src.routing.profiling import *
+
+# Incremental re-solve after a small change of the swept streets (a few closures, one road type more
+# or less). Updates the previous (E, H, tour) instead of running the whole pipeline again and only
+# works on the nodes whose edges changed (touched nodes):
+#   1. removed sweep edges and deadhead on streets that are no longer in F are dropped from E, added
+#      sweep edges copied in from F. The imbalance tracker of E follows, so only touched nodes can be
+#      imbalanced and a transportation problem between just those nodes balances E again.
+#   2. the previous tour is cut at the dropped traversals and at every visit of a touched node. The
+#      pieces in between keep their order. Together with the added sweep edges and deadhead paths
+#      they are paired again at the touched nodes only.
+#   3. pieces that no longer meet the rest of the tour at a touched node (a closure split the
+#      tour) are spliced in where they share a node with it, or joined to it by a deadhead round
+#      trip to the nearest tour node. Deadhead only pieces are dropped. The few cycles left are
+#      merged as in generate_subcycle_tour.
+# Apart from one pass over the tour to cut it, the work grows with the change and not with E.
+# Imbalance that cannot be shipped along directed paths goes to force_balance, a part of E with no
+# directed path to the rest to the connectivity stage and a full pairing, as in a cold solve.
+
+# Candidate demand nodes per supply node. The imbalance of a change sits at the ends of the changed
+# streets, so its best match is close by and the searches need not cover the whole city to find
+# INCREMENTAL_NEIGHBORS demand nodes. Supplies left unshipped are searched again (see solve_transportation).
+INCREMENTAL_NEIGHBORS = 3
+
+# Sweep edges in K_new but not in K_old and the other way round
+def sweep_diff(K_old, K_new):
+    added = [e for e in K_new.edges(keys=True) if not K_old.has_edge(*e)]
+    removed = [e for e in K_old.edges(keys=True) if not K_new.has_edge(*e)]
+    return added, removed
+
+# Returns the key of the removed edge, None if X had no sweep edge u->v
+def _remove_sweep_edge(X, u, v, k):
+    if X.has_edge(u, v, k) and X[u][v][k].get("mode") == "SWEEP":
+        key = k
+    elif X.has_edge(u, v):
+        # Same street under another key
+        key = next((key for key, data in X[u][v].items() if data.get("mode") == "SWEEP"), None)
+    else:
+        key = None
+
+    if key is not None:
+        X.remove_edge(u, v, key)
+        untrack_edge(X, u, v)
+    return key
+
+def _add_sweep_edge(X, F, u, v, k):
+    data = edge_ref(F[u][v][k], mode="SWEEP")
+    key = add_edge_ref(X, u, v, data, key=None if X.has_edge(u, v, k) else k)
+    track_edge(X, u, v)
+    for n in (u, v):
+        X.nodes[n].update(F.nodes[n])
+    return key
+
+# One traversal less of edge u->v, k: lowers its count or removes it
+def _drop_traversal(X, u, v, k):
+    data = X[u][v][k]
+    count = data.get("count", 1)
+    if count > 1:
+        data["count"] = count - 1
+    else:
+        X.remove_edge(u, v, k)
+    untrack_edge(X, u, v)
+
+def _copy_coordinates(X, F, edges):
+    for u, v, _ in edges:
+        for n in (u, v):
+            if "x" not in X.nodes[n]:
+                X.nodes[n].update(F.nodes[n])
+
+# Adds a node path of F to X as deadhead, returns its (u, v, key) edges
+def _add_deadhead_path(X, F, node_path, weight_attr="cost", **attrs):
+    edges = []
+    for a, b in zip(node_path[:-1], node_path[1:]):
+        k = pick_min_cost_edge_key(F, a, b, weight_attr=weight_attr)
+        edges.append((a, b, add_deadhead_edge(X, F[a][b][k], a, b, k, mode="DEADHEAD", **attrs)))
+    _copy_coordinates(X, F, edges)
+    return edges
+
+# Pieces of the tour between dropped positions and visits of touched nodes, as lists of edges.
+# A tour with no cut at all is one closed piece.
+def _cut_tour(tour, dropped, touched):
+    n = len(tour)
+    cuts = {i for i, e in enumerate(tour) if e[0] in touched}
+    cuts.update(dropped)
+    cuts.update(i + 1 for i in dropped if i + 1 < n)
+    cuts = sorted(cuts)
+
+    if not cuts:
+        return [tour[:]] if tour else []
+
+    pieces = [tour[a:b] for a, b in zip(cuts, cuts[1:]) if a not in dropped]
+    # The piece across the end of the tour
+    if cuts[-1] not in dropped:
+        pieces.append(tour[cuts[-1]:] + tour[:cuts[0]])
+    elif cuts[0] > 0:
+        pieces.append(tour[:cuts[0]])
+    return pieces
+
+# Pieces of a new deadhead path, cut where it passes a touched node
+def _cut_path(edges, touched):
+    cuts = [j for j in range(1, len(edges)) if edges[j][0] in touched]
+    return [edges[a:b] for a, b in zip([0] + cuts, cuts + [len(edges)])]
+
+# First and last edge of every piece as a small graph, to pair the piece ends at the touched nodes
+# with compute_local_pairings. Edge keys are (part, piece index).
+def _piece_graph(E, pieces):
+    P = nx.MultiDiGraph()
+    for pid, piece in enumerate(pieces):
+        ends = [(piece[0], ("piece", pid))] if len(piece) == 1 else [(piece[0], ("first", pid)), (piece[-1], ("last", pid))]
+        for (u, v, k), key in ends:
+            for n in (u, v):
+                if n not in P:
+                    P.add_node(n, x=E.nodes[n]["x"], y=E.nodes[n]["y"])
+            add_edge_ref(P, u, v, E[u][v][k], key=key)
+    return P
+
+# Bearings for merge_cycles over pieces: a piece is entered through its first and left through its last edge
+def _piece_bearings(E, pieces):
+    def bearings(items):
+        bearing_in, _, modes_in = edge_bearings(E, [pieces[item[2]][-1] for item in items])
+        _, bearing_out, modes_out = edge_bearings(E, [pieces[item[2]][0] for item in items])
+        return bearing_in, bearing_out, modes_in, modes_out
+    return bearings
+
+def _piece_cycles(pieces, succ):
+    cycles = []
+    seen = set()
+    for start in succ:
+        if start in seen:
+            continue
+        cycle = []
+        pid = start
+        while pid not in seen:
+            seen.add(pid)
+            cycle.append(pid)
+            pid = succ[pid]
+        cycles.append(cycle)
+    return cycles
+
+# Cycles that meet at a touched node, i.e. can be merged by merge_cycles, as lists of cycle indices
+def _cycle_groups(pieces, cycles):
+    parent = list(range(len(cycles)))
+
+    def find(c):
+        while parent[c] != c:
+            parent[c] = parent[parent[c]]
+            c = parent[c]
+        return c
+
+    first = {}
+    for c, cycle in enumerate(cycles):
+        for pid in cycle:
+            x = pieces[pid][-1][1]
+            other = first.setdefault(x, c)
+            if find(other) != find(c):
+                parent[find(c)] = find(other)
+
+    groups = {}
+    for c in range(len(cycles)):
+        groups.setdefault(find(c), []).append(c)
+    return list(groups.values())
+
+# Pieces (a, b) with a ending at node x and succ[a] = b. Cuts a piece of pids that passes x if none ends there.
+def _open_at(pieces, succ, pids, x):
+    for pid in pids:
+        if pieces[pid][-1][1] == x:
+            return pid, succ[pid]
+
+    for pid in pids:
+        piece = pieces[pid]
+        for j in range(1, len(piece)):
+            if piece[j][0] == x:
+                new = len(pieces)
+                pieces.append(piece[j:])
+                pieces[pid] = piece[:j]
+                succ[new] = succ[pid]
+                succ[pid] = new
+                return pid, new
+
+    raise ValueError(f"Node {x} not on the pieces")
+
+# Splices the pieces of a cycle group that shares no touched node with the main tour into it:
+# at a node both pass, else through a deadhead round trip from the group to the nearest tour node.
+def _splice_group(E, F, pieces, succ, main, main_nodes, group, weight_attr="cost"):
+    group_nodes = {e[0] for pid in group for e in pieces[pid]}
+    shared = main_nodes & group_nodes
+    if shared:
+        x = next(iter(shared))
+        a, b = _open_at(pieces, succ, main, x)
+        c, d = _open_at(pieces, succ, group, x)
+        succ[a], succ[c] = d, b
+        return []
+
+    there = nearest_path(F, group_nodes, main_nodes, weight_attr=weight_attr)
+    x, m = there[0], there[-1]
+    back = shortest_path(F, m, x, weight_attr=weight_attr)
+    a, b = _open_at(pieces, succ, main, m)
+    c, d = _open_at(pieces, succ, group, x)
+    to_main = len(pieces)
+    pieces.append(_add_deadhead_path(E, F, there, weight_attr=weight_attr, is_component_connector=True))
+    to_group = len(pieces)
+    pieces.append(_add_deadhead_path(E, F, back, weight_attr=weight_attr, is_component_connector=True))
+    succ[a], succ[to_group] = to_group, d
+    succ[c], succ[to_main] = to_main, b
+    return there + back
+
+# Updates a previous solution for added and removed sweep edges of F.
+# previous = (E, H, tour) as returned by solve_giant_tour. E and H are updated in place (pass copies,
+# e.g. overlay_copy, to keep the previous solution), the previous tour list is not modified.
+# Returns (E, H, tour) like solve_giant_tour.
+def solve_giant_tour_incremental(F, previous, added=(), removed=(), weight_attr="cost", merge_mode="turn_aware", profiler=None):
+    profiler = profiler or NULL_PROFILER
+    E, H, tour_old = previous
+
+    with profiler.stage("diff"):
+        # Built from E when the previous solution was not solved in this process
+        imbalance = imbalance_tracker(E)
+
+        touched = set()
+        removed_keys = set()
+        for u, v, k in removed:
+            key = _remove_sweep_edge(E, u, v, k)
+            _remove_sweep_edge(H, u, v, k)
+            if key is not None:
+                removed_keys.add((u, v, key))
+                touched.update((u, v))
+
+        # Traversals of removed sweep edges and of deadhead on streets that are closed now
+        dropped = {i for i, e in enumerate(tour_old) if e in removed_keys or not F.has_edge(e[0], e[1])}
+        for i in dropped:
+            e = tour_old[i]
+            if e not in removed_keys:
+                _drop_traversal(E, *e)
+            touched.update(e[:2])
+
+        new_pieces = []
+        for u, v, k in added:
+            new_pieces.append([(u, v, _add_sweep_edge(E, F, u, v, k))])
+            _add_sweep_edge(H, F, u, v, k)
+            touched.update((u, v))
+    profiler.sizes("diff", added=len(added), removed=len(removed), dropped=len(dropped), touched=len(touched))
+
+    with profiler.stage("transportation"):
+        paths = []
+        supplies = imbalance.supplies()
+        demands = imbalance.demands()
+        if supplies and demands:
+            cost, flow, preds, info = solve_transportation(F, supplies, demands, weight_attr=weight_attr, allow_unmatched=True, neighbors=INCREMENTAL_NEIGHBORS)
+            paths = add_flow_paths(E, F, flow, preds, weight_attr=weight_attr)
+            add_flow_paths(H, F, flow, preds, weight_attr=weight_attr)
+
+        # Pairs with no directed path
+        if not imbalance.is_balanced():
+            force_balance(E, F, weight=weight_attr, paths=paths)
+
+        for edges, amount in paths:
+            _copy_coordinates(E, F, edges)
+            for piece in _cut_path(edges, touched):
+                new_pieces.extend([piece] * amount)
+    profiler.sizes("transportation", supply_nodes=len(supplies), demand_nodes=len(demands), paths=len(paths))
+
+    with profiler.stage("pieces"):
+        pieces = _cut_tour(tour_old, dropped, touched) + new_pieces
+    profiler.sizes("pieces", pieces=len(pieces))
+
+    with profiler.stage("pairing"):
+        pairing = compute_local_pairings(_piece_graph(E, pieces), nodes=touched)
+        succ = {a[2][1]: b[2][1] for a, b in pairing.items()}
+        # A closed piece (no touched node on the previous tour) follows itself
+        for pid in range(len(pieces)):
+            succ.setdefault(pid, pid)
+        cycles = _piece_cycles(pieces, succ)
+    profiler.sizes("pairing", nodes=len(touched), subcycles=len(cycles))
+
+    with profiler.stage("connectivity"):
+        groups = [[pid for c in group for pid in cycles[c]] for group in _cycle_groups(pieces, cycles)]
+        groups.sort(key=lambda group: sum(len(pieces[pid]) for pid in group), reverse=True)
+
+        main = groups[0] if groups else []
+        main_nodes = None
+        for group in groups[1:]:
+            # Deadhead left over from removed streets that no longer leads to any swept street
+            if not any(E[u][v][k].get("mode") == "SWEEP" for pid in group for u, v, k in pieces[pid]):
+                for pid in group:
+                    for e in pieces[pid]:
+                        _drop_traversal(E, *e)
+                        touched.update(e[:2])
+                    del succ[pid]
+                continue
+
+            if main_nodes is None:
+                main_nodes = {e[0] for pid in main for e in pieces[pid]}
+            n = len(pieces)
+            try:
+                path = _splice_group(E, F, pieces, succ, main, main_nodes, group, weight_attr=weight_attr)
+            except nx.NetworkXNoPath:
+                main = None
+                break
+            main.extend(group)
+            main.extend(range(n, len(pieces)))
+            main_nodes.update(e[0] for pid in group for e in pieces[pid])
+            main_nodes.update(path)
+
+        E.remove_nodes_from([n for n in touched if n in E and E.degree(n) == 0])
+    profiler.sizes("connectivity", components=len(groups))
+
+    if main is None:
+        # A part of E with no directed path to the rest
+        with profiler.stage("connectivity"):
+            E = connect_components_to_form_E(E, F, get_weak_components(E), weight_attr=weight_attr)
+        with profiler.stage("force_balance"):
+            force_balance(E, F, weight=weight_attr)
+        tour, _ = generate_subcycle_tour(E, merge_mode=merge_mode, profiler=profiler)
+        return E, H, tour
+
+    with profiler.stage("merge"):
+        cycles = [[(pieces[pid][0][0], pieces[pid][-1][1], pid) for pid in cycle] for cycle in _piece_cycles(pieces, succ)]
+        order = cycles[0] if len(cycles) == 1 else merge_cycles(E, cycles, merge_mode=merge_mode, bearings=_piece_bearings(E, pieces))
+        tour = []
+        for item in order:
+            tour.extend(pieces[item[2]])
+    profiler.sizes("merge", subcycles=len(cycles), tour_edges=len(tour))
+
+    return E, H, tour
+
+# solve_route from a previous solution, see solve_giant_tour_incremental
+def solve_route_incremental(F, previous, route_time, added=(), removed=(), split_mode="greedy", depot=None, lookahead=None, merge_mode="turn_aware", profiler=None):
+    profiler = profiler or NULL_PROFILER
+
+    E, H, tour = solve_giant_tour_incremental(F, previous, added=added, removed=removed, merge_mode=merge_mode, profiler=profiler)
+
+    max_route_time = route_time * 3600
+    with profiler.stage("split"):
+        routes = split_tour(E, tour, max_route_time, mode=split_mode, F=F, depot=depot, lookahead=lookahead)
+    profiler.sizes("split", routes=len(routes))
+
+    return E, H, routes, tour
@@ -0,0 +1,127 @@
+import weakref
+from collections.abc import MutableMapping
+
+# Copy-on-write edge data for the graphs derived from F (K, H, E).
+# An edge of a derived graph holds an EdgeRef: a reference to the F edge dict plus the few fields
+# the derived graph sets itself (mode, flags, count, a reversed geometry). Reads fall through to the
+# F edge, writes only go to the overlay fields, so the attributes of a street (geometry, name,
+# highway, length, ...) are in memory once per run instead of once per graph and block.
+# Copies of an EdgeRef share the overlay fields until one of them is written, so overlay_copy of a
+# whole graph only costs one small object per edge. materialize makes plain dict copies for export.
+#
+# networkx always creates a fresh dict for add_edge, so overlay edges are put in place with add_edge_ref.
+
+_REVERSED_GEOMETRY_CACHE = weakref.WeakKeyDictionary()
+
+class EdgeRef(MutableMapping):
+    __slots__ = ("base", "fields", "owned")
+
+    def __init__(self, base, fields=None, owned=True):
+        self.base = base
+        self.fields = fields
+        self.owned = owned
+
+    def __getitem__(self, key):
+        fields = self.fields
+        if fields is not None and key in fields:
+            return fields[key]
+        return self.base[key]
+
+    def get(self, key, default=None):
+        fields = self.fields
+        if fields is not None and key in fields:
+            return fields[key]
+        return self.base.get(key, default)
+
+    def __contains__(self, key):
+        return (self.fields is not None and key in self.fields) or key in self.base
+
+    def __setitem__(self, key, value):
+        if not self.owned or self.fields is None:
+            self.fields = dict(self.fields or ())
+            self.owned = True
+        self.fields[key] = value
+
+    # Attributes of the F edge are read-only, only overlay fields can be deleted
+    def __delitem__(self, key):
+        if self.fields is None or key not in self.fields:
+            raise KeyError(key)
+        if not self.owned:
+            self.fields = dict(self.fields)
+            self.owned = True
+        del self.fields[key]
+
+    def __iter__(self):
+        fields = self.fields or {}
+        yield from fields
+        for key in self.base:
+            if key not in fields:
+                yield key
+
+    def __len__(self):
+        fields = self.fields or {}
+        return len(self.base) + sum(1 for key in fields if key not in self.base)
+
+    def __repr__(self):
+        return f"EdgeRef({dict(self)!r})"
+
+    # Both copies share the overlay fields until one of them writes
+    def copy(self):
+        self.owned = False
+        return EdgeRef(self.base, self.fields, owned=False)
+
+    def __reduce__(self):
+        return (EdgeRef, (self.base, self.fields, self.owned))
+
+# Overlay edge data on top of source (an F edge dict or another overlay edge)
+def edge_ref(source, **fields):
+    if isinstance(source, EdgeRef):
+        if source.fields:
+            fields = {**source.fields, **fields}
+        source = source.base
+    return EdgeRef(source, fields or None)
+
+# Adds an edge whose data is the given mapping itself. Returns the key.
+def add_edge_ref(X, u, v, data, key=None):
+    key = X.add_edge(u, v, key=key)
+    # Successor and predecessor maps share the key dict of an edge
+    X._succ[u][v][key] = data
+    return key
+
+# Copy of X. Overlay edges are copied on write, plain edges become overlays of the X edge.
+def overlay_copy(X):
+    Y = X.__class__()
+    Y.graph.update(X.graph)
+    Y.add_nodes_from((n, d.copy()) for n, d in X.nodes(data=True))
+    for u, v, k, data in X.edges(keys=True, data=True):
+        add_edge_ref(Y, u, v, data.copy() if isinstance(data, EdgeRef) else EdgeRef(data), key=k)
+    return Y
+
+# Copy of X with plain dicts as edge data, independent of F
+def materialize(X):
+    Y = X.__class__()
+    Y.graph.update(X.graph)
+    Y.add_nodes_from((n, d.copy()) for n, d in X.nodes(data=True))
+    Y.add_edges_from((u, v, k, dict(data)) for u, v, k, data in X.edges(keys=True, data=True))
+    return Y
+
+# Geometry of the F edge u->v, k drawn from v to u. Built once per edge and shared.
+def reversed_geometry(F, u, v, k):
+    # Search regions are subgraph views, the cache belongs to the full F behind them
+    root = F
+    while hasattr(root, "_graph"):
+        root = root._graph
+
+    per_graph = _REVERSED_GEOMETRY_CACHE.setdefault(root, {})
+    if (u, v, k) in per_graph:
+        return per_graph[(u, v, k)]
+
+    geom = F[u][v][k].get("geometry", None)
+    if geom is not None and hasattr(geom, "coords"):
+        try:
+            geom = type(geom)(list(geom.coords)[::-1])
+        except Exception:
+            pass
+
+    per_graph[(u, v, k)] = geom
+    return geom
@@ -0,0 +1,139 @@
+import cProfile
+import csv
+import json
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Per-stage instrumentation of the solver.
+#
+#   profiler = StageProfiler()
+#   with profiler.stage("transportation"):
+#       H, info = make_balanced_H(...)
+#   profiler.sizes("transportation", nodes=H.number_of_nodes(), edges=H.number_of_edges())
+#
+# Every stage records wall time, call count, peak traced memory (tracemalloc) and any graph sizes
+# reported for it. A stage entered more than once accumulates time and calls and keeps the max peak.
+# tracemalloc makes allocation heavy stages several times slower, use trace_memory=False for timings.
+# With cprofile_dir set, every outermost stage also runs under cProfile and is dumped to
+# <cprofile_dir>/<prefix><stage>.prof (readable with pstats or snakeviz).
+# A disabled profiler (StageProfiler(enabled=False), see NULL_PROFILER) does nothing, so solver code
+# can always call it.
+
+PROFILE_FIELDS = ["stage", "calls", "time_s", "peak_mem_mb"]
+
+class StageProfiler:
+    def __init__(self, enabled=True, trace_memory=True, cprofile_dir=None, prefix=""):
+        self.enabled = enabled
+        self.trace_memory = trace_memory and enabled
+        self.cprofile_dir = cprofile_dir if enabled else None
+        self.prefix = prefix
+        self.stages = {}
+        self._stack = []
+        self._started_tracing = False
+
+        if self.cprofile_dir:
+            os.makedirs(self.cprofile_dir, exist_ok=True)
+
+    def _record(self, name):
+        rec = self.stages.get(name)
+        if rec is None:
+            rec = {"stage": name, "calls": 0, "time_s": 0.0, "peak_mem_mb": 0.0, "sizes": {}}
+            self.stages[name] = rec
+        return rec
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+        # reset_peak is global, so save the peak seen so far by the enclosing stage first
+        if self.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                self._stack[-1][1] = max(self._stack[-1][1], peak)
+            tracemalloc.reset_peak()
+            base = current
+        else:
+            base = 0
+
+        frame = [name, 0, base]
+        self._stack.append(frame)
+
+        # Only one cProfile can be active, nested stages are part of the outer dump
+        prof = None
+        if self.cprofile_dir and len(self._stack) == 1:
+            prof = cProfile.Profile()
+            prof.enable()
+
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - t0
+
+            if prof is not None:
+                prof.disable()
+                prof.dump_stats(os.path.join(self.cprofile_dir, f"{self.prefix}{name}.prof"))
+
+            self._stack.pop()
+            rec = self._record(name)
+            rec["calls"] += 1
+            rec["time_s"] += elapsed
+
+            if self.trace_memory:
+                peak = max(frame[1], tracemalloc.get_traced_memory()[1])
+                rec["peak_mem_mb"] = max(rec["peak_mem_mb"], (peak - frame[2]) / 2**20)
+                if self._stack:
+                    self._stack[-1][1] = max(self._stack[-1][1], peak)
+
+    # Graph sizes (or any other counts) of a stage, e.g. nodes, edges, supply, demand, components
+    def sizes(self, name, **sizes):
+        if not self.enabled:
+            return
+        self._record(name)["sizes"].update(sizes)
+
+    def stop(self):
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    # One flat row per stage, sizes as extra columns
+    def rows(self):
+        rows = []
+        for rec in self.stages.values():
+            row = {k: rec[k] for k in PROFILE_FIELDS}
+            row.update(rec["sizes"])
+            rows.append(row)
+        return rows
+
+    def to_dict(self, **meta):
+        return {"meta": meta, "stages": list(self.stages.values())}
+
+    def write_json(self, path, **meta):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(**meta), f, indent=2, default=str)
+
+    def write_csv(self, path):
+        rows = self.rows()
+        fields = list(PROFILE_FIELDS)
+        for row in rows:
+            for k in row:
+                if k not in fields:
+                    fields.append(k)
+
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(rows)
+
+    def summary(self):
+        return " - ".join(f"{rec['stage']} {rec['time_s']:.3f}s" for rec in self.stages.values())
+
+NULL_PROFILER = StageProfiler(enabled=False)
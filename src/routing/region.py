@@ -0,0 +1,63 @@
+import numpy as np
+import networkx as nx
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components, dijkstra
+from src.routing.csr import *
+
+# Search region of a block. Deadhead paths (transportation, component connection, force_balance)
+# nearly always stay close to the swept streets, so the searches run on the part of F that is
+# within margin_m meters of driving from or to a node of G instead of the whole city.
+#
+# The region is a subgraph view of F, its CSR view is cut from the CSR view of F with a node mask
+# and registered for the view, so Dijkstra arrays and adjacency lists scale with the block and not
+# with the city. F is strongly connected, so as long as all nodes of G are strongly connected
+# inside the region every supply/demand pair and component pair can be reached there. Otherwise
+# the margin is doubled up to REGION_TRIES times and then the full F is used.
+
+REGION_MARGIN = 1000.0  # m
+REGION_TRIES = 3
+
+def _length_matrix(csr):
+    # Explicit zeros would not count as arcs
+    return csr_matrix((np.maximum(csr.length, 1e-9), csr.indices, csr.indptr), shape=(len(csr), len(csr)))
+
+# Mask over csr node indices: nodes reachable from or reaching one of sources within radius meters
+def nodes_within(csr, sources, radius):
+    M = _length_matrix(csr)
+    forward = dijkstra(M, indices=sources, min_only=True, limit=radius)
+    backward = dijkstra(M.T, indices=sources, min_only=True, limit=radius)
+    return np.isfinite(forward) | np.isfinite(backward)
+
+# True if the given node indices of csr lie in one strongly connected component
+def strongly_connected_within(csr, idx):
+    _, labels = connected_components(_length_matrix(csr), directed=True, connection="strong")
+    return len(set(labels[idx].tolist())) <= 1
+
+# Subgraph view of F around the nodes with its CSR view registered, or F itself when the nodes
+# are not strongly connected within tries margins. margin_m=None always returns F.
+def search_region(F, nodes, margin_m=REGION_MARGIN, tries=REGION_TRIES, weight_attr="cost"):
+    if margin_m is None:
+        return F
+
+    csr = get_csr(F, weight_attr=weight_attr)
+    sources = np.array([csr.index[n] for n in nodes], dtype=np.int64)
+    if len(sources) == 0:
+        return F
+
+    for i in range(tries):
+        keep = nodes_within(csr, sources, margin_m * 2 ** i)
+        if keep.all():
+            return F
+
+        sub = csr.subgraph(keep)
+        if strongly_connected_within(sub, np.array([sub.index[n] for n in nodes], dtype=np.int64)):
+            R = F.subgraph(sub.node_ids)
+            register_csr(R, sub)
+            return R
+
+    return F
+
+# The region as an independent graph, e.g. to send it to a worker process. A subgraph view would
+# pickle the whole F along.
+def region_copy(F, R):
+    return R if R is F else R.copy()
@@ -7,29 +7,90 @@ from src.routing.connectivity import *
 from src.routing.tour.tour import *
 from src.routing.force_balance import *
 from src.routing.split_routes import *
+from src.routing.solution_cache import *
+from src.routing.profiling import *
+from src.routing.incremental import *
+from src.routing.region import *
 
 # F = Full road network
 # G = Route-First -> Network after regulations, Cluster-First -> Network of one cluster
-def solve_route(F, G, route_time):
-    imbalance = compute_node_imbalance(G)
+# split_mode = "greedy" or "optimal" (see split_tour). depot = optional F node routes start and end at.
+# merge_mode = how subcycles are joined into the giant tour (see generate_subcycle_tour)
+# region_margin = deadhead searches run on F within this many meters of G (see search_region), None = full F (default)
+# profiler = optional StageProfiler that records time, memory and graph sizes per stage
+def solve_route(F, G, route_time, split_mode="greedy", depot=None, lookahead=None, merge_mode="turn_aware", region_margin=None, profiler=None):
+    profiler = profiler or NULL_PROFILER
+
+    E, H, tour = solve_giant_tour(F, G, merge_mode=merge_mode, region_margin=region_margin, profiler=profiler)
+
+    max_route_time = route_time * 3600
+    with profiler.stage("split"):
+        routes = split_tour(E, tour, max_route_time, mode=split_mode, F=F, depot=depot, lookahead=lookahead)
+    profiler.sizes("split", routes=len(routes))
+
+    return E, H, routes, tour
+
+def _graph_sizes(X):
+    return {"nodes": X.number_of_nodes(), "edges": X.number_of_edges()}
+
+# Everything up to the giant tour. Does not depend on the route time.
+def solve_giant_tour(F, G, weight_attr="cost", merge_mode="turn_aware", region_margin=None, profiler=None):
+    profiler = profiler or NULL_PROFILER
+
+    # Deadhead searches only see F around G, the split still gets the full F for the depot
+    with profiler.stage("region"):
+        F = search_region(F, G.nodes, margin_m=region_margin, weight_attr=weight_attr)
+    profiler.sizes("region", **_graph_sizes(F))
+
+    with profiler.stage("imbalance"):
+        imbalance = ImbalanceTracker(G)
+    profiler.sizes("imbalance", **_graph_sizes(G), supply=len(imbalance.supply), demand=len(imbalance.demand))
 
     # Solve transportation problem and make all nodes in G balanced (H can include streets from outside of G network)
-    H, info = make_balanced_H(G, F, imbalance, weight_attr="cost")
+    with profiler.stage("transportation"):
+        H, info = make_balanced_H(G, F, imbalance, weight_attr=weight_attr)
 
-    ensure_node_coordinates(H, F)
+        ensure_node_coordinates(H, F)
+    profiler.sizes("transportation", **_graph_sizes(H), arcs=info.get("arcs", 0), neighbors=info.get("neighbors"), researched=info.get("researched", 0), search_s=info.get("search_time", 0.0), flow_s=info.get("solve_time", 0.0))
 
-    components = get_weak_components(H)
+    with profiler.stage("connectivity"):
+        components = get_weak_components(H)
 
-    E = connect_components_to_form_E(H, F, components, weight_attr="cost")
+        E = connect_components_to_form_E(H, F, components, weight_attr=weight_attr)
+    profiler.sizes("connectivity", **_graph_sizes(E), components=len(components))
 
-    force_balance(E, F)
+    with profiler.stage("force_balance"):
+        force_balance(E, F, weight=weight_attr)
+    profiler.sizes("force_balance", **_graph_sizes(E))
 
-    tour, cycles = generate_subcycle_tour(E)
+    tour, cycles = generate_subcycle_tour(E, merge_mode=merge_mode, profiler=profiler)
 
     # print("[INFO] subcycles:", len(cycles))
     # print("[INFO] tour edges:", len(tour))
 
+    return E, H, tour
+
+# solve_route with E, H and the giant tour reused from the solution cache when the same
+# road types were solved before. Only the split by route time runs again on a hit.
+def solve_route_cached(F, G, allowed_roads, route_time, cache, weight_attr="cost", split_mode="greedy", depot=None, lookahead=None, merge_mode="turn_aware", region_margin=None, profiler=None):
+    profiler = profiler or NULL_PROFILER
+
+    key = solution_key(F, allowed_roads, weight_attr=weight_attr, merge_mode=merge_mode, region_margin=region_margin)
+
+    with profiler.stage("cache_lookup"):
+        entry = cache.get(key)
+    profiler.sizes("cache_lookup", hit=int(entry is not None))
+
+    if entry is None:
+        E, H, tour = solve_giant_tour(F, G, weight_attr=weight_attr, merge_mode=merge_mode, region_margin=region_margin, profiler=profiler)
+        with profiler.stage("cache_store"):
+            cache.put(key, E, H, tour)
+    else:
+        E, H, tour = entry
+
     max_route_time = route_time * 3600
-    routes = split_giant_tour(E, tour, max_route_time)
+    with profiler.stage("split"):
+        routes = split_tour(E, tour, max_route_time, mode=split_mode, F=F, depot=depot, lookahead=lookahead)
+    profiler.sizes("split", routes=len(routes))
 
     return E, H, routes, tour
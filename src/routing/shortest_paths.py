@@ -0,0 +1,214 @@
+import heapq
+import numpy as np
+import networkx as nx
+from src.routing.csr import *
+from src.routing.contraction import *
+
+# Shortest path engine shared by the routing stages. Searches run on the CSR view of F.
+# Searches stop as soon as every target node is settled (or the distance cap is passed) and only
+# keep a predecessor per reached node. Paths are rebuilt with reconstruct_path for the pairs
+# that are actually used.
+# When a contraction hierarchy is registered for F and the weight (see contraction.py), the point
+# to point queries shortest_path and shortest_path_length run on it and give the same distances.
+
+def _csr_index(csr, node):
+    i = csr.index.get(node)
+    if i is None:
+        raise nx.NodeNotFound(f"Node {node} not in F")
+    return i
+
+# Dijkstra over CSR indices. Returns dist and pred dicts keyed by index.
+# max_targets: stop once this many targets are settled (the nearest ones)
+def _csr_dijkstra(csr, sources, targets=None, cutoff=None, max_targets=None):
+    indptr, indices, weight = csr.adjacency_lists()
+
+    remaining = set(targets) if targets is not None else None
+    settled = 0
+
+    dist = {}
+    pred = {}
+    seen = {}
+    heap = []
+    for s in sources:
+        pred[s] = None
+        seen[s] = 0.0
+        heap.append((0.0, s))
+    heapq.heapify(heap)
+
+    while heap:
+        d, i = heapq.heappop(heap)
+        if i in dist:
+            continue
+
+        if cutoff is not None and d > cutoff:
+            break
+
+        dist[i] = d
+
+        if remaining is not None and i in remaining:
+            remaining.discard(i)
+            settled += 1
+            if not remaining or settled == max_targets:
+                break
+
+        for p in range(indptr[i], indptr[i + 1]):
+            j = indices[p]
+            nd = d + weight[p]
+            if j not in dist and nd < seen.get(j, float("inf")):
+                seen[j] = nd
+                pred[j] = i
+                heapq.heappush(heap, (nd, j))
+
+    return dist, pred
+
+# Predecessors of a search, read with node ids. Conversion happens only for the nodes
+# reconstruct_path walks through.
+class PredecessorMap:
+    def __init__(self, csr, pred):
+        self.csr = csr
+        self.pred = pred
+
+    def __getitem__(self, node):
+        p = self.pred[self.csr.index[node]]
+        return None if p is None else self.csr.node_ids[p]
+
+    def __contains__(self, node):
+        return self.csr.index.get(node) in self.pred
+
+# reverse=True searches along reversed edges, giving distances from every node to source
+def _search(F, source, targets, weight_attr, cutoff, reverse=False, max_targets=None):
+    csr = get_csr(F, weight_attr=weight_attr)
+    if reverse:
+        csr = csr.transposed()
+
+    s = _csr_index(csr, source)
+    target_idx = None
+    if targets is not None:
+        target_idx = {csr.index[t] for t in targets if t in csr.index and t != source}
+
+    dist_i, pred_i = _csr_dijkstra(csr, [s], target_idx, cutoff=cutoff, max_targets=max_targets)
+    return csr, dist_i, pred_i
+
+def dijkstra_to_targets(F, source, targets=None, weight_attr="cost", cutoff=None, reverse=False):
+    csr, dist_i, pred_i = _search(F, source, targets, weight_attr, cutoff, reverse=reverse)
+    node_ids = csr.node_ids
+
+    dist = {node_ids[i]: d for i, d in dist_i.items()}
+    return dist, PredecessorMap(csr, pred_i)
+
+# Rebuilds the node path source -> target from a predecessor map
+def reconstruct_path(pred, target):
+    path = [target]
+    p = pred[target]
+    while p is not None:
+        path.append(p)
+        p = pred[p]
+    path.reverse()
+    return path
+
+# Distances and predecessor maps from every source, each search limited to the given targets.
+# max_targets: every search stops after its max_targets nearest targets
+# Returns: dists[s][t] for reached targets and preds[s] to rebuild paths with reconstruct_path
+def dijkstra_many_to_many(F, sources, targets, weight_attr="cost", cutoff=None, max_targets=None):
+    csr = get_csr(F, weight_attr=weight_attr)
+    node_ids = csr.node_ids
+    target_idx = {csr.index[t] for t in targets if t in csr.index}
+
+    dists = {}
+    preds = {}
+
+    for s in sources:
+        i = _csr_index(csr, s)
+        dist_i, pred_i = _csr_dijkstra(csr, [i], target_idx - {i} if i in target_idx else target_idx, cutoff=cutoff, max_targets=max_targets)
+
+        # Read whichever is smaller, the settled nodes or the targets
+        if len(dist_i) < len(target_idx):
+            dists[s] = {node_ids[j]: d for j, d in dist_i.items() if j in target_idx and j != i}
+        else:
+            dists[s] = {node_ids[j]: dist_i[j] for j in target_idx if j in dist_i and j != i}
+        preds[s] = PredecessorMap(csr, pred_i)
+
+    return dists, preds
+
+# Point to point queries. Same contract as nx.shortest_path / nx.shortest_path_length.
+def shortest_path(F, source, target, weight_attr="cost"):
+    ch = get_contraction(F, weight_attr=weight_attr)
+    if ch is not None:
+        path = ch.path(source, target)
+        if path is None:
+            raise nx.NetworkXNoPath(f"No path between {source} and {target}.")
+        return path
+
+    dist, pred = dijkstra_to_targets(F, source, [target], weight_attr=weight_attr)
+    if target not in dist:
+        raise nx.NetworkXNoPath(f"No path between {source} and {target}.")
+    return reconstruct_path(pred, target)
+
+def shortest_path_length(F, source, target, weight_attr="cost"):
+    ch = get_contraction(F, weight_attr=weight_attr)
+    if ch is not None:
+        d = ch.distance(source, target)
+        if d == float("inf"):
+            raise nx.NetworkXNoPath(f"No path between {source} and {target}.")
+        return d
+
+    dist, _ = dijkstra_to_targets(F, source, [target], weight_attr=weight_attr)
+    if target not in dist:
+        raise nx.NetworkXNoPath(f"No path between {source} and {target}.")
+    return dist[target]
+
+# Path from the nearest of the sources to the nearest of the targets, one search from all sources
+# at once that stops at the first settled target. Raises nx.NetworkXNoPath if no target is reachable.
+def nearest_path(F, sources, targets, weight_attr="cost"):
+    csr = get_csr(F, weight_attr=weight_attr)
+    source_idx = [_csr_index(csr, s) for s in sources]
+    target_idx = {csr.index[t] for t in targets if t in csr.index}
+
+    dist_i, pred_i = _csr_dijkstra(csr, source_idx, target_idx, max_targets=1)
+    reached = [i for i in dist_i if i in target_idx]
+    if not reached:
+        raise nx.NetworkXNoPath("No path from the sources to any target.")
+    return reconstruct_path(PredecessorMap(csr, pred_i), csr.node_ids[reached[0]])
+
+# One Dijkstra from all sources at once (distance 0 at every source). Every reached node is
+# labelled with the source it is closest to, which gives the Voronoi regions of the sources.
+# Returns the CSR view searched and arrays over its node indices:
+#   dist (inf = unreached), pred (-1 = source or unreached), origin (index of the closest source, -1 = unreached)
+def voronoi_search(F, sources, weight_attr="cost", reverse=False):
+    csr = get_csr(F, weight_attr=weight_attr)
+    if reverse:
+        csr = csr.transposed()
+    indptr, indices, weight = csr.adjacency_lists()
+
+    n = len(csr)
+    inf = float("inf")
+    dist = [inf] * n
+    pred = [-1] * n
+    origin = [-1] * n
+    done = [False] * n
+
+    heap = []
+    for s in sources:
+        i = _csr_index(csr, s)
+        dist[i] = 0.0
+        origin[i] = i
+        heap.append((0.0, i))
+    heapq.heapify(heap)
+
+    while heap:
+        d, i = heapq.heappop(heap)
+        if done[i]:
+            continue
+        done[i] = True
+
+        o = origin[i]
+        for p in range(indptr[i], indptr[i + 1]):
+            j = indices[p]
+            nd = d + weight[p]
+            if nd < dist[j]:
+                dist[j] = nd
+                pred[j] = i
+                origin[j] = o
+                heapq.heappush(heap, (nd, j))
+
+    return csr, np.array(dist), np.array(pred, dtype=np.int64), np.array(origin, dtype=np.int64)
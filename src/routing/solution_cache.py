@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+import pickle
+import weakref
+from src.routing.tour.pair import *
+
+# Cache of solved giant tours. Schedule blocks with the same road types only differ in their time
+# window, so E, H and the giant tour can be reused and only split_giant_tour runs again.
+# Entries are pickled to disk and evicted least recently used first, so nightly re-runs start warm.
+
+# Bump when a change to the solver changes E, H or the tour for the same input
+SOLUTION_CACHE_VERSION = 7
+
+DEFAULT_SOLUTION_CACHE_DIR = "dat/cache/solutions"
+
+_FINGERPRINT_CACHE = weakref.WeakKeyDictionary()
+
+# Content hash of F. Uses the hash of the GraphML file F was loaded from when there is one.
+def graph_fingerprint(F):
+    fp = _FINGERPRINT_CACHE.get(F)
+    if fp is not None:
+        return fp
+
+    if "source_hash" in F.graph:
+        fp = F.graph["source_hash"]
+    else:
+        h = hashlib.sha256()
+        for u, v, k, data in F.edges(keys=True, data=True):
+            h.update(repr((u, v, k, data.get("highway"), data.get("length"), data.get("cost"))).encode())
+        fp = h.hexdigest()
+
+    _FINGERPRINT_CACHE[F] = fp
+    return fp
+
+def solution_key(F, allowed_roads, weight_attr="cost", **solver_params):
+    payload = {
+        "version": SOLUTION_CACHE_VERSION,
+        "graph": graph_fingerprint(F),
+        "roads": sorted(allowed_roads),
+        "weight": weight_attr,
+        "penalties": penalty_params(),
+        "solver": solver_params,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+class SolutionCache:
+    def __init__(self, cache_dir=DEFAULT_SOLUTION_CACHE_DIR, max_entries=32):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.memory = {}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".pkl")
+
+    # Returns (E, H, tour) or None
+    def get(self, key):
+        if key in self.memory:
+            return self.memory[key]
+
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with open(path, "rb") as f:
+                entry = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+        # Touch the file so eviction sees it as recently used
+        os.utime(path)
+        self.memory[key] = entry
+        return entry
+
+    def put(self, key, E, H, tour):
+        entry = (E, H, tour)
+        self.memory[key] = entry
+
+        # Write to a temporary file first so parallel workers never read half written entries
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+        self.evict()
+
+    # Removes the least recently used entries above max_entries
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".pkl"):
+                path = os.path.join(self.cache_dir, name)
+                entries.append((os.path.getmtime(path), path))
+
+        entries.sort()
+        for _, path in entries[:max(0, len(entries) - self.max_entries)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
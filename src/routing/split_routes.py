@@ -1,8 +1,14 @@
-from typing import List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, Optional
+import numpy as np
 import networkx as nx
+from src.routing.shortest_paths import *
 
 Edge = Tuple[int, int, int]  # (u,v,key)
 
+SWEEP_SPEED = 1.9      # m/s
+DEADHEAD_SPEED = 3.6   # m/s
+DEFAULT_SPEED = 2.5    # m/s
+
 def edge_time_old(E: nx.MultiDiGraph, e: Edge, time_attr: str = "cost") -> float:
     u, v, k = e
     data = E[u][v][k]
@@ -20,11 +26,11 @@ def edge_time(E, e, time_attr: str = "cost"):
     length = d.get("length",0)
 
     if d.get("mode") == "SWEEP":
-        speed = 1.9   # m/s
+        speed = SWEEP_SPEED
     elif d.get("mode") == "DEADHEAD":
-        speed = 3.6   # m/s
+        speed = DEADHEAD_SPEED
     else:
-        return length / 2.5
+        return length / DEFAULT_SPEED
 
     return length / speed
 
@@ -58,6 +64,107 @@ def split_giant_tour(
 
     return routes
 
+# Deadhead times from the depot to each node and from each node back to the depot, driving F
+# at deadhead speed. Nodes that cannot be reached get inf.
+def depot_deadhead_times(F, depot, nodes):
+    nodes = set(nodes)
+    dist_out, _ = dijkstra_to_targets(F, depot, nodes, weight_attr="length")
+    dist_back, _ = dijkstra_to_targets(F, depot, nodes, weight_attr="length", reverse=True)
+
+    inf = float("inf")
+    to_node = {n: dist_out.get(n, inf) / DEADHEAD_SPEED for n in nodes}
+    to_depot = {n: dist_back.get(n, inf) / DEADHEAD_SPEED for n in nodes}
+    return to_node, to_depot
+
+# Optimal split of the giant tour into consecutive routes (Ulusoy / Beasley route-first split).
+# A route covering tour[i:j] takes depot -> start of tour[i], the tour edges, end of tour[j-1] -> depot.
+# Minimizes the number of routes first and the total time (with depot legs) second.
+# Dynamic programming over tour positions. Each position looks back at most `lookahead` edges,
+# and never further than the route time allows, so the cost is O(n * lookahead).
+def split_giant_tour_optimal(
+    E: nx.MultiDiGraph,
+    tour: List[Edge],
+    max_route_time: float,
+    F: Optional[nx.MultiDiGraph] = None,
+    depot: Optional[int] = None,
+    lookahead: Optional[int] = None,
+    time_attr: str = "cost",
+) -> List[List[Edge]]:
+    n = len(tour)
+    if n == 0:
+        return []
+
+    # prefix[j] = time of tour[0:j]
+    prefix = np.zeros(n + 1)
+    prefix[1:] = np.cumsum([edge_time(E, e, time_attr=time_attr) for e in tour])
+
+    # depot_in[i]: depot -> start of tour[i], depot_out[j]: end of tour[j-1] -> depot
+    depot_in = np.zeros(n + 1)
+    depot_out = np.zeros(n + 1)
+    if depot is not None:
+        if F is None:
+            raise ValueError("F is required to compute deadhead times from and to the depot")
+        to_node, to_depot = depot_deadhead_times(F, depot, {u for u, _, _ in tour} | {v for _, v, _ in tour})
+        depot_in[:n] = [to_node[u] for u, _, _ in tour]
+        depot_out[1:] = [to_depot[v] for _, v, _ in tour]
+
+    # c[i] + prefix[j] + depot_out[j] is the duration of route tour[i:j]
+    c = depot_in - prefix
+
+    count = np.full(n + 1, np.iinfo(np.int64).max, dtype=np.int64)
+    total = np.full(n + 1, np.inf)
+    parent = np.zeros(n + 1, dtype=np.int64)
+    count[0] = 0
+    total[0] = 0.0
+
+    lo = 0
+    for j in range(1, n + 1):
+        # Routes are at most max_route_time long even without depot legs
+        while prefix[j] - prefix[lo] > max_route_time and lo < j - 1:
+            lo += 1
+        start = lo if lookahead is None else max(lo, j - lookahead)
+
+        duration = c[start:j] + (prefix[j] + depot_out[j])
+        feasible = duration <= max_route_time
+        # A single edge is always a route on its own, even if it is too long
+        feasible[-1] = True
+
+        cand_count = np.where(feasible, count[start:j], np.iinfo(np.int64).max)
+        best = cand_count.min()
+        cand_total = np.where(cand_count == best, total[start:j] + duration, np.inf)
+        i = start + int(np.argmin(cand_total))
+
+        count[j] = count[i] + 1
+        total[j] = total[i] + duration[i - start]
+        parent[j] = i
+
+    routes: List[List[Edge]] = []
+    j = n
+    while j > 0:
+        i = int(parent[j])
+        routes.append(tour[i:j])
+        j = i
+    routes.reverse()
+
+    return routes
+
+# mode: "greedy" cuts the tour whenever the next edge would pass max_route_time,
+# "optimal" uses split_giant_tour_optimal
+def split_tour(
+    E: nx.MultiDiGraph,
+    tour: List[Edge],
+    max_route_time: float,
+    mode: str = "greedy",
+    F: Optional[nx.MultiDiGraph] = None,
+    depot: Optional[int] = None,
+    lookahead: Optional[int] = None,
+) -> List[List[Edge]]:
+    if mode == "greedy":
+        return split_giant_tour(E, tour, max_route_time)
+    if mode == "optimal":
+        return split_giant_tour_optimal(E, tour, max_route_time, F=F, depot=depot, lookahead=lookahead)
+    raise ValueError(f"Unknown split mode: {mode}")
+
 def route_stats(E: nx.MultiDiGraph, route: List[Edge], time_attr: str = "cost") -> Dict[str, Any]:
     sweep_t = 0.0
     dead_t = 0.0
@@ -1,35 +1,158 @@
 import math
+import numpy as np
 import networkx as nx
+import shapely
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:
+    linear_sum_assignment = None
+
+# Pairs every incoming edge of a node with an outgoing edge so that the sum of turn and mode
+# switch penalties is minimal. Bearings are computed once per edge and cost matrices with NumPy.
+# Degree 1 and 2 nodes (most of a street network) are solved in closed form for all nodes at once,
+# larger nodes by an assignment solver.
+# nodes = only pair the edges at these nodes (default: every node of E)
+def compute_local_pairings(E, nodes=None):
+    if nodes is None:
+        nodes = E.nodes()
+        edges = list(E.edges(keys=True))
+    else:
+        nodes = [n for n in nodes if n in E]
+        edges = list(dict.fromkeys(
+            e for n in nodes for e in (*E.in_edges(n, keys=True), *E.out_edges(n, keys=True))
+        ))
+    bearing_in, bearing_out, modes = edge_bearings(E, edges)
+
+    in_idx = {}
+    out_idx = {}
+    for i, (u, v, k) in enumerate(edges):
+        out_idx.setdefault(u, []).append(i)
+        in_idx.setdefault(v, []).append(i)
 
-def compute_local_pairings(E):
     pairing = {}
+    deg2_in = []
+    deg2_out = []
 
-    for n in E.nodes():
-        in_edges = list(E.in_edges(n, keys=True))
-        out_edges = list(E.out_edges(n, keys=True))
+    for n in nodes:
+        ins = in_idx.get(n, [])
+        outs = out_idx.get(n, [])
 
-        if len(in_edges) != len(out_edges):
+        if len(ins) != len(outs):
             raise ValueError(
-                f"Node {n} not balanced: in={len(in_edges)} out={len(out_edges)}. "
+                f"Node {n} not balanced: in={len(ins)} out={len(outs)}. "
                 "Transportation step must be balanced. H is not balanced."
             )
 
-        m = len(in_edges)
+        m = len(ins)
         if m == 0:
             continue
 
-        cost = [[0.0] * m for _ in range(m)]
-        for i, ine in enumerate(in_edges):
-            for j, oute in enumerate(out_edges):
-                cost[i][j] = pairing_cost(E, ine, oute)
-
-        assign = hungarian_min_cost(cost)
-
-        for i, j in enumerate(assign):
-            pairing[in_edges[i]] = out_edges[j]
+        if m == 1:
+            pairing[edges[ins[0]]] = edges[outs[0]]
+        elif m == 2:
+            deg2_in.append(ins)
+            deg2_out.append(outs)
+        else:
+            cost = pairing_cost_matrix(bearing_in, bearing_out, modes, ins, outs)
+            for i, j in zip(*_assign(cost)):
+                pairing[edges[ins[i]]] = edges[outs[j]]
+
+    if deg2_in:
+        ins = np.array(deg2_in)
+        outs = np.array(deg2_out)
+
+        def c(i, j):
+            return _pair_costs(bearing_in[ins[:, i]], bearing_out[outs[:, j]], modes[ins[:, i]], modes[outs[:, j]])
+
+        # Keep in0->out0, in1->out1 unless crossing over is strictly cheaper
+        cross = c(0, 1) + c(1, 0) < c(0, 0) + c(1, 1)
+        for (i0, i1), (o0, o1), x in zip(deg2_in, deg2_out, cross.tolist()):
+            if x:
+                o0, o1 = o1, o0
+            pairing[edges[i0]] = edges[o0]
+            pairing[edges[i1]] = edges[o1]
 
     return pairing
 
+# Row and column indices of the min cost assignment
+def _assign(cost):
+    if linear_sum_assignment is not None:
+        return linear_sum_assignment(cost)
+    assign = hungarian_min_cost(cost.tolist())
+    return range(len(assign)), assign
+
+# Integer code per edge mode for the cost matrices. -1 = no mode, which never pays a switch penalty.
+_MODE_CODES = {None: -1}
+
+def _mode_code(mode):
+    if mode not in _MODE_CODES:
+        _MODE_CODES[mode] = len(_MODE_CODES)
+    return _MODE_CODES[mode]
+
+# Bearing at the end of each edge (arriving), at its start (leaving) and a mode code per edge.
+# Edges without geometry use the coordinates of their end nodes.
+def edge_bearings(E, edges):
+    m = len(edges)
+    x1 = np.empty(m)
+    y1 = np.empty(m)
+    x2 = np.empty(m)
+    y2 = np.empty(m)
+    modes = np.empty(m, dtype=np.int64)
+
+    geoms = []
+    geom_pos = []
+    for i, (u, v, k) in enumerate(edges):
+        data = E[u][v][k]
+        modes[i] = _mode_code(data.get("mode", None))
+
+        geom = data.get("geometry", None)
+        if geom is not None and hasattr(geom, "coords"):
+            geoms.append(geom)
+            geom_pos.append(i)
+
+        x1[i], y1[i] = E.nodes[u]["x"], E.nodes[u]["y"]
+        x2[i], y2[i] = E.nodes[v]["x"], E.nodes[v]["y"]
+
+    bearing_in = _bearing_deg_array(x1, y1, x2, y2)
+    bearing_out = bearing_in.copy()
+
+    if geoms:
+        coords, owner = shapely.get_coordinates(np.array(geoms, dtype=object), return_index=True)
+        counts = np.bincount(owner, minlength=len(geoms))
+        last = np.cumsum(counts) - 1
+        first = last - counts + 1
+
+        ok = counts >= 2
+        pos = np.array(geom_pos)[ok]
+        f, l = first[ok], last[ok]
+
+        bearing_out[pos] = _bearing_deg_array(coords[f, 0], coords[f, 1], coords[f + 1, 0], coords[f + 1, 1])
+        bearing_in[pos] = _bearing_deg_array(coords[l - 1, 0], coords[l - 1, 1], coords[l, 0], coords[l, 1])
+
+    return bearing_in, bearing_out, modes
+
+def _bearing_deg_array(x1, y1, x2, y2):
+    return (np.degrees(np.arctan2(x2 - x1, y2 - y1)) + 360.0) % 360.0
+
+def turn_penalty_array(angle_deg):
+    out = np.zeros(np.shape(angle_deg))
+    for min_angle, penalty in reversed(TURN_PENALTIES):
+        out = np.where(angle_deg >= min_angle, penalty, out)
+    return out
+
+# Elementwise pairing_cost for arrays of in/out bearings and mode codes
+def _pair_costs(b_in, b_out, m_in, m_out):
+    d = np.abs(b_in - b_out) % 360.0
+    ang = np.minimum(d, 360.0 - d)
+    switch = (m_in != m_out) & (m_in >= 0) & (m_out >= 0)
+    return turn_penalty_array(ang) + np.where(switch, MODE_SWITCH_PENALTY, 0.0)
+
+def pairing_cost_matrix(bearing_in, bearing_out, modes, ins, outs):
+    ins = np.asarray(ins)
+    outs = np.asarray(outs)
+    return _pair_costs(bearing_in[ins][:, None], bearing_out[outs][None, :], modes[ins][:, None], modes[outs][None, :])
+
 def pairing_cost(E, in_edge, out_edge) -> float:
     u, n, ki = in_edge
     n2, v, ko = out_edge
@@ -94,22 +217,31 @@ def hungarian_min_cost(cost):
     return assignment
 
 
+# Turn penalties as (minimum turn angle in degrees, penalty), sharpest turn first
+TURN_PENALTIES = (
+    (150, 1000.0),
+    (120, 20.0),
+    (90, 10.0),
+    (45, 3.0),
+)
+
+MODE_SWITCH_PENALTY = 2.0
+
 def turn_penalty(angle_deg: float) -> float:
-    if angle_deg >= 150:
-        return 1000.0
-    if angle_deg >= 120:
-        return 20.0
-    if angle_deg >= 90:
-        return 10.0
-    if angle_deg >= 45:
-        return 3.0
+    for min_angle, penalty in TURN_PENALTIES:
+        if angle_deg >= min_angle:
+            return penalty
     return 0.0
 
 
 def mode_switch_penalty(in_mode: str, out_mode: str) -> float:
     if in_mode is None or out_mode is None:
         return 0.0
-    return 2.0 if in_mode != out_mode else 0.0
+    return MODE_SWITCH_PENALTY if in_mode != out_mode else 0.0
+
+# All pairing penalty parameters. Part of the solution cache key.
+def penalty_params():
+    return {"turn": [list(t) for t in TURN_PENALTIES], "mode_switch": MODE_SWITCH_PENALTY}
 
 def _bearing_deg(x1, y1, x2, y2) -> float:
     dx = x2 - x1
@@ -1,3 +1,6 @@
+import heapq
+from src.routing.tour.pair import *
+
 def enumerate_subcycles(E, pairing):
     unused = set(E.edges(keys=True))
     cycles = []
@@ -28,57 +31,164 @@ def enumerate_subcycles(E, pairing):
 
     return cycles
 
-def _cycle_nodes(edge_cycle):
-    nodes = [edge_cycle[0][0]]
-    for u, v, k in edge_cycle:
-        nodes.append(v)
-    return nodes
-
-
-def _rotate_cycle_to_start_at_node(edge_cycle, node):
-    nodes = _cycle_nodes(edge_cycle)
-    m = len(edge_cycle)
-
-    for t in range(m):
-        if edge_cycle[t][0] == node:
-            return edge_cycle[t:] + edge_cycle[:t]
-
-    for t in range(m):
-        if nodes[t] == node:
-            return edge_cycle[t % m:] + edge_cycle[:t % m]
-    raise ValueError("Node not found in cycle")
-
-
+# Merges edge-disjoint cycles into one closed tour in O(total edges).
+# Every edge points to its successor in its cycle. Two cycles that both enter node x are merged
+# by swapping the successors of their edges entering x. Union-find keeps track of which cycles
+# are already part of the same closed walk, so every swap joins two different walks.
 def merge_subcycles(cycles):
     if not cycles:
         return []
 
-    tour = cycles[0]
-    remaining = cycles[1:]
-
-    while remaining:
-        tour_nodes = set(_cycle_nodes(tour))
-
-        merged = False
-        for idx, cy in enumerate(remaining):
-            cy_nodes = set(_cycle_nodes(cy))
-            common = tour_nodes.intersection(cy_nodes)
-            if not common:
+    succ = {}
+    cycle_of = {}
+    for c, cycle in enumerate(cycles):
+        m = len(cycle)
+        for i, e in enumerate(cycle):
+            succ[e] = cycle[(i + 1) % m]
+            cycle_of[e] = c
+
+    parent = list(range(len(cycles)))
+
+    def find(c):
+        while parent[c] != c:
+            parent[c] = parent[parent[c]]
+            c = parent[c]
+        return c
+
+    # node -> one edge entering it, from the first cycle that reached it
+    entering = {}
+    merges = 0
+
+    for c, cycle in enumerate(cycles):
+        for e in cycle:
+            x = e[1]
+            other = entering.get(x)
+            if other is None:
+                entering[x] = e
                 continue
 
-            x = next(iter(common))  # pick any common node
-            tour_rot = _rotate_cycle_to_start_at_node(tour, x)
-            cy_rot = _rotate_cycle_to_start_at_node(cy, x)
-
-            tour = tour_rot[:1] + cy_rot + tour_rot[1:]
-            remaining.pop(idx)
-            merged = True
-            break
+            ra = find(cycle_of[other])
+            rb = find(c)
+            if ra == rb:
+                continue
 
-        if not merged:
-            raise RuntimeError(
-                "Could not merge remaining subcycles: no common nodes found. "
-                "This suggests cycles lie in disjoint node sets."
-            )
+            # Splice at x
+            succ[other], succ[e] = succ[e], succ[other]
+            parent[rb] = ra
+            merges += 1
+
+    if merges != len(cycles) - 1:
+        raise RuntimeError(
+            "Could not merge remaining subcycles: no common nodes found. "
+            "This suggests cycles lie in disjoint node sets."
+        )
+
+    start = cycles[0][0]
+    tour = [start]
+    e = succ[start]
+    while e != start:
+        tour.append(e)
+        e = succ[e]
+
+    return tour
+
+# Like merge_subcycles, but every splice is chosen by its extra turn cost instead of taking the
+# first shared node. Splicing edges a and b that both enter x changes the pairing at x from
+# a->succ[a], b->succ[b] to a->succ[b], b->succ[a]. All candidate splices go into a heap ordered by
+# that change in pairing_cost and are applied cheapest first, Kruskal style over the cycles.
+# A candidate whose edges were re-paired by an earlier splice is re-rated and pushed again.
+# bearings: optional function giving (bearing_in, bearing_out, modes_in, modes_out) for a list of
+# cycle items that are not edges of E, e.g. pieces of a tour (default: edge_bearings of E)
+def merge_subcycles_turn_aware(E, cycles, bearings=None):
+    if not cycles:
+        return []
 
-    return tour
\ No newline at end of file
+    succ = {}
+    cycle_of = {}
+    entering = {}
+    for c, cycle in enumerate(cycles):
+        m = len(cycle)
+        for i, e in enumerate(cycle):
+            succ[e] = cycle[(i + 1) % m]
+            cycle_of[e] = c
+            entering.setdefault(e[1], []).append(e)
+
+    # Only nodes entered by more than one cycle can be splice points
+    entering = {x: ins for x, ins in entering.items() if len({cycle_of[e] for e in ins}) > 1}
+
+    # Bearings of the edges a splice can pair: the edges entering splice points and their successors
+    edges = list(dict.fromkeys(f for ins in entering.values() for e in ins for f in (e, succ[e])))
+    idx = {e: i for i, e in enumerate(edges)}
+    if bearings is None:
+        bearing_in, bearing_out, modes_in = edge_bearings(E, edges)
+        modes_out = modes_in
+    else:
+        bearing_in, bearing_out, modes_in, modes_out = bearings(edges)
+    bearing_in = bearing_in.tolist()
+    bearing_out = bearing_out.tolist()
+    modes_in = modes_in.tolist()
+    modes_out = modes_out.tolist()
+
+    def cost(a, b):
+        i = idx[a]
+        o = idx[b]
+        d = abs(bearing_in[i] - bearing_out[o]) % 360.0
+        penalty = turn_penalty(min(d, 360.0 - d))
+        if modes_in[i] >= 0 and modes_out[o] >= 0 and modes_in[i] != modes_out[o]:
+            penalty += MODE_SWITCH_PENALTY
+        return penalty
+
+    parent = list(range(len(cycles)))
+
+    def find(c):
+        while parent[c] != c:
+            parent[c] = parent[parent[c]]
+            c = parent[c]
+        return c
+
+    def delta(a, b):
+        return cost(a, succ[b]) + cost(b, succ[a]) - cost(a, succ[a]) - cost(b, succ[b])
+
+    heap = []
+    for x, ins in entering.items():
+        for i in range(len(ins)):
+            for j in range(i + 1, len(ins)):
+                a, b = ins[i], ins[j]
+                if cycle_of[a] != cycle_of[b]:
+                    heap.append((delta(a, b), len(heap), a, b, succ[a], succ[b]))
+    heapq.heapify(heap)
+
+    merges = 0
+    seq = len(heap)
+    while heap and merges < len(cycles) - 1:
+        d, _, a, b, sa, sb = heapq.heappop(heap)
+
+        ra = find(cycle_of[a])
+        rb = find(cycle_of[b])
+        if ra == rb:
+            continue
+
+        # Stale rating, an earlier splice re-paired a or b
+        if succ[a] != sa or succ[b] != sb:
+            heapq.heappush(heap, (delta(a, b), seq, a, b, succ[a], succ[b]))
+            seq += 1
+            continue
+
+        succ[a], succ[b] = succ[b], succ[a]
+        parent[rb] = ra
+        merges += 1
+
+    if merges != len(cycles) - 1:
+        raise RuntimeError(
+            "Could not merge remaining subcycles: no common nodes found. "
+            "This suggests cycles lie in disjoint node sets."
+        )
+
+    start = cycles[0][0]
+    tour = [start]
+    e = succ[start]
+    while e != start:
+        tour.append(e)
+        e = succ[e]
+
+    return tour
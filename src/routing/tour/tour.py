@@ -1,9 +1,54 @@
 from src.routing.tour.pair import *
 from src.routing.tour.subcycle import *
+from src.routing.profiling import *
+from src.routing.overlay import *
 
-def generate_subcycle_tour(E):
-    pairing = compute_local_pairings(E)
-    cycles = enumerate_subcycles(E, pairing)
-    tour = merge_subcycles(cycles)
+# merge_mode = "turn_aware" (splice subcycles where it adds the least turn cost) or "first" (first shared node)
+MERGE_MODES = ("turn_aware", "first")
 
-    return tour, cycles
\ No newline at end of file
+# The tour lists an edge of E once per traversal, deadhead edges with a count appear count times
+def generate_subcycle_tour(E, merge_mode="turn_aware", profiler=None):
+    profiler = profiler or NULL_PROFILER
+
+    with profiler.stage("pairing"):
+        T, base = expand_counts(E)
+        pairing = compute_local_pairings(T)
+
+    with profiler.stage("subcycles"):
+        cycles = enumerate_subcycles(T, pairing)
+    profiler.sizes("subcycles", subcycles=len(cycles))
+
+    with profiler.stage("merge"):
+        tour = merge_cycles(T, cycles, merge_mode=merge_mode)
+    profiler.sizes("merge", tour_edges=len(tour))
+
+    return collapse_counts(tour, base), [collapse_counts(cycle, base) for cycle in cycles]
+
+# Pairing and merging need every traversal as an edge of its own. Returns E itself when no edge has
+# a count above one, else a copy T where an edge with count c has c - 1 extra parallel edges, and
+# the E edge of every extra T edge.
+def expand_counts(E):
+    counted = [(u, v, k, c) for u, v, k, c in E.edges(keys=True, data="count", default=1) if c > 1]
+    if not counted:
+        return E, {}
+
+    T = overlay_copy(E)
+    base = {}
+    for u, v, k, c in counted:
+        data = T[u][v][k]
+        for _ in range(c - 1):
+            base[(u, v, add_edge_ref(T, u, v, data))] = (u, v, k)
+    return T, base
+
+# Edges of T back to the edges of E they were expanded from
+def collapse_counts(edges, base):
+    if not base:
+        return edges
+    return [base.get(e, e) for e in edges]
+
+def merge_cycles(E, cycles, merge_mode="turn_aware", bearings=None):
+    if merge_mode == "turn_aware":
+        return merge_subcycles_turn_aware(E, cycles, bearings=bearings)
+    if merge_mode == "first":
+        return merge_subcycles(cycles)
+    raise ValueError(f"Unknown merge mode: {merge_mode}")
\ No newline at end of file
@@ -1,38 +1,109 @@
+import time
+import numpy as np
 import networkx as nx
-
-def make_balanced_H(G, F, imbalance_data, weight_attr="cost"):
+from src.routing.shortest_paths import *
+from src.routing.overlay import *
+from src.routing.imbalance import *
+
+try:
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import min_weight_full_bipartite_matching
+except ImportError:
+    min_weight_full_bipartite_matching = None
+
+# Candidate arcs of the transportation problem: every supply node only gets arcs to its
+# TRANSPORT_NEIGHBORS nearest demand nodes (see solve_transportation)
+TRANSPORT_NEIGHBORS = 16
+
+# Path costs are shipped as fixed-point integers in 1/COST_SCALE of the weight unit (mm for lengths)
+COST_SCALE = 1000
+
+# imbalance: ImbalanceTracker of G, scanned from G when not given. H gets a copy of it that follows
+# the added deadhead. cutoff: optional cap on the deadhead distance first searched from each supply
+# node, supply nodes that cannot ship everything within it search again without it
+def make_balanced_H(G, F, imbalance=None, weight_attr="cost", cutoff=None):
     # Make sure that weight_attr is stored in edges. Some might not have it.
     ensure_edge_weight(F, weight_attr=weight_attr)
     ensure_edge_weight(G, weight_attr=weight_attr)
 
     # Extract supply and demand nodes
-    supplies, demands = build_supply_demand(imbalance_data)
+    imbalance = imbalance if imbalance is not None else ImbalanceTracker(G)
+    supplies, demands = imbalance.supplies(), imbalance.demands()
 
     # If there are no supply or demand nodes, G is already balanced.
     if not supplies and not demands:
-        return G.copy(), {"transport_cost": 0}
-
-    # Calculate all possible shortest paths
-    dist, paths = calculate_supply_to_demand_paths(F, supplies, demands, weight_attr=weight_attr)
+        H = overlay_copy(G)
+        set_imbalance_tracker(H, imbalance.copy())
+        return H, {"transport_cost": 0}
 
-    # Check unreachable supply and demand nodes
-    un_s, un_d = check_reachability(supplies, demands, dist)
-    
-    # Solve minimum cost flow problem for supply and demand nodes
-    cost, flow_dict = solve_transportation_min_cost_flow(supplies, demands, dist)
+    # Shortest paths to the nearest demand nodes and the minimum cost flow over them.
+    # Paths are kept as predecessor maps.
+    cost, flow_dict, preds, info = solve_transportation(F, supplies, demands, weight_attr=weight_attr, cutoff=cutoff)
 
     # Build H graph from given flow G, F and flow dictionary
-    H = build_H_from_flow(G, F, flow_dict, paths, weight_attr=weight_attr)
-
-    return H, {"transport_cost": cost, "supplies": supplies, "demands": demands}
-
-def build_H_from_flow(G, F, flow, paths, weight_attr="cost"):
-    H = G.copy()
-
+    H = build_H_from_flow(G, F, flow_dict, preds, weight_attr=weight_attr, imbalance=imbalance)
+
+    info.update({"transport_cost": cost, "supplies": supplies, "demands": demands})
+    return H, info
+
+# Supply to demand paths and the min cost flow between them.
+# Searches stop after the `neighbors` nearest demand nodes of every supply node (or at the cutoff
+# distance), so the problem has about neighbors * supplies arcs instead of supplies * demands. Supply
+# nodes left with unshipped amounts after that search every demand node without the cutoff and the
+# problem is solved once more: they can then reach every unmatched demand node, so nothing that can
+# be shipped stays unshipped.
+# neighbors=None = all demand nodes right away.
+# allow_unmatched: amounts that cannot be shipped (unreachable pairs or unequal totals) stay at their
+# nodes and iter_flow_pairs only yields the shipped pairs, the caller sees the rest in its imbalance
+# tracker. Without it, amounts that still cannot be shipped raise nx.NetworkXUnfeasible.
+# Returns cost, flow, preds and info (arcs, neighbors, re-searched supplies, search and solve time, backend)
+def solve_transportation(F, supplies, demands, weight_attr="cost", cutoff=None, allow_unmatched=False, neighbors=TRANSPORT_NEIGHBORS):
+    if neighbors is not None and neighbors >= len(demands):
+        neighbors = None
+    info = {"neighbors": neighbors, "solve_time": 0.0, "researched": 0}
+
+    t0 = time.perf_counter()
+    dist, preds = calculate_supply_to_demand_paths(F, supplies, demands, weight_attr=weight_attr, cutoff=cutoff, neighbors=neighbors)
+    info["search_time"] = time.perf_counter() - t0
+
+    # Solved with unmatched amounts allowed, so a sparse problem without a full solution is
+    # answered fast instead of searched through
+    cost, flow = solve_transportation_min_cost_flow(supplies, demands, dist, allow_unmatched=True, info=info)
+
+    shipped = {}
+    for s, _, amount in iter_flow_pairs(flow):
+        shipped[s] = shipped.get(s, 0) + amount
+
+    if neighbors is not None or cutoff is not None:
+        # A search that ended before the neighbor count was reached already saw every demand node,
+        # unless the cutoff stopped it
+        short = {s: a for s, a in supplies.items() if shipped.get(s, 0) < a and (cutoff is not None or len(dist[s]) >= neighbors)}
+        if short:
+            t0 = time.perf_counter()
+            dist_all, preds_all = calculate_supply_to_demand_paths(F, short, demands, weight_attr=weight_attr)
+            dist.update(dist_all)
+            preds.update(preds_all)
+            info["search_time"] += time.perf_counter() - t0
+            info["researched"] = len(short)
+
+            cost, flow = solve_transportation_min_cost_flow(supplies, demands, dist, allow_unmatched=True, info=info)
+            shipped = {}
+            for s, _, amount in iter_flow_pairs(flow):
+                shipped[s] = shipped.get(s, 0) + amount
+
+    total = sum(shipped.values())
+    if not allow_unmatched and (total < sum(supplies.values()) or total < sum(demands.values())):
+        raise nx.NetworkXUnfeasible("Not every supply and demand amount can be shipped.")
+
+    return cost, flow, preds, info
+
+# Yields (supply node, demand node, amount) for every positive flow between real nodes of the
+# transportation graph. Dummy nodes added by allow_unmatched are skipped.
+def iter_flow_pairs(flow):
     # Iterate through every entry in flow dict
     for s_node in flow:
         # Make sure that it is a supply node
-        if not (isinstance(s_node, tuple) and s_node[0] == "S"):
+        if not (isinstance(s_node, tuple) and s_node[0] == "S" and s_node[1] is not None):
             continue
         s = s_node[1]
 
@@ -43,144 +114,205 @@ def build_H_from_flow(G, F, flow, paths, weight_attr="cost"):
                 continue
 
             # Make sure it is a demand node
-            if not (isinstance(d_node, tuple) and d_node[0] == "D"):
+            if not (isinstance(d_node, tuple) and d_node[0] == "D" and d_node[1] is not None):
                 continue
-            d = d_node[1]
-
-            # Nodes from s to d
-            node_path = paths[s][d]
 
-            # Add edges from s to d for given amount
-            for _ in range(amount):
-                # [A, B, C, D] -> [(A,B) (B,C) (C,D)]
-                for a, b in zip(node_path[:-1], node_path[1:]):
-                    # Get the min cost edge. There might be multiple parallel edges so we need the min cost one
-                    k = pick_min_cost_edge_key(F, a, b, weight_attr=weight_attr)
-
-                    # Copy the data of cheapest edge
-                    data = F[a][b][k].copy()
-
-                    # Mark the edge data as deadhead
-                    data["mode"] = "DEADHEAD"
-                    data["is_deadhead_added"] = True
-
-                    # Add the edge even if its parallel
-                    H.add_edge(a, b, **data)
+            yield s, d_node[1], amount
 
+def build_H_from_flow(G, F, flow, preds, weight_attr="cost", imbalance=None):
+    H = overlay_copy(G)
+    if imbalance is not None:
+        set_imbalance_tracker(H, imbalance.copy())
+    add_flow_paths(H, F, flow, preds, weight_attr=weight_attr)
     return H
 
-
+# Adds the deadhead paths of a transportation flow to X.
+# Returns one (edges, amount) per shipped pair, edges = the (u, v, key) edges of X along its path.
+def add_flow_paths(X, F, flow, preds, weight_attr="cost"):
+    added = []
+
+    for s, d, amount in iter_flow_pairs(flow):
+        # Nodes from s to d. Only the paths used by the flow are rebuilt.
+        node_path = reconstruct_path(preds[s], d)
+
+        # [A, B, C, D] -> [(A,B) (B,C) (C,D)]
+        edges = []
+        for a, b in zip(node_path[:-1], node_path[1:]):
+            # Get the min cost edge. There might be multiple parallel edges so we need the min cost one
+            k = pick_min_cost_edge_key(F, a, b, weight_attr=weight_attr)
+
+            # Driven amount times, kept as the count of one deadhead edge
+            edges.append((a, b, add_deadhead_edge(X, F[a][b][k], a, b, k, amount, mode="DEADHEAD", is_deadhead_added=True)))
+        added.append((edges, amount))
+
+    return added
+
+# Deadhead traversals of the same F edge are one edge of X with a "count" instead of parallel copies
+# of the edge data. Degrees and imbalances are read with weight="count" (edges without it count once),
+# the tour stage expands counts again (see expand_counts). The imbalance tracker of X follows along.
+# source = data of the F edge (a, b, f_key), a new edge only references it (see edge_ref). attrs = mode
+# and flags of the deadhead, an existing edge of the same F edge and the same attrs gets its count raised.
+# prepare = optional function applied to the data of a new edge. Returns the key of the edge in X.
+def add_deadhead_edge(X, source, a, b, f_key, amount=1, prepare=None, **attrs):
+    if X.has_edge(a, b):
+        for key, data in X[a][b].items():
+            if data.get("f_key") == f_key and all(data.get(name) == value for name, value in attrs.items()):
+                data["count"] = data.get("count", 1) + amount
+                track_edge(X, a, b, amount)
+                return key
+
+    data = edge_ref(source, f_key=f_key, count=amount, **attrs)
+    if prepare is not None:
+        prepare(data)
+    track_edge(X, a, b, amount)
+    return add_edge_ref(X, a, b, data)
+
+# Edges of X with every edge repeated count times
+def edge_traversals(X):
+    return [(u, v, k) for u, v, k, c in X.edges(keys=True, data="count", default=1) for _ in range(c)]
+
+
+# Key of the cheapest parallel edge u->v. Read from the precomputed CSR view of F.
 def pick_min_cost_edge_key(F, u, v, weight_attr="cost"):
-    best_k = None
-    best_w = float("inf")
-    for k, data in F[u][v].items():
-        w = float(data.get(weight_attr, data.get("length", 1.0)))
-        if w < best_w:
-            best_w = w
-            best_k = k
-    return best_k
-
-def solve_transportation_min_cost_flow(supplies, demands, dist):
-    # Get all supply-demand node pairs that are in shortest dist list
-    reachable_pairs = []
-
+    return get_csr(F, weight_attr=weight_attr).min_key(u, v)
+
+# Min cost flow over the supply -> demand pairs in dist, costs as COST_SCALE fixed-point integers.
+# Amounts are small (node imbalances), so every unit of supply and demand becomes one node of a
+# bipartite graph and the problem is a min weight full matching (scipy). Without scipy it is solved
+# by network_simplex on the same arcs.
+# allow_unmatched: amounts that cannot be shipped (unreachable pairs or unequal totals) stay where
+# they are. The most units are shipped first, then the cost is minimal. Without it a problem that
+# cannot ship everything raises nx.NetworkXUnfeasible.
+# Returns the cost of the shipped pairs and flow[("S", s)][("D", d)] = amount (see iter_flow_pairs).
+# info: optional dict, gets the arc count, backend and solve time added
+def solve_transportation_min_cost_flow(supplies, demands, dist, allow_unmatched=False, info=None):
+    t0 = time.perf_counter()
+
+    pairs = []
     for s in supplies:
-        for d in demands:
-            if d in dist.get(s, {}):
-                reachable_pairs.append((s, d))
-
-    # All unique supply nodes in reachable pairs
-    reachable_supplies = {s for s, _ in reachable_pairs}
-
-    # All unique demand nodes in reachable pairs
-    reachable_demands = {d for _, d in reachable_pairs}
-
-    # Transportation graph. networx.network_simplex(T) function requires a graph that includes
-    # nodes and edges with certain attributes. Nodes have to include "demand" attribute.
-    # Negative demand means it is a supply node and positive demand means it is a demand node.
-    # Edges requite weight and capacity. Weight is the cost of the path from s to d. Capacity
-    # is there to limit how many times we can use this path for transportation problem.
-    # I made capaciy 10**9 so that it is basically unlimited.
-    T = nx.DiGraph()
-
+        for d, c in dist.get(s, {}).items():
+            if d in demands:
+                pairs.append((s, d, int(round(c * COST_SCALE))))
+
+    if min_weight_full_bipartite_matching is not None:
+        backend = "matching"
+        cost, flow, unit_arcs = _matching_flow(supplies, demands, pairs, allow_unmatched)
+    else:
+        backend = "network_simplex"
+        cost, flow = _network_simplex_flow(supplies, demands, pairs, allow_unmatched)
+        unit_arcs = len(pairs)
+
+    if info is not None:
+        info["arcs"] = len(pairs)
+        info["unit_arcs"] = unit_arcs
+        info["backend"] = backend
+        info["solve_time"] = info.get("solve_time", 0.0) + time.perf_counter() - t0
+
+    return cost / COST_SCALE, flow
+
+# Cost of not shipping one unit. More than any change of path costs a matching can make.
+def _unmatched_cost(pairs, units):
+    return (max((c for _, _, c in pairs), default=0) + 1) * (units + 1)
+
+def _matching_flow(supplies, demands, pairs, allow_unmatched):
+    # One row per unit of supply, one column per unit of demand
+    row0 = {}
+    rows = []
     for s, amount in supplies.items():
-        if s in reachable_supplies:
-            T.add_node(("S", s), demand=-amount)
-
+        row0[s] = len(rows)
+        rows.extend([s] * amount)
+    col0 = {}
+    cols = []
     for d, amount in demands.items():
-        if d in reachable_demands:
-            T.add_node(("D", d), demand=amount)
+        col0[d] = len(cols)
+        cols.extend([d] * amount)
+
+    if not allow_unmatched and len(rows) != len(cols):
+        raise nx.NetworkXUnfeasible("Total supply and demand differ.")
+    if not rows or not cols:
+        return 0, {}
+
+    # +1 keeps zero cost pairs as arcs. Every matching has the same size, so the offset does not
+    # change which one is the cheapest.
+    pair_cost = {}
+    r_idx = []
+    c_idx = []
+    weight = []
+    for s, d, c in pairs:
+        pair_cost[(s, d)] = c
+        for i in range(row0[s], row0[s] + supplies[s]):
+            for j in range(col0[d], col0[d] + demands[d]):
+                r_idx.append(i)
+                c_idx.append(j)
+                weight.append(c + 1)
+    unit_arcs = len(weight)
+
+    n_rows, n_cols = len(rows), len(cols)
+    if allow_unmatched:
+        # Unmatched units of the smaller side get a private dummy partner on the other side
+        unmatched = _unmatched_cost(pairs, min(n_rows, n_cols))
+        if n_rows <= n_cols:
+            r_idx.extend(range(n_rows))
+            c_idx.extend(range(n_cols, n_cols + n_rows))
+            n_cols += n_rows
+        else:
+            r_idx.extend(range(n_rows, n_rows + n_cols))
+            c_idx.extend(range(n_cols))
+            n_rows += n_cols
+        weight.extend([unmatched] * (len(r_idx) - len(weight)))
+
+    M = csr_matrix((np.array(weight, dtype=np.float64), (r_idx, c_idx)), shape=(n_rows, n_cols))
+    try:
+        match_r, match_c = min_weight_full_bipartite_matching(M)
+    except ValueError:
+        raise nx.NetworkXUnfeasible("Not every supply and demand unit can be matched.")
+
+    cost = 0
+    flow = {}
+    for i, j in zip(match_r.tolist(), match_c.tolist()):
+        if i >= len(rows) or j >= len(cols):
+            continue
+        cost += pair_cost[(rows[i], cols[j])]
+        out = flow.setdefault(("S", rows[i]), {})
+        out[("D", cols[j])] = out.get(("D", cols[j]), 0) + 1
 
-    for s, d in reachable_pairs:
-        T.add_edge(
-            ("S", s),
-            ("D", d),
-            weight=int(dist[s][d]),
-            capacity=10**9,
-        )
-
-    # Calculates total cost and gives a flot dictionary. 
-    # Ex: 
-    # T.add_edge("A","B", weight=5)
-    # T.add_edge("B","C", weight=2)
-    # flow_dict = {"A": {"B": 3},"B": {"C": 3}}
-    # cost = 5 * 3 + 2 * 3 = 21
-    cost, flow_dict = nx.network_simplex(T)
-    return cost, flow_dict
-
-# Calculates and returns shortest distances and path nodes from all nodes to all nodes in F
-# Returns: dists and paths matrices. Ex: dists[s][d], paths[s][d]
-def calculate_supply_to_demand_paths(F, supplies, demands, weight_attr="cost"):
-    demand_nodes = list(demands.keys())
-
-    dists = {} # Shortest path cost from s to d. dists[s][d]
-    paths = {} # Nodes that form tha path s to d. paths[s][d]
-
-    # Iterate over supply nodes
-    for s in supplies.keys():
-        # This calculates the shortest distance and paths from node s to each node in F
-        dists_s, paths_s = nx.single_source_dijkstra(F, source=s, weight=weight_attr)
-
-        dists[s] = {}
-        paths[s] = {}
-
-        # Iterate over demand nodes and record distance and path nodes if the path exists from s to d
-        for d in demand_nodes:
-            if d in dists_s:
-                dists[s][d] = dists_s[d]
-                paths[s][d] = paths_s[d]
-
-    return dists, paths
-
-
-def build_supply_demand(imbalance_data):
-    supplies = {}
-    demands = {}
-
-    for node, info in imbalance_data.items():
-        diff = info["imbalance"]
-        if diff > 0:
-            supplies[node] = diff
-        elif diff < 0:
-            demands[node] = -diff
-
-    return supplies, demands
-
-# Checks if there are unreachable supply and demand nodes.
-# Returns: Uncreachable supply and demand node lists
-def check_reachability(supplies, demands, dist):
-    unreachable_supplies = []
-    unreachable_demands = []
+    return cost, flow, unit_arcs
 
-    for s in supplies:
-        if s not in dist or len(dist[s]) == 0:
-            unreachable_supplies.append(s)
+# Same problem as _matching_flow, solved by network_simplex. The dummy supply and demand of
+# allow_unmatched take what cannot be shipped.
+def _network_simplex_flow(supplies, demands, pairs, allow_unmatched):
+    T = nx.DiGraph()
+    for s, d, c in pairs:
+        T.add_node(("S", s), demand=-supplies[s])
+        T.add_node(("D", d), demand=demands[d])
+        T.add_edge(("S", s), ("D", d), weight=c, capacity=10**9)
 
-    for d in demands:
-        if not any(d in dist.get(s, {}) for s in supplies):
-            unreachable_demands.append(d)
+    if allow_unmatched:
+        total_supply = sum(supplies.values())
+        total_demand = sum(demands.values())
+        unmatched_cost = _unmatched_cost(pairs, total_supply)
 
-    return unreachable_supplies, unreachable_demands
+        for s, amount in supplies.items():
+            T.add_node(("S", s), demand=-amount)
+            T.add_edge(("S", s), ("D", None), weight=unmatched_cost, capacity=10**9)
+        for d, amount in demands.items():
+            T.add_node(("D", d), demand=amount)
+            T.add_edge(("S", None), ("D", d), weight=unmatched_cost, capacity=10**9)
+
+        T.add_node(("S", None), demand=-total_demand)
+        T.add_node(("D", None), demand=total_supply)
+        T.add_edge(("S", None), ("D", None), weight=0, capacity=10**9)
+
+    _, flow = nx.network_simplex(T)
+    cost = sum(c * flow[("S", s)][("D", d)] for s, d, c in pairs)
+    return cost, flow
+
+# Calculates shortest distances from every supply node to the demand nodes in F.
+# Each search stops once all demand nodes (or the `neighbors` nearest ones) are settled or the
+# cutoff distance is passed.
+# Returns: dists matrix and predecessor maps. Ex: dists[s][d], reconstruct_path(preds[s], d)
+def calculate_supply_to_demand_paths(F, supplies, demands, weight_attr="cost", cutoff=None, neighbors=None):
+    return dijkstra_many_to_many(F, supplies.keys(), demands.keys(), weight_attr=weight_attr, cutoff=cutoff, max_targets=neighbors)
 
 # Adds weight_attr data if it does not exist in edges
 def ensure_edge_weight(G, weight_attr="cost"):
@@ -1,5 +1,3 @@
-import osmnx as ox
-
 def ensure_node_coordinates(H, F):
     for n in H.nodes:
         if "x" not in H.nodes[n] or "y" not in H.nodes[n]:
@@ -15,6 +13,7 @@ def normalize_highway(value):
     return value
 
 def ensure_strong_component(F):
+    import osmnx as ox
     return ox.truncate.largest_component(F, strongly=True)
 
 def hours_between(start, end):
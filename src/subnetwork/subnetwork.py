@@ -1,25 +1,63 @@
-import osmnx as ox
+import weakref
+import numpy as np
 from src.routing.utils import *
+from src.routing.overlay import *
 
-# Extracts graph K from a given graph F based on sweepableness of streets. Regulations are applied here.
-def extract_K(F, allowed_highways):
-    # Extract GeoDataFrame edge graph of F
-    edges = ox.graph_to_gdfs(F, nodes=False).reset_index()
+# Highway class index of F. Built once per F and reused by every schedule block, which only
+# differ in the set of allowed road types.
+class HighwayIndex:
+    def __init__(self, F):
+        self.edges = []
+        classes = []
+        for u, v, k, data in F.edges(keys=True, data=True):
+            self.edges.append((u, v, k))
+            # Highway data can hold multiple types of tags like ["primary", "trunk"]. Only the first tag counts.
+            classes.append(normalize_highway(data.get("highway")))
+
+        # Integer category code per edge
+        self.categories = sorted(set(classes), key=str)
+        self.code_of = {c: i for i, c in enumerate(self.categories)}
+        self.codes = np.array([self.code_of[c] for c in classes], dtype=np.int32)
+
+        # Edge positions per category
+        order = np.argsort(self.codes, kind="stable")
+        bounds = np.searchsorted(self.codes[order], np.arange(len(self.categories) + 1))
+        self.positions = {c: order[bounds[i]:bounds[i + 1]] for i, c in enumerate(self.categories)}
 
-    # Each edge holds | u | v | key | highway | length | geometry | etc.
-    # Highway data can hold multiple types of tags like ["primary", "trunk"]. Normalize it so that it only holds the first tag.
-    edges["highway_norm"] = edges["highway"].apply(normalize_highway)
+    # Boolean mask over self.edges for the allowed highway classes
+    def mask(self, allowed_highways):
+        allowed_codes = [self.code_of[h] for h in allowed_highways if h in self.code_of]
+        return np.isin(self.codes, allowed_codes)
 
-    # Tag edges as sweepable or not based on the given regulation
-    # edges["sweepable"] = edges["highway_norm"].apply(assign_regulation)
-    edges["sweepable"] = edges["highway_norm"].apply(
-        lambda h: h in allowed_highways
-    )
+    # Edges of the allowed highway classes, in F's edge order
+    def edges_for(self, allowed_highways):
+        chunks = [self.positions[h] for h in allowed_highways if h in self.positions]
+        if not chunks:
+            return []
+        return [self.edges[i] for i in np.sort(np.concatenate(chunks))]
 
-    # Discard unavailable edges
-    sweepable_edges = edges[edges["sweepable"]]
+_HIGHWAY_INDEX_CACHE = weakref.WeakKeyDictionary()
+
+def get_highway_index(F):
+    index = _HIGHWAY_INDEX_CACHE.get(F)
+    if index is None:
+        index = HighwayIndex(F)
+        _HIGHWAY_INDEX_CACHE[F] = index
+    return index
+
+# Extracts graph K from a given graph F based on sweepableness of streets. Regulations are applied here.
+def extract_K(F, allowed_highways):
+    # Sweepable edges come straight from the highway index of F
+    sweepable_edges = get_highway_index(F).edges_for(allowed_highways)
 
-    # Extract subgraph from F based on seepable_edges
-    K = F.edge_subgraph(list(zip(sweepable_edges["u"], sweepable_edges["v"], sweepable_edges["key"]))).copy()
+    # Build K from the sweepable edges. Edges are overlays of the F edges (see edge_ref), so K can be
+    # modified freely without copying the street attributes.
+    K = F.__class__()
+    K.graph.update(F.graph)
+    for u, v, k in sweepable_edges:
+        for n in (u, v):
+            if n not in K:
+                K.add_node(n, **F.nodes[n])
+        add_edge_ref(K, u, v, edge_ref(F[u][v][k]), key=k)
 
-    return K
\ No newline at end of file
+    return K
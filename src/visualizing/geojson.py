@@ -0,0 +1,135 @@
+import math
+import weakref
+import numpy as np
+import pandas as pd
+import shapely
+
+# GeoJSON building blocks for the maps. No folium objects are created here, so the same
+# FeatureCollections can be built once and handed to several maps.
+#
+# Routes are drawn as one feature per route: consecutive edges are joined into one line and a new
+# line (MultiLineString part) only starts where the route jumps. Coordinates are rounded to
+# COORD_DECIMALS (~0.1 m) and can be simplified to one pixel at a given zoom level.
+
+COORD_DECIMALS = 6
+
+_BASE_ROADS_CACHE = weakref.WeakKeyDictionary()
+
+def edge_coords(G, u, v, k):
+    data = G[u][v][k]
+    geom = data.get("geometry", None)
+    if geom is not None and hasattr(geom, "coords"):
+        return list(geom.coords)
+    return [(G.nodes[u]["x"], G.nodes[u]["y"]), (G.nodes[v]["x"], G.nodes[v]["y"])]
+
+# Coordinate lists of a route with consecutive edges joined
+def merge_route_lines(G, route):
+    lines = []
+    cur = None
+    prev_v = None
+    for u, v, k in route:
+        coords = edge_coords(G, u, v, k)
+        if cur is not None and u == prev_v:
+            cur.extend(coords[1:])
+        else:
+            cur = list(coords)
+            lines.append(cur)
+        prev_v = v
+    return lines
+
+# Simplification tolerance in degrees that keeps lines within one pixel at the given web map zoom
+def zoom_tolerance(zoom, lat):
+    meters_per_px = 156543.03392 * math.cos(math.radians(lat)) / 2 ** zoom
+    return meters_per_px / 111320.0
+
+# Rounds (and with a tolerance simplifies) many lines at once. Returns plain nested lists.
+def lines_to_coordinates(lines, tolerance=None):
+    if not lines:
+        return []
+
+    counts = np.array([len(c) for c in lines])
+    coords = np.array([p[:2] for c in lines for p in c], dtype=np.float64)
+
+    if tolerance:
+        owner = np.repeat(np.arange(len(lines)), counts)
+        geoms = shapely.simplify(shapely.linestrings(coords, indices=owner), tolerance)
+        coords, owner = shapely.get_coordinates(geoms, return_index=True)
+        counts = np.bincount(owner, minlength=len(lines))
+
+    coords = np.round(coords, COORD_DECIMALS)
+    return [part.tolist() for part in np.split(coords, np.cumsum(counts)[:-1])]
+
+def line_geometry(lines):
+    if len(lines) == 1:
+        return {"type": "LineString", "coordinates": lines[0]}
+    return {"type": "MultiLineString", "coordinates": lines}
+
+def feature(geometry, feature_id, **properties):
+    return {"type": "Feature", "id": feature_id, "properties": properties, "geometry": geometry}
+
+def feature_collection(features):
+    return {"type": "FeatureCollection", "features": list(features)}
+
+# One feature for a route (or the giant tour)
+def route_feature(G, route, feature_id, tolerance=None, **properties):
+    lines = lines_to_coordinates(merge_route_lines(G, route), tolerance)
+    return feature(line_geometry(lines), feature_id, edges=len(route), **properties)
+
+# Every street of G as a single MultiLineString feature. Two-way streets are drawn once.
+# Built once per graph and tolerance and shared by all maps drawing G as background.
+def base_roads_geojson(G, tolerance=None):
+    per_graph = _BASE_ROADS_CACHE.setdefault(G, {})
+    if tolerance in per_graph:
+        return per_graph[tolerance]
+
+    # A two-way street is drawn once: its reverse twin has the same coordinates the other way round.
+    # Parallel streets between the same nodes have other geometries and are all drawn.
+    seen = set()
+    lines = []
+    for u, v, k in G.edges(keys=True):
+        coords = edge_coords(G, u, v, k)
+        line = tuple((round(x, COORD_DECIMALS), round(y, COORD_DECIMALS)) for x, y in coords)
+        street = min(line, line[::-1])
+        if street in seen:
+            continue
+        seen.add(street)
+        lines.append(coords)
+
+    lines = lines_to_coordinates(lines, tolerance)
+    fc = feature_collection([feature({"type": "MultiLineString", "coordinates": lines}, "base")]) if lines else feature_collection([])
+
+    per_graph[tolerance] = fc
+    return fc
+
+# Mean node position as (lat, lon), the map center
+def map_center(G):
+    xs = [x for _, x in G.nodes(data="x")]
+    ys = [y for _, y in G.nodes(data="y")]
+    return float(np.mean(ys)), float(np.mean(xs))
+
+# compute_node_imbalance output as a DataFrame with one row per node: node, x, y, in, out, imbalance, type
+def imbalance_frame(G, imbalance_data):
+    df = pd.DataFrame.from_dict(imbalance_data, orient="index")
+    df["x"] = pd.Series(dict(G.nodes(data="x"))).reindex(df.index)
+    df["y"] = pd.Series(dict(G.nodes(data="y"))).reindex(df.index)
+    df.index.name = "node"
+    return df.reset_index()
+
+# Nodes of G as a DataFrame with node, x, y columns
+def node_frame(G):
+    nodes = list(G.nodes)
+    return pd.DataFrame({
+        "node": nodes,
+        "x": [G.nodes[n]["x"] for n in nodes],
+        "y": [G.nodes[n]["y"] for n in nodes],
+    })
+
+# One Point feature per row of df, the given columns become properties
+def point_feature_collection(df, columns):
+    coords = np.round(df[["x", "y"]].to_numpy(dtype=np.float64), COORD_DECIMALS).tolist()
+    props = df[list(columns)].to_dict("records")
+    ids = df["node"].astype(str).tolist()
+    return feature_collection(
+        {"type": "Feature", "id": i, "properties": p, "geometry": {"type": "Point", "coordinates": c}}
+        for i, p, c in zip(ids, props, coords)
+    )
@@ -0,0 +1,78 @@
+import os
+import time
+from src.routing.imbalance import *
+
+# Output artifacts of a run. Every artifact can be switched on separately (run.py --outputs).
+# "network" is the same for every block and is written once per run, all others once per block.
+# Map modules (folium, geopandas, osmnx plotting) are only imported once a map is drawn, so
+# solve-only runs never load them.
+
+NETWORK_ARTIFACT = "network"
+BLOCK_ARTIFACTS = ("fk", "tour", "routes", "imbalance_k", "imbalance_h", "imbalance_e", "stats")
+ARTIFACTS = (NETWORK_ARTIFACT,) + BLOCK_ARTIFACTS
+
+NETWORK_FILE = "01-Full Street Network-F.html"
+ARTIFACT_FILES = {
+    "fk": "02-Subnetwork-K.html",
+    "tour": "03-Tour.html",
+    "routes": "04-Route First Routes.html",
+    "imbalance_k": "05-imbalance_K.html",
+    "imbalance_h": "06-imbalance_H.html",
+    "imbalance_e": "07-imbalance_E.html",
+    "stats": "Statistics.html",
+}
+
+# artifacts = enabled artifact names, map_options = simplify_zoom, show_balanced, cluster
+def output_options(artifacts=ARTIFACTS, map_options=None):
+    return {"artifacts": set(artifacts), "map_options": dict(map_options or {})}
+
+def block_artifacts(options):
+    return [a for a in BLOCK_ARTIFACTS if a in options["artifacts"]]
+
+def artifact_path(folder, blockIndex, artifact):
+    return f"{folder}/{blockIndex}_{ARTIFACT_FILES[artifact]}"
+
+def render_network(F, folder):
+    from src.visualizing.visualizer import plot_interactive_roads_hierarchical
+    return plot_interactive_roads_hierarchical(F, output_path=f"{folder}/{NETWORK_FILE}")
+
+# Writes the enabled block artifacts. solution = {"K", "H", "E", "tour", "routes"} of the block.
+# Returns the output size and render time of the block.
+def render_block(F, blockIndex, folder, solution, options):
+    render_start_t = time.perf_counter()
+
+    artifacts = block_artifacts(options)
+    map_options = options["map_options"]
+    tour_map_options = {"simplify_zoom": map_options.get("simplify_zoom")}
+    imbalance_map_options = {"show_balanced": map_options.get("show_balanced", False), "cluster": map_options.get("cluster", False)}
+
+    K, H, E = solution["K"], solution["H"], solution["E"]
+    tour, routes = solution["tour"], solution["routes"]
+
+    if any(a != "stats" for a in artifacts):
+        import src.visualizing.visualizer as visualizer
+
+    outputs = []
+    for artifact in artifacts:
+        path = artifact_path(folder, blockIndex, artifact)
+
+        if artifact == "fk":
+            outputs.append(visualizer.plot_F_and_K(F, K, output_path=path))
+        elif artifact == "tour":
+            outputs.append(visualizer.visualize_giant_tour(E, tour, path, **tour_map_options))
+        elif artifact == "routes":
+            outputs.append(visualizer.visualize_tour_and_routes(E, tour, routes, path, **tour_map_options))
+        elif artifact in ("imbalance_k", "imbalance_h", "imbalance_e"):
+            X = {"imbalance_k": K, "imbalance_h": H, "imbalance_e": E}[artifact]
+            outputs.append(visualizer.plot_H_node_imbalance(X, compute_node_imbalance(X), output_path=path, **imbalance_map_options))
+        elif artifact == "stats":
+            from src.visualizing.stats import compute_stats, write_stats_html
+            summary, route_rows = compute_stats(E, routes)
+            write_stats_html(summary, route_rows, title=f"{blockIndex}_Statistics", output_path=path)
+            outputs.append({"path": path, "size_mb": os.path.getsize(path) / 2**20})
+
+    return {
+        "outputs": len(outputs),
+        "maps_mb": sum(info["size_mb"] for info in outputs),
+        "render_time": time.perf_counter() - render_start_t,
+    }
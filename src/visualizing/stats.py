@@ -0,0 +1,124 @@
+import os
+from src.routing.split_routes import *
+
+# Route statistics and the statistics page. No map libraries are needed here.
+
+METER_TO_KM = 1 / 1000
+KPH_PER_MPH = 1.609344
+
+def compute_fleet_requirements(E, routes):
+
+    sweep_len = 0.0
+    dead_len = 0.0
+
+    for route in routes:
+        for u,v,k in route:
+            d = E[u][v][k]
+            length_m = d.get("length", 0.0)
+
+            if d.get("mode") == "SWEEP":
+                sweep_len += length_m * METER_TO_KM
+            else:
+                dead_len += length_m * METER_TO_KM
+
+    sweep_vehicles = sweep_len / (4.25 * KPH_PER_MPH * 3.7)
+    dead_vehicles  = dead_len  / (8.0 * KPH_PER_MPH * 3.7)
+
+    total_vehicles = sweep_vehicles + dead_vehicles
+    total_len = sweep_len + dead_len
+    sweep_pct = sweep_len * 100 / total_len
+    dead_pct = dead_len * 100 / total_len
+
+    return {
+        "total_len": round(total_len, 2),
+        "sweep_len": round(sweep_len, 2),
+        "dead_len": round(dead_len, 2),
+        "sweep_pct": round(sweep_pct, 2),
+        "dead_pct": round(dead_pct, 2),
+        "total_veh": round(total_vehicles, 2),
+        "sweep_veh": round(sweep_vehicles, 2),
+        "dead_veh": round(dead_vehicles, 2)
+    }
+
+def compute_stats(E, routes):
+    total_sweep = 0
+    total_dead = 0
+    route_rows = []
+
+    for i, r in enumerate(routes, start=1):
+        s = route_stats(E, r)
+        route_rows.append({
+            "route": i,
+            "total_time": s["total_time"],
+            "sweep_time": s["sweep_time"],
+            "deadhead_time": s["deadhead_time"],
+            "deadhead_pct": s["deadhead_pct"] * 100
+        })
+
+        total_sweep += s["sweep_time"]
+        total_dead += s["deadhead_time"]
+
+    total = total_sweep + total_dead
+
+    summary = {
+        "Total sweep time": total_sweep,
+        "Total deadhead time": total_dead,
+        "Deadhead %": (total_dead / total * 100) if total > 0 else 0,
+        "Vehicle count": len(routes),
+        "Average route time": total / len(routes) if routes else 0
+    }
+
+    return summary, route_rows
+
+def write_stats_html(summary, route_rows, title, output_path):
+
+    def row(k,v):
+        return f"<tr><td>{k}</td><td>{v:.2f}</td></tr>"
+
+    summary_rows = "\n".join(row(k,v) for k,v in summary.items())
+
+    route_rows_html = "\n".join(
+        f"<tr><td>{r['route']}</td><td>{r['sweep_time']:.2f}</td>"
+        f"<td>{r['deadhead_time']:.2f}</td><td>{r['total_time']:.2f}</td>"
+        f"<td>{r['deadhead_pct']:.2f}%</td></tr>"
+        for r in route_rows
+    )
+
+    html = f"""
+    <html>
+    <head>
+        <title>{title}</title>
+        <style>
+            body {{ font-family: Arial; padding:20px }}
+            table {{ border-collapse: collapse; width: 60%; margin-bottom:30px }}
+            th, td {{ border:1px solid #aaa; padding:6px; text-align:center }}
+            th {{ background:#f0f0f0 }}
+        </style>
+    </head>
+    <body>
+
+    <h2>{title} — Summary</h2>
+    <table>
+        <tr><th>Metric</th><th>Value</th></tr>
+        {summary_rows}
+    </table>
+
+    <h2>{title} — Per Route</h2>
+    <table>
+        <tr>
+            <th>Route</th>
+            <th>Sweep Time</th>
+            <th>Deadhead Time</th>
+            <th>Total Time</th>
+            <th>Deadhead %</th>
+        </tr>
+        {route_rows_html}
+    </table>
+
+    </body>
+    </html>
+    """
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path,"w+",encoding="utf-8") as f:
+        f.write(html)
\ No newline at end of file
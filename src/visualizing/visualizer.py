@@ -2,15 +2,21 @@ import osmnx as ox
 import matplotlib.pyplot as plt
 import contextily as ctx
 import folium
-from folium.plugins import FeatureGroupSubGroup
+from folium.plugins import FeatureGroupSubGroup, FastMarkerCluster
 from src.visualizing.highway_colors import *
 import geopandas as gpd
 from shapely.affinity import translate
 from src.routing.utils import *
 from src.routing.split_routes import *
 import os
+import time
+import numpy as np
+from src.visualizing.geojson import *
+from src.visualizing.stats import *
 
 def plot_interactive_roads_hierarchical(G, output_path):
+    render_start_t = time.perf_counter()
+
     nodes, edges = ox.graph_to_gdfs(G)
 
     edges["highway_norm"] = edges["highway"].apply(normalize_highway)
@@ -60,138 +66,93 @@ def plot_interactive_roads_hierarchical(G, output_path):
         show=False
     )
 
-    for node_id, node in nodes.iterrows():
-        folium.CircleMarker(
-            location=[node.geometry.y, node.geometry.x],
-            radius=2,
-            color="red",
-            fill=True,
-            fill_opacity=0.8,
-            popup=f"Node ID: {node_id}"
-        ).add_to(nodes_fg)
+    # All nodes as one GeoJSON layer instead of one CircleMarker per node
+    folium.GeoJson(
+        point_feature_collection(node_frame(G), ["node"]),
+        marker=folium.CircleMarker(radius=2, color="red", fill=True, fill_opacity=0.8),
+        popup=folium.GeoJsonPopup(fields=["node"], aliases=["Node ID"]),
+    ).add_to(nodes_fg)
 
     nodes_fg.add_to(m)
 
     folium.LayerControl(collapsed=False).add_to(m)
 
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    m.save(output_path)
+    return save_map(m, output_path, render_start_t)
 
 def plot_F_and_K(G, K, output_path):
-    nodes_F, edges_F = ox.graph_to_gdfs(G)
-    _, edges_K = ox.graph_to_gdfs(K)
+    render_start_t = time.perf_counter()
 
-    center = nodes_F.geometry.unary_union.centroid
+    lat, lon = map_center(G)
 
     m = folium.Map(
-        location=[center.y, center.x],
+        location=[lat, lon],
         zoom_start=13,
         tiles="CartoDB positron"
     )
 
-    folium.GeoJson(
-        edges_F.to_json(),
-        name="F – All streets",
-        style_function=lambda x: {
-            "color": "gray",
-            "weight": 1,
-            "opacity": 0.4,
-        },
-    ).add_to(m)
+    # F never changes between blocks, its base layer is built once
+    _line_layer(base_roads_geojson(G), "gray", 1, 0.4, name="F – All streets").add_to(m)
 
-    folium.GeoJson(
-        edges_K.to_json(),
-        name="K – Sweepable streets",
-        style_function=lambda x: {
-            "color": "#d73027",
-            "weight": 3,
-            "opacity": 0.9,
-        },
-    ).add_to(m)
+    _line_layer(base_roads_geojson(K), "#d73027", 3, 0.9, name="K – Sweepable streets").add_to(m)
 
     folium.LayerControl(collapsed=False).add_to(m)
-    
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    m.save(output_path)
-
-def plot_node_imbalance(G, imbalance_data, output_path):
-    nodes, _ = ox.graph_to_gdfs(G)
 
-    center = nodes.geometry.unary_union.centroid
-
-    m = folium.Map(
-        location=[center.y, center.x],
-        zoom_start=13,
-        tiles="CartoDB positron"
+    return save_map(m, output_path, render_start_t)
+
+IMBALANCE_COLORS = {
+    "balanced": "green",
+    "supply": "red",
+    "demand": "blue"
+}
+
+# Node imbalance map built from compute_node_imbalance output as a single GeoJSON layer.
+# show_balanced = also draw balanced nodes (left out by default, they are the majority)
+# cluster = group markers with FastMarkerCluster, otherwise markers are drawn on a canvas
+def _imbalance_map(G, imbalance_data, output_path, radius, fields, show_balanced=False, cluster=False):
+    render_start_t = time.perf_counter()
+
+    df = imbalance_frame(G, imbalance_data)
+    if not show_balanced:
+        df = df[df["type"] != "balanced"]
+    df = df.assign(
+        color=df["type"].map(IMBALANCE_COLORS),
+        radius=np.where(df["type"] == "balanced", 2, radius),
     )
 
-    COLORS = {
-        "balanced": "green",
-        "supply": "red",
-        "demand": "blue"
-    }
-
-    for node_id, row in nodes.iterrows():
-        info = imbalance_data[node_id]
-        node_type = info["type"]
-
-        folium.CircleMarker(
-            location=[row.geometry.y, row.geometry.x],
-            radius=4 if node_type != "balanced" else 2,
-            color=COLORS[node_type],
-            fill=True,
-            fill_opacity=0.9,
-            popup=(
-                f"Node {node_id}<br>"
-                f"Type: {node_type}<br>"
-                f"In: {info['in']}<br>"
-                f"Out: {info['out']}"
-            )
-        ).add_to(m)
-
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    m.save(output_path)
-
-def plot_H_node_imbalance(H, imbalance_data, output_path):
-    nodes, _ = ox.graph_to_gdfs(H)
-
-    center = nodes.geometry.unary_union.centroid
-
+    lat, lon = map_center(G)
     m = folium.Map(
-        location=[center.y, center.x],
+        location=[lat, lon],
         zoom_start=13,
-        tiles="CartoDB positron"
+        tiles="CartoDB positron",
+        prefer_canvas=True
     )
 
-    COLORS = {
-        "balanced": "green",
-        "supply": "red",
-        "demand": "blue"
-    }
+    # A balanced graph (E) has nothing to draw
+    if not df.empty:
+        if cluster:
+            rows = df[["y", "x", "color", "radius"]].to_numpy().tolist()
+            callback = """
+            function (row) {
+                return L.circleMarker(new L.LatLng(row[0], row[1]),
+                    {radius: row[3], color: row[2], fill: true, fillOpacity: 0.9});
+            };
+            """
+            FastMarkerCluster(rows, callback=callback).add_to(m)
+        else:
+            folium.GeoJson(
+                point_feature_collection(df, fields + ["color", "radius"]),
+                marker=folium.CircleMarker(fill=True, fill_opacity=0.9),
+                style_function=lambda f: {"color": f["properties"]["color"], "fillColor": f["properties"]["color"], "radius": f["properties"]["radius"]},
+                popup=folium.GeoJsonPopup(fields=fields, aliases=[f.capitalize() for f in fields]),
+            ).add_to(m)
 
-    for node_id, row in nodes.iterrows():
-        info = imbalance_data[node_id]
-        node_type = info["type"]
-
-        radius = 5 if node_type != "balanced" else 2
-
-        folium.CircleMarker(
-            location=[row.geometry.y, row.geometry.x],
-            radius=radius,
-            color=COLORS[node_type],
-            fill=True,
-            fill_opacity=0.9,
-            popup=(
-                f"Node {node_id}<br>"
-                f"Type: {node_type}<br>"
-                f"In: {info['in']}<br>"
-                f"Out: {info['out']}<br>"
-                f"Imbalance: {info['imbalance']}"
-            )
-        ).add_to(m)
+    return save_map(m, output_path, render_start_t)
 
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    m.save(output_path)
+def plot_node_imbalance(G, imbalance_data, output_path, show_balanced=False, cluster=False):
+    return _imbalance_map(G, imbalance_data, output_path, 4, ["node", "type", "in", "out"], show_balanced, cluster)
+
+def plot_H_node_imbalance(H, imbalance_data, output_path, show_balanced=False, cluster=False):
+    return _imbalance_map(H, imbalance_data, output_path, 5, ["node", "type", "in", "out", "imbalance"], show_balanced, cluster)
 
 ROUTE_COLORS = [
     "#e41a1c","#377eb8","#4daf4a","#984ea3",
@@ -217,27 +178,40 @@ def draw_edge(E, u, v, k, color, group):
         folium.PolyLine([p1,p2], color=color, weight=4, opacity=0.9).add_to(group)
 
 
-def visualize_tour_and_routes(E, tour, routes, output_path):
+# Saves the map and returns its output size and the time since render_start_t
+def save_map(m, output_path, render_start_t):
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    m.save(output_path)
+    return {
+        "path": output_path,
+        "size_mb": os.path.getsize(output_path) / 2**20,
+        "render_time": time.perf_counter() - render_start_t,
+    }
+
+def _line_layer(fc, color, weight, opacity, **kwargs):
+    return folium.GeoJson(
+        fc,
+        style_function=lambda x, c=color: {"color": c, "weight": weight, "opacity": opacity},
+        **kwargs
+    )
 
-    nodes, edges = ox.graph_to_gdfs(E)
+# Tour and routes drawn as one merged feature each (see geojson.py) instead of one layer per edge.
+# simplify_zoom = simplify lines to one pixel at this zoom level (None = exact geometry).
+def visualize_tour_and_routes(E, tour, routes, output_path, simplify_zoom=None):
+    render_start_t = time.perf_counter()
 
-    center = nodes.geometry.unary_union.centroid
-    m = folium.Map(location=[center.y, center.x], zoom_start=13, tiles="CartoDB positron")
+    lat, lon = map_center(E)
+    tolerance = zoom_tolerance(simplify_zoom, lat) if simplify_zoom is not None else None
+    m = folium.Map(location=[lat, lon], zoom_start=13, tiles="CartoDB positron")
 
     # Base roads
     base = folium.FeatureGroup(name="All Roads", show=True)
-    folium.GeoJson(
-        edges.to_json(),
-        style_function=lambda x:{
-            "color":"gray","weight":1,"opacity":0.3
-        }
-    ).add_to(base)
+    _line_layer(base_roads_geojson(E, tolerance), "gray", 1, 0.3).add_to(base)
     base.add_to(m)
 
     # Giant tour
     tour_group = folium.FeatureGroup(name="Giant Tour", show=False)
-    for u,v,k in tour:
-        draw_edge(E,u,v,k,"red",tour_group)
+    _line_layer(feature_collection([route_feature(E, tour, "tour", tolerance, name="Giant Tour")]), "red", 4, 0.9).add_to(tour_group)
     tour_group.add_to(m)
 
     # Master group for all routes
@@ -248,178 +222,28 @@ def visualize_tour_and_routes(E, tour, routes, output_path):
         color = ROUTE_COLORS[i % len(ROUTE_COLORS)]
 
         fg = folium.FeatureGroup(name=f"Route {i+1}", show=True)
-
-        for u,v,k in route:
-            draw_edge(E,u,v,k,color,fg)
-
+        fc = feature_collection([route_feature(E, route, f"route{i+1}", tolerance, name=f"Route {i+1}")])
+        _line_layer(fc, color, 4, 0.9, tooltip=f"Route {i+1}").add_to(fg)
         fg.add_to(routes_master)
 
     routes_master.add_to(m)
 
     folium.LayerControl(collapsed=False).add_to(m)
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    m.save(output_path)
+    return save_map(m, output_path, render_start_t)
 
-def visualize_giant_tour(E, tour, output_path):
-    nodes, edges = ox.graph_to_gdfs(E)
+def visualize_giant_tour(E, tour, output_path, simplify_zoom=None):
+    render_start_t = time.perf_counter()
 
-    center = nodes.geometry.unary_union.centroid
-    m = folium.Map(location=[center.y, center.x], zoom_start=13, tiles="CartoDB positron")
+    lat, lon = map_center(E)
+    tolerance = zoom_tolerance(simplify_zoom, lat) if simplify_zoom is not None else None
+    m = folium.Map(location=[lat, lon], zoom_start=13, tiles="CartoDB positron")
 
     # Draw base roads
-    folium.GeoJson(
-        edges.to_json(),
-        name="All Roads",
-        style_function=lambda x: {
-            "color": "gray",
-            "weight": 1,
-            "opacity": 0.4
-        },
-    ).add_to(m)
+    _line_layer(base_roads_geojson(E, tolerance), "gray", 1, 0.4, name="All Roads").add_to(m)
 
     tour_group = folium.FeatureGroup(name="Giant Tour", show=True)
-
-    for idx, (u, v, k) in enumerate(tour):
-        data = E[u][v][k]
-
-        if "geometry" in data and data["geometry"] is not None:
-            folium.GeoJson(
-                data["geometry"],
-                style_function=lambda x: {
-                    "color": "red",
-                    "weight": 3,
-                    "opacity": 0.9
-                }
-            ).add_to(tour_group)
-        else:
-            # fallback straight line
-            p1 = (E.nodes[u]["y"], E.nodes[u]["x"])
-            p2 = (E.nodes[v]["y"], E.nodes[v]["x"])
-            folium.PolyLine([p1, p2], color="red", weight=3, opacity=0.9).add_to(tour_group)
-
+    _line_layer(feature_collection([route_feature(E, tour, "tour", tolerance, name="Giant Tour")]), "red", 3, 0.9).add_to(tour_group)
     tour_group.add_to(m)
 
     folium.LayerControl(collapsed=False).add_to(m)
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    m.save(output_path)
-
-
-METER_TO_KM = 1 / 1000
-KPH_PER_MPH = 1.609344
-
-def compute_fleet_requirements(E, routes):
-
-    sweep_len = 0.0
-    dead_len = 0.0
-
-    for route in routes:
-        for u,v,k in route:
-            d = E[u][v][k]
-            length_m = d.get("length", 0.0)
-
-            if d.get("mode") == "SWEEP":
-                sweep_len += length_m * METER_TO_KM
-            else:
-                dead_len += length_m * METER_TO_KM
-
-    sweep_vehicles = sweep_len / (4.25 * KPH_PER_MPH * 3.7)
-    dead_vehicles  = dead_len  / (8.0 * KPH_PER_MPH * 3.7)
-
-    total_vehicles = sweep_vehicles + dead_vehicles
-    total_len = sweep_len + dead_len
-    sweep_pct = sweep_len * 100 / total_len
-    dead_pct = dead_len * 100 / total_len
-
-    return {
-        "total_len": round(total_len, 2),
-        "sweep_len": round(sweep_len, 2),
-        "dead_len": round(dead_len, 2),
-        "sweep_pct": round(sweep_pct, 2),
-        "dead_pct": round(dead_pct, 2),
-        "total_veh": round(total_vehicles, 2),
-        "sweep_veh": round(sweep_vehicles, 2),
-        "dead_veh": round(dead_vehicles, 2)
-    }
-
-def compute_stats(E, routes):
-    total_sweep = 0
-    total_dead = 0
-    route_rows = []
-
-    for i, r in enumerate(routes, start=1):
-        s = route_stats(E, r)
-        route_rows.append({
-            "route": i,
-            "total_time": s["total_time"],
-            "sweep_time": s["sweep_time"],
-            "deadhead_time": s["deadhead_time"],
-            "deadhead_pct": s["deadhead_pct"] * 100
-        })
-
-        total_sweep += s["sweep_time"]
-        total_dead += s["deadhead_time"]
-
-    total = total_sweep + total_dead
-
-    summary = {
-        "Total sweep time": total_sweep,
-        "Total deadhead time": total_dead,
-        "Deadhead %": (total_dead / total * 100) if total > 0 else 0,
-        "Vehicle count": len(routes),
-        "Average route time": total / len(routes) if routes else 0
-    }
-
-    return summary, route_rows
-
-def write_stats_html(summary, route_rows, title, output_path):
-
-    def row(k,v):
-        return f"<tr><td>{k}</td><td>{v:.2f}</td></tr>"
-
-    summary_rows = "\n".join(row(k,v) for k,v in summary.items())
-
-    route_rows_html = "\n".join(
-        f"<tr><td>{r['route']}</td><td>{r['sweep_time']:.2f}</td>"
-        f"<td>{r['deadhead_time']:.2f}</td><td>{r['total_time']:.2f}</td>"
-        f"<td>{r['deadhead_pct']:.2f}%</td></tr>"
-        for r in route_rows
-    )
-
-    html = f"""
-    <html>
-    <head>
-        <title>{title}</title>
-        <style>
-            body {{ font-family: Arial; padding:20px }}
-            table {{ border-collapse: collapse; width: 60%; margin-bottom:30px }}
-            th, td {{ border:1px solid #aaa; padding:6px; text-align:center }}
-            th {{ background:#f0f0f0 }}
-        </style>
-    </head>
-    <body>
-
-    <h2>{title} — Summary</h2>
-    <table>
-        <tr><th>Metric</th><th>Value</th></tr>
-        {summary_rows}
-    </table>
-
-    <h2>{title} — Per Route</h2>
-    <table>
-        <tr>
-            <th>Route</th>
-            <th>Sweep Time</th>
-            <th>Deadhead Time</th>
-            <th>Total Time</th>
-            <th>Deadhead %</th>
-        </tr>
-        {route_rows_html}
-    </table>
-
-    </body>
-    </html>
-    """
-
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    with open(output_path,"w+",encoding="utf-8") as f:
-        f.write(html)
\ No newline at end of file
+    return save_map(m, output_path, render_start_t)
@@ -0,0 +1,39 @@
+from benchmarks.synthetic import *
+from src.routing.cluster_first import *
+from src.subnetwork.subnetwork import *
+
+# Run from the repository root: python -m pytest tests
+
+# Swept streets in the west fifth of a synthetic grid, depot at its east edge: far outside the
+# search region of every cluster
+def _west_block_east_depot():
+    F = synthetic_city("grid", 3000, seed=0)
+    xs = {n: d["x"] for n, d in F.nodes(data=True)}
+    west = min(xs.values()) + 0.2 * (max(xs.values()) - min(xs.values()))
+
+    K = extract_K(F, {"secondary", "tertiary", "residential"})
+    K = overlay_copy(K.edge_subgraph([e for e in K.edges(keys=True) if xs[e[0]] < west and xs[e[1]] < west]))
+    for u, v, k in K.edges(keys=True):
+        K[u][v][k]["mode"] = "SWEEP"
+
+    return F, K, max(xs, key=xs.get)
+
+def test_depot_outside_cluster_region():
+    F, K, depot = _west_block_east_depot()
+
+    solutions = solve_route_cluster_first(F, K, 2, depot=depot, split_mode="optimal")
+
+    assert len(solutions) > 1
+    # Every cluster was still solved on a part of F
+    assert all(s["neighborhood"] < F.number_of_nodes() for s in solutions)
+    swept = sorted((u, v) for s in solutions for route in s["routes"] for u, v, k in route if s["E"][u][v][k].get("mode") == "SWEEP")
+    assert swept == sorted((u, v) for u, v in K.edges())
+
+def test_depot_corridor_reaches_depot():
+    F, K, depot = _west_block_east_depot()
+
+    corridor = depot_corridor(F, depot, list(K.nodes))
+
+    assert corridor[0] == depot and corridor[-1] == depot
+    assert any(n in K for n in corridor)
+    assert all(F.has_edge(a, b) for a, b in zip(corridor, corridor[1:]) if a != b)
@@ -0,0 +1,83 @@
+import itertools
+import math
+import random
+import networkx as nx
+import pytest
+from src.routing.split_routes import *
+
+# Run from the repository root: python -m pytest tests
+
+MAX_ROUTE_TIME = 1200.0
+
+# Ring of n nodes swept clockwise, with deadhead streets back. Edge `long` is longer than a whole route.
+def _ring(n, seed, long=None):
+    rng = random.Random(seed)
+    F = nx.MultiDiGraph()
+    for i in range(n):
+        length = rng.uniform(100, 900)
+        if i == long:
+            length = 1.5 * MAX_ROUTE_TIME * SWEEP_SPEED
+        F.add_edge(i, (i + 1) % n, 0, length=length, mode="SWEEP")
+        F.add_edge((i + 1) % n, i, 0, length=length, mode="DEADHEAD")
+    tour = [(i, (i + 1) % n, 0) for i in range(n)]
+    return F, tour
+
+def _route_duration(E, route, to_node, to_depot):
+    return to_node[route[0][0]] + sum(edge_time(E, e) for e in route) + to_depot[route[-1][1]]
+
+# (number of routes, total time) of the best split found by trying every set of cuts
+def _exhaustive_split(E, tour, to_node, to_depot, lookahead=None):
+    n = len(tour)
+    best = None
+    for cuts in itertools.product([False, True], repeat=n - 1):
+        bounds = [0] + [i + 1 for i, cut in enumerate(cuts) if cut] + [n]
+        routes = [tour[i:j] for i, j in zip(bounds, bounds[1:])]
+        if lookahead is not None and any(len(r) > lookahead for r in routes):
+            continue
+        durations = [_route_duration(E, r, to_node, to_depot) for r in routes]
+        if any(len(r) > 1 and d > MAX_ROUTE_TIME for r, d in zip(routes, durations)):
+            continue
+        if best is None or (len(routes), sum(durations)) < best:
+            best = (len(routes), sum(durations))
+    return best
+
+def _check_against_exhaustive(F, tour, depot=None, lookahead=None):
+    if depot is None:
+        to_node = to_depot = dict.fromkeys(F.nodes, 0.0)
+    else:
+        to_node, to_depot = depot_deadhead_times(F, depot, F.nodes)
+
+    routes = split_giant_tour_optimal(F, tour, MAX_ROUTE_TIME, F=F, depot=depot, lookahead=lookahead)
+
+    assert [e for r in routes for e in r] == tour
+    durations = [_route_duration(F, r, to_node, to_depot) for r in routes]
+    assert all(len(r) == 1 or d <= MAX_ROUTE_TIME for r, d in zip(routes, durations))
+    if lookahead is not None:
+        assert all(len(r) <= lookahead for r in routes)
+
+    count, total = _exhaustive_split(F, tour, to_node, to_depot, lookahead=lookahead)
+    assert len(routes) == count
+    assert math.isclose(sum(durations), total)
+    return routes
+
+@pytest.mark.parametrize("seed", range(5))
+def test_split_matches_exhaustive(seed):
+    F, tour = _ring(10, seed)
+    _check_against_exhaustive(F, tour)
+
+@pytest.mark.parametrize("seed", range(5))
+def test_split_with_depot_legs_matches_exhaustive(seed):
+    F, tour = _ring(10, seed)
+    _check_against_exhaustive(F, tour, depot=seed)
+
+@pytest.mark.parametrize("lookahead", [1, 2, 3])
+def test_split_with_lookahead_matches_exhaustive(lookahead):
+    F, tour = _ring(10, 0)
+    _check_against_exhaustive(F, tour, depot=0, lookahead=lookahead)
+
+def test_edge_longer_than_a_route_is_its_own_route():
+    F, tour = _ring(10, 0, long=4)
+
+    for depot in (None, 0):
+        routes = _check_against_exhaustive(F, tour, depot=depot)
+        assert [tour[4]] in routes